@@ -1,18 +1,27 @@
 import os
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List, Optional
-import pandas as pd
-import io
 from app.schemas import schemas
-from app.models.models import BusinessData
 from datetime import datetime
 from sqlalchemy.orm import Session
 from app.db.database import get_db
+from app.services.ingestion import ingest_csv, ingest_upload, detect_upload_format, UploadRejected
+from app.services.rollups import load_rollups
 # Optional ML imports
 try:
-    from app.services.ml.forecast_service import ForecastService
+    from app.services.ml.forecast_service import ForecastService, ModelNotTrained
     from app.services.ml.insights_service import InsightsService
     from app.services.ml.schemas import ForecastRequest, ForecastResponse, InsightsRequest, InsightsResponse
+    from app.services.ml.schemas import BatchForecastRequest, TrainingJobOut, BacktestResult
+    from app.services.ml.backtest import stored_backtest
+    from app.services.ml.tournament import current_selection
+    from app.services.ml.batch_forecast import iter_batch_forecasts
+    from app.services.ml.training_jobs import enqueue_backtest, enqueue_tournament, enqueue_training, enqueue_tuning
+    from app.services.ml.config import GLOBAL_MODEL_SERIES, BACKTEST_FOLDS, TOURNAMENT_HORIZON
+    from app.services.ml.config import TUNING_HORIZON, TUNING_SERIES_SECONDS
+    from app.models.models import TrainingJob
     HAS_ML = True
 except ImportError as e:
     print(f"ML services not available: {e}")
@@ -22,9 +31,14 @@ except ImportError as e:
 
 router = APIRouter()
 
-# Max upload size: 10MB, max rows: 100k (configurable via env)
-MAX_CSV_BYTES = int(os.getenv("MAX_CSV_BYTES", 10 * 1024 * 1024))
-MAX_CSV_ROWS = int(os.getenv("MAX_CSV_ROWS", 100_000))
+# Max upload size: 100MB, max rows: 2M (configurable via env). Uploads are
+# streamed in CSV_CHUNK_ROWS-row chunks, so memory does not grow with these.
+MAX_CSV_BYTES = int(os.getenv("MAX_CSV_BYTES", 100 * 1024 * 1024))
+MAX_CSV_ROWS = int(os.getenv("MAX_CSV_ROWS", 2_000_000))
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", 50_000))
+# Rows of an upload without metric columns kept as its raw JSON records; the
+# rest are counted but not stored (the limit keeps the blob row-sized)
+MAX_RAW_RECORDS = int(os.getenv("MAX_RAW_RECORDS", 10_000))
 
 
 def _get_user_id(authorization: Optional[str] = Header(None)) -> int:
@@ -47,76 +61,50 @@ async def upload_csv(
     session: Session = Depends(get_db),
     authorization: Optional[str] = Header(None),
 ):
-    """Upload CSV file with business data. Accepts any CSV with a date column."""
+    """Upload CSV file with business data. Accepts any CSV with a date column.
+
+    The file is parsed and stored in chunks, so memory stays flat regardless
+    of file size and oversize files are rejected as soon as a limit is crossed.
+    """
     if not file.filename or not file.filename.lower().endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are accepted")
 
-    try:
-        contents = await file.read()
-        if len(contents) > MAX_CSV_BYTES:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Max size: {MAX_CSV_BYTES // (1024*1024)}MB",
-            )
-        
-        # Parse CSV
-        df = pd.read_csv(io.BytesIO(contents))
-        
-        # Find date column (case-insensitive)
-        date_col = None
-        for col in df.columns:
-            if col.lower() in ['date', 'timestamp', 'time', 'day']:
-                date_col = col
-                break
-        
-        if date_col is None:
-            raise HTTPException(status_code=400, detail="CSV must contain a 'date' column")
-        
-        # Normalize date column name to 'date'
-        if date_col != 'date':
-            df = df.rename(columns={date_col: 'date'})
-        
-        # Check if already in long format (date, metric_name, value)
-        if 'metric_name' in df.columns and 'value' in df.columns:
-            data_records = df.to_dict('records')
-        else:
-            # Wide format - transform to long format for ML compatibility
-            numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
-            if numeric_cols:
-                df_long = df.melt(
-                    id_vars=['date'],
-                    value_vars=numeric_cols,
-                    var_name='metric_name',
-                    value_name='value'
-                )
-                data_records = df_long.to_dict('records')
-            else:
-                data_records = df.to_dict('records')
-        
-        if len(df) > MAX_CSV_ROWS:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Too many rows. Max: {MAX_CSV_ROWS:,}. Consider sampling your data.",
-            )
+    # Reject early when the client sent the size up front
+    if file.size is not None and file.size > MAX_CSV_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large. Max size: {MAX_CSV_BYTES // (1024*1024)}MB",
+        )
 
+    try:
         user_id = _get_user_id(authorization)
-        business_data = BusinessData(
-            user_id=user_id,
-            filename=file.filename,
-            data=data_records,
-            data_type='timeseries'
+        summary = await run_in_threadpool(
+            ingest_csv,
+            session,
+            file.file,
+            file.filename,
+            user_id,
+            CSV_CHUNK_ROWS,
+            MAX_CSV_BYTES,
+            MAX_CSV_ROWS,
+            MAX_RAW_RECORDS,
         )
-        session.add(business_data)
-        session.commit()
         
         return {
-            "message": "CSV uploaded successfully",
+            "message": "File already uploaded, nothing changed" if summary["duplicate_of"] else "CSV uploaded successfully",
             "filename": file.filename,
-            "rows_processed": len(df),
-            "columns": list(df.columns),
+            "rows_processed": summary["rows_processed"],
+            "columns": summary["columns"],
+            "points_stored": summary["points_stored"],
+            "points_unchanged": summary["points_unchanged"],
+            "write_rows_per_sec": summary["write_rows_per_sec"],
+            "records_truncated": summary["records_truncated"],
+            "duplicate_of": summary["duplicate_of"],
             "status": "success"
         }
     
+    except UploadRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -126,6 +114,98 @@ async def upload_csv(
             detail=f"Error processing CSV: {str(e)}"
         )
 
+@router.post("/upload_dataset")
+async def upload_dataset(
+    file: UploadFile = File(...),
+    session: Session = Depends(get_db),
+    authorization: Optional[str] = Header(None),
+):
+    """Upload business data as CSV, Parquet or Arrow IPC (.arrow/.feather).
+
+    Parquet and Arrow files keep their schema: numeric columns become metrics
+    without re-inferring dtypes from text. Same limits as /upload_csv.
+    """
+    upload_format = detect_upload_format(file.filename)
+    if upload_format is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Only CSV, Parquet (.parquet) and Arrow IPC (.arrow, .feather) files are accepted",
+        )
+
+    if file.size is not None and file.size > MAX_CSV_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large. Max size: {MAX_CSV_BYTES // (1024*1024)}MB",
+        )
+
+    try:
+        user_id = _get_user_id(authorization)
+        summary = await run_in_threadpool(
+            ingest_upload,
+            session,
+            file.file,
+            file.filename,
+            upload_format,
+            user_id,
+            CSV_CHUNK_ROWS,
+            MAX_CSV_BYTES,
+            MAX_CSV_ROWS,
+            MAX_RAW_RECORDS,
+        )
+
+        return {
+            "message": "File already uploaded, nothing changed" if summary["duplicate_of"] else "Dataset uploaded successfully",
+            "filename": file.filename,
+            "format": upload_format,
+            "rows_processed": summary["rows_processed"],
+            "columns": summary["columns"],
+            "points_stored": summary["points_stored"],
+            "points_unchanged": summary["points_unchanged"],
+            "write_rows_per_sec": summary["write_rows_per_sec"],
+            "records_truncated": summary["records_truncated"],
+            "duplicate_of": summary["duplicate_of"],
+            "status": "success"
+        }
+
+    except UploadRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        session.rollback()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing dataset: {str(e)}"
+        )
+
+@router.get("/timeseries/{business_id}/{metric_name}/rollups")
+def get_rollups(
+    business_id: int,
+    metric_name: str,
+    granularity: str = "daily",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    session: Session = Depends(get_db),
+):
+    """Get pre-aggregated (sum/mean/min/max/count) values for a metric.
+
+    Rollups are maintained at ingest time; granularity is 'daily', 'weekly'
+    (Monday start) or 'monthly'.
+    """
+    try:
+        rollups = load_rollups(session, business_id, metric_name, granularity, start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rollups["period_start"] = rollups["period_start"].dt.date.astype(str)
+    rollups = rollups.astype(object).where(rollups.notna(), None)
+    return {
+        "business_id": business_id,
+        "metric_name": metric_name,
+        "granularity": granularity,
+        "periods": rollups.to_dict("records"),
+    }
+
 #@router.get("/insights", response_model=List[schemas.MetricsOut])
 #async def get_insights():
 #    """Get business insights and metrics"""
@@ -163,12 +243,30 @@ async def get_predictions():
 # =============================================================================
 
 if HAS_ML:
+    def _training_queued_response(job: TrainingJob, message: str) -> JSONResponse:
+        """202 pointing the client at the training job to poll."""
+        return JSONResponse(status_code=202, content={
+            "message": message,
+            "job_id": job.id,
+            "status": job.status,
+            "business_id": job.business_id,
+            "metric_name": job.metric_name,
+            "model_type": job.model_type,
+        })
+
     @router.post("/ml/forecast", response_model=ForecastResponse)
     def create_forecast(request: ForecastRequest, session: Session = Depends(get_db)):
-        """Generate ML forecast for a specific business metric."""
+        """Generate ML forecast for a specific business metric.
+
+        When the model has not been trained yet, a training job is queued and
+        202 is returned with its id; poll ``/ml/jobs/{job_id}`` and retry.
+        """
         try:
             service = ForecastService()
             return service.generate_forecast(session, request)
+        except ModelNotTrained as e:
+            job = enqueue_training(session, e.business_id, e.metric_name, e.model_type, e.horizon)
+            return _training_queued_response(job, f"{e}; training queued")
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
         except ImportError as e:
@@ -176,6 +274,22 @@ if HAS_ML:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Forecast failed: {str(e)}")
 
+    @router.post("/ml/forecast/batch")
+    async def create_forecast_batch(request: BatchForecastRequest, session: Session = Depends(get_db)):
+        """Generate many forecasts in parallel, streamed as newline-delimited JSON.
+
+        Every series is loaded with one query and the model work is spread
+        over a process pool. Each line is a BatchForecastResult, written as
+        soon as that forecast finishes (completion order, see ``index``).
+        Failures are reported per line with the status the single-forecast
+        endpoint would return.
+        """
+        async def lines():
+            async for result in iter_batch_forecasts(session, request.requests):
+                yield result.model_dump_json() + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
     @router.post("/ml/insights", response_model=InsightsResponse)
     def generate_insights(request: InsightsRequest):
         """Generate AI-powered business insights from forecast data."""
@@ -184,39 +298,188 @@ if HAS_ML:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Insights generation failed: {str(e)}")
 
-    @router.post("/ml/train/{business_id}/{metric_name}")
-    def train_model(business_id: int, metric_name: str, model_type: str = "auto", session: Session = Depends(get_db)):
-        """Train ML model for a specific business and metric."""
+    @router.post("/ml/train/global", status_code=202)
+    def train_global_model(horizon: int = 30, session: Session = Depends(get_db)):
+        """Queue training of the global model shared by every business and metric.
+
+        Serves series without a model of their own when GLOBAL_MODEL_ENABLED
+        is set, or any series with ``model_type=xgboost_global``.
+        """
         try:
-            service = ForecastService()
-            result = service.train_model(session, business_id, metric_name, model_type)
-            return {
-                "message": "Model training completed",
-                "business_id": business_id,
-                "metric_name": metric_name,
-                "model_type": result["model_type"],
-                "accuracy": result.get("accuracy", 0.0)
-            }
+            job = enqueue_training(session, *GLOBAL_MODEL_SERIES, "xgboost_global", horizon)
+            return _training_queued_response(job, "Global model training queued")
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Training failed: {str(e)}")
+
+    @router.post("/ml/train/{business_id}/{metric_name}", status_code=202)
+    def train_model(
+        business_id: int,
+        metric_name: str,
+        model_type: str = "auto",
+        horizon: int = 30,
+        incremental: bool = False,
+        session: Session = Depends(get_db)
+    ):
+        """Queue ML model training for a specific business and metric.
+
+        Returns immediately with a job id; poll ``/ml/jobs/{job_id}`` for the
+        outcome. A request matching an active job returns that job.
+
+        With ``incremental=true`` (e.g. from a nightly sync) an XGBoost model
+        is updated with the data appended since it was trained; a full
+        retrain still happens when none exists or one is due.
+        """
+        try:
+            job = enqueue_training(session, business_id, metric_name, model_type, horizon, incremental)
+            return _training_queued_response(job, "Model training queued")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Training failed: {str(e)}")
+
+    @router.post("/ml/backtest/{business_id}/{metric_name}", response_model=BacktestResult)
+    def backtest_model(
+        business_id: int,
+        metric_name: str,
+        model_type: str = "auto",
+        horizon: int = 30,
+        folds: int = BACKTEST_FOLDS,
+        session: Session = Depends(get_db)
+    ):
+        """Out-of-sample accuracy of a model type on one series (rolling-origin backtest).
+
+        Results are stored and returned right away until the series data
+        changes. Otherwise the backtest is queued and 202 is returned with a
+        job id; poll ``/ml/jobs/{job_id}``, whose result is the
+        BacktestResult once completed.
+        """
+        if not 1 <= horizon <= 365 or not 1 <= folds <= 20:
+            raise HTTPException(status_code=400, detail="horizon must be 1-365 and folds 1-20")
+        try:
+            stored = stored_backtest(session, business_id, metric_name, model_type, horizon, folds)
+            if stored is not None:
+                return stored
+            job = enqueue_backtest(session, business_id, metric_name, model_type, horizon, folds)
+            return _training_queued_response(job, "Backtest queued")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ImportError as e:
+            raise HTTPException(status_code=503, detail=f"ML dependency missing: {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Backtest failed: {str(e)}")
+
+    @router.post("/ml/tournament/{business_id}/{metric_name}")
+    def run_model_tournament(
+        business_id: int,
+        metric_name: str,
+        horizon: int = TOURNAMENT_HORIZON,
+        session: Session = Depends(get_db)
+    ):
+        """Backtest every candidate model on one series and make the most
+        accurate one what ``model_type=auto`` uses for it.
+
+        A selection decided on the current series data is returned right
+        away. Otherwise the tournament is queued and 202 is returned with a
+        job id; poll ``/ml/jobs/{job_id}``, whose result is the selection
+        once completed. Fleet-wide runs go through
+        ``python -m app.services.ml.tournament``.
+        """
+        if not 1 <= horizon <= 365:
+            raise HTTPException(status_code=400, detail="horizon must be 1-365")
+        try:
+            selection = current_selection(session, business_id, metric_name, horizon)
+            if selection is not None:
+                return selection
+            job = enqueue_tournament(session, business_id, metric_name, horizon)
+            return _training_queued_response(job, "Model tournament queued")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Tournament failed: {str(e)}")
+
+    @router.post("/ml/tune/{business_id}/{metric_name}")
+    def tune_model(
+        business_id: int,
+        metric_name: str,
+        model_type: str = "xgboost",
+        horizon: int = TUNING_HORIZON,
+        budget_seconds: float = TUNING_SERIES_SECONDS,
+        session: Session = Depends(get_db)
+    ):
+        """Search XGBoost hyperparameters for one series within a time budget.
+
+        The search is queued and 202 is returned with a job id; poll
+        ``/ml/jobs/{job_id}``, whose result is the tuning record once
+        completed. The next training run of the model uses it. Fleet-wide
+        runs go through ``python -m app.services.ml.tuning``.
+        """
+        if not 1 <= horizon <= 365 or not 0 < budget_seconds <= 3600:
+            raise HTTPException(status_code=400, detail="horizon must be 1-365 and budget_seconds at most 3600")
+        try:
+            job = enqueue_tuning(session, business_id, metric_name, model_type, horizon, budget_seconds)
+            return _training_queued_response(job, "Tuning queued")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ImportError as e:
+            raise HTTPException(status_code=503, detail=f"ML dependency missing: {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Tuning failed: {str(e)}")
+
+    @router.get("/ml/jobs/{job_id}", response_model=TrainingJobOut)
+    def get_training_job(job_id: int, session: Session = Depends(get_db)):
+        """Get the status of a training job."""
+        job = session.get(TrainingJob, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
 else:
     @router.post("/ml/forecast")
     def create_forecast_unavailable():
         """ML services not available."""
         raise HTTPException(status_code=503, detail="ML services not available. Install XGBoost/Prophet dependencies.")
     
+    @router.post("/ml/forecast/batch")
+    def create_forecast_batch_unavailable():
+        """ML services not available."""
+        raise HTTPException(status_code=503, detail="ML services not available. Install XGBoost/Prophet dependencies.")
+    
     @router.post("/ml/insights")
     def generate_insights_unavailable():
         """ML services not available."""
         raise HTTPException(status_code=503, detail="ML services not available. Install required dependencies.")
     
+    @router.post("/ml/train/global")
+    def train_global_model_unavailable():
+        """ML services not available."""
+        raise HTTPException(status_code=503, detail="ML services not available. Install required dependencies.")
+
     @router.post("/ml/train/{business_id}/{metric_name}")
     def train_model_unavailable(business_id: int, metric_name: str):
         """ML services not available."""
         raise HTTPException(status_code=503, detail="ML services not available. Install required dependencies.")
 
+    @router.post("/ml/backtest/{business_id}/{metric_name}")
+    def backtest_model_unavailable(business_id: int, metric_name: str):
+        """ML services not available."""
+        raise HTTPException(status_code=503, detail="ML services not available. Install required dependencies.")
+
+    @router.post("/ml/tournament/{business_id}/{metric_name}")
+    def run_model_tournament_unavailable(business_id: int, metric_name: str):
+        """ML services not available."""
+        raise HTTPException(status_code=503, detail="ML services not available. Install required dependencies.")
+
+    @router.post("/ml/tune/{business_id}/{metric_name}")
+    def tune_model_unavailable(business_id: int, metric_name: str):
+        """ML services not available."""
+        raise HTTPException(status_code=503, detail="ML services not available. Install required dependencies.")
+
+    @router.get("/ml/jobs/{job_id}")
+    def get_training_job_unavailable(job_id: int):
+        """ML services not available."""
+        raise HTTPException(status_code=503, detail="ML services not available. Install required dependencies.")
+
 
 # =============================================================================
 # RECOMMENDATIONS ENDPOINT - AI-powered efficiency recommendations
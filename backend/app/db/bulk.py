@@ -0,0 +1,144 @@
+"""Bulk write path for long-format time-series rows.
+
+Bypasses the ORM unit of work: PostgreSQL gets a ``COPY ... FROM STDIN`` into
+a staging table followed by one ``INSERT ... SELECT``, other databases (the
+SQLite fallback) get DBAPI ``executemany`` in fixed-size batches. Both run on
+the session's connection, so the caller's transaction still decides whether
+an upload is committed or rolled back.
+
+Rows are upserted on the (user_id, metric_name, date) key and only written
+when the value changed, so re-uploading overlapping data costs a key lookup
+per row instead of a duplicate row.
+"""
+
+import io
+import time
+import pandas as pd
+from dataclasses import dataclass
+from sqlalchemy.orm import Session
+
+from app.models.models import TimeseriesPoint
+
+# Rows per executemany call on non-PostgreSQL databases
+EXECUTEMANY_BATCH_SIZE = 10_000
+
+POINT_COLUMNS = ["user_id", "business_data_id", "metric_name", "date", "value"]
+POINT_KEY = ["user_id", "metric_name", "date"]
+
+# Matches SQLAlchemy's SQLite DATETIME storage format so ORM reads round-trip
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+STAGING_TABLE = "_timeseries_points_staging"
+
+
+@dataclass
+class BulkWriteStats:
+    """Throughput of one or more bulk writes."""
+    rows: int = 0  # rows submitted
+    written: int = 0  # rows inserted or changed
+    seconds: float = 0.0
+
+    @property
+    def unchanged(self) -> int:
+        return self.rows - self.written
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def add(self, other: "BulkWriteStats") -> None:
+        self.rows += other.rows
+        self.written += other.written
+        self.seconds += other.seconds
+
+
+def bulk_upsert_points(session: Session, points: pd.DataFrame) -> BulkWriteStats:
+    """
+    Upsert normalized points (see ``long_frame_to_points``) in bulk.
+
+    New (metric, date) keys are inserted, existing keys are updated only when
+    the value differs, identical rows are left untouched.
+
+    Args:
+        session: Database session; its current transaction is used
+        points: DataFrame with the ``POINT_COLUMNS`` columns
+
+    Returns:
+        BulkWriteStats with the submitted/written row counts and elapsed time
+    """
+    if points.empty:
+        return BulkWriteStats()
+
+    started = time.perf_counter()
+    # A key may appear once per statement; the last occurrence wins like a re-upload
+    points = points.drop_duplicates(subset=POINT_KEY, keep="last")
+
+    connection = session.connection()
+    dbapi_connection = connection.connection.dbapi_connection
+
+    if connection.dialect.name == "postgresql":
+        written = _copy_upsert_points(dbapi_connection, points)
+    else:
+        written = _executemany_upsert_points(dbapi_connection, points, connection.dialect.paramstyle)
+
+    return BulkWriteStats(rows=len(points), written=written, seconds=time.perf_counter() - started)
+
+
+def _copy_upsert_points(dbapi_connection, points: pd.DataFrame) -> int:
+    """COPY rows into a transaction-scoped staging table, then upsert (psycopg2)."""
+    buffer = io.StringIO()
+    # Unquoted empty fields are NULL in COPY's CSV format
+    points[POINT_COLUMNS].to_csv(buffer, header=False, index=False, date_format="%Y-%m-%d %H:%M:%S.%f")
+    buffer.seek(0)
+
+    table = TimeseriesPoint.__tablename__
+    columns = ", ".join(POINT_COLUMNS)
+    with dbapi_connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} "
+            f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+        cursor.copy_expert(f"COPY {STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {STAGING_TABLE} "
+            f"ON CONFLICT ({', '.join(POINT_KEY)}) DO UPDATE "
+            "SET value = EXCLUDED.value, business_data_id = EXCLUDED.business_data_id "
+            f"WHERE {table}.value IS DISTINCT FROM EXCLUDED.value"
+        )
+        return cursor.rowcount
+
+
+def _executemany_upsert_points(dbapi_connection, points: pd.DataFrame, paramstyle: str) -> int:
+    """Upsert rows with DBAPI executemany in EXECUTEMANY_BATCH_SIZE batches."""
+    placeholder = "?" if paramstyle == "qmark" else "%s"
+    table = TimeseriesPoint.__tablename__
+    sql = (
+        f"INSERT INTO {table} ({', '.join(POINT_COLUMNS)}) "
+        f"VALUES ({', '.join([placeholder] * len(POINT_COLUMNS))}) "
+        f"ON CONFLICT ({', '.join(POINT_KEY)}) DO UPDATE "
+        "SET value = excluded.value, business_data_id = excluded.business_data_id "
+        f"WHERE {table}.value IS NOT excluded.value"
+    )
+
+    # Convert whole columns up front; NaN values become NULL
+    values = points["value"].to_numpy(dtype=object)
+    values[pd.isna(values)] = None
+    columns = [
+        points["user_id"].astype(int).tolist(),
+        points["business_data_id"].astype(int).tolist(),
+        points["metric_name"].tolist(),
+        points["date"].dt.strftime(SQLITE_DATETIME_FORMAT).tolist(),
+        values.tolist(),
+    ]
+    rows = list(zip(*columns))
+
+    written = 0
+    cursor = dbapi_connection.cursor()
+    try:
+        for start in range(0, len(rows), EXECUTEMANY_BATCH_SIZE):
+            cursor.executemany(sql, rows[start:start + EXECUTEMANY_BATCH_SIZE])
+            written += max(cursor.rowcount, 0)
+    finally:
+        cursor.close()
+    return written
@@ -0,0 +1,221 @@
+"""Idempotent data migrations for the API database.
+
+``Base.metadata.create_all`` creates missing tables but never alters or
+backfills existing ones. Each migration below runs once per database and is
+recorded in the ``schema_migrations`` table.
+
+Run manually with:
+    cd backend && python -m app.db.migrations
+"""
+
+import sqlalchemy as sa
+from datetime import datetime
+from sqlalchemy.orm import Session
+
+from app.db.database import Base
+from app.models.models import BusinessData, TimeseriesPoint
+from app.services.rollups import refresh_rollups
+from app.services.timeseries_store import blob_to_long_frame, long_frame_to_points, upsert_points
+
+schema_migrations = sa.Table(
+    "schema_migrations",
+    Base.metadata,
+    sa.Column("name", sa.String, primary_key=True),
+    sa.Column("applied_at", sa.DateTime, default=datetime.utcnow),
+)
+
+# Blobs loaded per round trip during backfill
+BACKFILL_BATCH_SIZE = 50
+
+
+def backfill_timeseries_points(session: Session) -> int:
+    """
+    Explode existing ``BusinessData.data`` blobs into ``timeseries_points``.
+
+    Blobs are left in place; new uploads no longer write them.
+
+    Returns:
+        Number of points written
+    """
+    total = 0
+    last_id = 0
+    while True:
+        # Explicit columns: later migrations add columns this one must not select
+        batch = (
+            session.query(BusinessData.id, BusinessData.user_id, BusinessData.data)
+            .filter(BusinessData.id > last_id, BusinessData.data.isnot(None))
+            .order_by(BusinessData.id)
+            .limit(BACKFILL_BATCH_SIZE)
+            .all()
+        )
+        if not batch:
+            break
+
+        for record_id, user_id, data in batch:
+            df_long = blob_to_long_frame(data)
+            points = long_frame_to_points(df_long, user_id, record_id)
+            total += upsert_points(session, points)
+            last_id = record_id
+
+    return total
+
+
+def _add_column_if_missing(session: Session, table: str, column: str, ddl_type: str) -> None:
+    """ALTER TABLE ... ADD COLUMN unless the column already exists."""
+    existing = {col["name"] for col in sa.inspect(session.connection()).get_columns(table)}
+    if column not in existing:
+        session.execute(sa.text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def dedupe_timeseries_points(session: Session) -> int:
+    """
+    Make (user_id, metric_name, date) unique so re-uploads can upsert, and
+    add the upload content hash used to skip identical files.
+
+    Keeps the most recently written row for each key, matching what
+    ``clean_timeseries_data`` kept when duplicates were resolved at read time.
+
+    Returns:
+        Number of duplicate points removed
+    """
+    removed = session.execute(sa.text(
+        "DELETE FROM timeseries_points WHERE id NOT IN ("
+        "SELECT MAX(id) FROM timeseries_points GROUP BY user_id, metric_name, date)"
+    )).rowcount
+    session.execute(sa.text("DROP INDEX IF EXISTS idx_timeseries_user_metric_date"))
+    session.execute(sa.text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_timeseries_user_metric_date "
+        "ON timeseries_points (user_id, metric_name, date)"
+    ))
+
+    _add_column_if_missing(session, "business_data", "content_hash", "VARCHAR(64)")
+    session.execute(sa.text(
+        "CREATE INDEX IF NOT EXISTS idx_business_data_user_hash "
+        "ON business_data (user_id, content_hash)"
+    ))
+    return removed
+
+
+def build_timeseries_rollups(session: Session) -> int:
+    """
+    Materialize rollups for every series stored before ingest-time
+    maintenance existed.
+
+    Returns:
+        Number of rollup rows written
+    """
+    series = session.query(
+        TimeseriesPoint.user_id,
+        TimeseriesPoint.metric_name,
+        sa.func.min(TimeseriesPoint.date),
+        sa.func.max(TimeseriesPoint.date)
+    ).group_by(TimeseriesPoint.user_id, TimeseriesPoint.metric_name).all()
+
+    total = 0
+    for user_id, metric_name, first_date, last_date in series:
+        total += refresh_rollups(session, user_id, {metric_name: (first_date, last_date)})
+    return total
+
+
+def unique_active_training_jobs(session: Session) -> int:
+    """
+    Allow one pending/running training job per (business, metric, model type),
+    so concurrent requests from several API processes collapse into one job.
+
+    Duplicate active jobs are cancelled, keeping the oldest.
+
+    Returns:
+        Number of jobs cancelled
+    """
+    cancelled = session.execute(sa.text(
+        "UPDATE training_jobs SET status = 'cancelled' "
+        "WHERE status IN ('pending', 'running') AND id NOT IN ("
+        "SELECT MIN(id) FROM training_jobs WHERE status IN ('pending', 'running') "
+        "GROUP BY business_id, metric_name, model_type)"
+    )).rowcount
+    session.execute(sa.text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_training_jobs_active "
+        "ON training_jobs (business_id, metric_name, model_type) "
+        "WHERE status IN ('pending', 'running')"
+    ))
+    return cancelled
+
+
+def add_training_job_incremental(session: Session) -> None:
+    """Record whether a training job updates the current model or retrains it."""
+    _add_column_if_missing(session, "training_jobs", "incremental", "BOOLEAN NOT NULL DEFAULT FALSE")
+
+
+def follow_up_training_jobs(session: Session) -> None:
+    """
+    Allow a pending job behind a running one of the same model, for requests
+    the running job does not cover (longer horizon, full retrain).
+    """
+    session.execute(sa.text("DROP INDEX IF EXISTS uq_training_jobs_active"))
+    session.execute(sa.text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_training_jobs_active_status "
+        "ON training_jobs (business_id, metric_name, model_type, status) "
+        "WHERE status IN ('pending', 'running')"
+    ))
+
+
+def training_job_kinds(session: Session) -> None:
+    """
+    Queue analyses (backtests) as jobs next to training runs; only training
+    jobs are limited to one pending and one running job per model.
+    """
+    _add_column_if_missing(session, "training_jobs", "kind", "VARCHAR(20) NOT NULL DEFAULT 'train'")
+    _add_column_if_missing(session, "training_jobs", "params", "JSON")
+    session.execute(sa.text("DROP INDEX IF EXISTS uq_training_jobs_active_status"))
+    session.execute(sa.text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_training_jobs_active_train "
+        "ON training_jobs (business_id, metric_name, model_type, status) "
+        "WHERE status IN ('pending', 'running') AND kind = 'train'"
+    ))
+
+
+# (name, function) in the order they must be applied. Never reorder or rename.
+MIGRATIONS = [
+    ("0001_backfill_timeseries_points", backfill_timeseries_points),
+    ("0002_dedupe_timeseries_points", dedupe_timeseries_points),
+    ("0003_build_timeseries_rollups", build_timeseries_rollups),
+    ("0004_unique_active_training_jobs", unique_active_training_jobs),
+    ("0005_add_training_job_incremental", add_training_job_incremental),
+    ("0006_follow_up_training_jobs", follow_up_training_jobs),
+    ("0007_training_job_kinds", training_job_kinds),
+]
+
+
+def run_migrations(engine: sa.engine.Engine) -> list:
+    """
+    Apply every migration that has not run yet, each in its own transaction.
+
+    Returns:
+        Names of the migrations applied by this call
+    """
+    Base.metadata.create_all(bind=engine)
+
+    applied = []
+    with Session(bind=engine) as session:
+        done = {row[0] for row in session.execute(sa.select(schema_migrations.c.name))}
+        for name, migrate in MIGRATIONS:
+            if name in done:
+                continue
+            try:
+                result = migrate(session)
+                session.execute(schema_migrations.insert().values(name=name, applied_at=datetime.utcnow()))
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            print(f"Applied migration {name}: {result}")
+            applied.append(name)
+
+    return applied
+
+
+if __name__ == "__main__":
+    from app.db.database import engine
+
+    names = run_migrations(engine)
+    print(f"{len(names)} migration(s) applied" if names else "Database is up to date")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, JSON
+from sqlalchemy import Boolean, Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Float, JSON, Index, CheckConstraint, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.database import Base
@@ -26,11 +26,17 @@ class BusinessData(Base):
     filename = Column(String)
     data = Column(JSON)
     data_type = Column(String)
+    content_hash = Column(String(64))  # SHA-256 of the uploaded file
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="business_data")
     metrics = relationship("Metrics", back_populates="business_data")
     predictions = relationship("Predictions", back_populates="business_data")
+    timeseries_points = relationship("TimeseriesPoint", back_populates="business_data")
+    
+    __table_args__ = (
+        Index("idx_business_data_user_hash", "user_id", "content_hash"),
+    )
 
 class Metrics(Base):
     """Store calculated business metrics"""
@@ -58,3 +64,119 @@ class Predictions(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     business_data = relationship("BusinessData", back_populates="predictions")
+
+class TimeseriesPoint(Base):
+    """Long-format time-series values: one row per (user, metric, date).
+
+    Replaces scanning the ``BusinessData.data`` JSON blobs. Metric names are
+    stored lower-cased so case-insensitive lookups can use the composite index.
+    Re-uploads upsert on the unique key; ``business_data_id`` is the upload
+    that last changed the value.
+    """
+    __tablename__ = "timeseries_points"
+
+    # BIGINT on PostgreSQL; SQLite only auto-increments INTEGER primary keys
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    business_data_id = Column(Integer, ForeignKey("business_data.id"), nullable=False)
+    metric_name = Column(String, nullable=False)
+    date = Column(DateTime, nullable=False)
+    value = Column(Float)
+
+    business_data = relationship("BusinessData", back_populates="timeseries_points")
+
+    __table_args__ = (
+        Index("uq_timeseries_user_metric_date", "user_id", "metric_name", "date", unique=True),
+    )
+
+class TimeseriesRollup(Base):
+    """Pre-aggregated time-series values per metric and period.
+
+    Maintained at ingest time for 'daily', 'weekly' (Monday start) and
+    'monthly' granularities. ``value_count`` counts non-null points.
+    """
+    __tablename__ = "timeseries_rollups"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    metric_name = Column(String, nullable=False)
+    granularity = Column(String(16), nullable=False)
+    period_start = Column(DateTime, nullable=False)
+    value_sum = Column(Float)
+    value_mean = Column(Float)
+    value_min = Column(Float)
+    value_max = Column(Float)
+    value_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("uq_rollups_user_metric_granularity_period",
+              "user_id", "metric_name", "granularity", "period_start", unique=True),
+    )
+
+class SeriesVersion(Base):
+    """Data version of one (user, metric) series.
+
+    Bumped by every ingest that writes points for the metric, so caches and
+    models can tell whether the data they were built from is still current.
+    Series without a row are at version 0.
+    """
+    __tablename__ = "series_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    metric_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class SeriesChange(Base):
+    """Earliest date written by each data version bump of a series.
+
+    Lets caches built at an older version recompute only from the first
+    date changed since then, whatever the edits did to the values.
+    """
+    __tablename__ = "series_changes"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    metric_name = Column(String, primary_key=True)
+    version = Column(Integer, primary_key=True)
+    first_date = Column(DateTime, nullable=False)
+
+class TrainingJob(Base):
+    """Queued model training runs, polled through ``GET /ml/jobs/{id}``.
+
+    Rows are created by the API and updated by the training worker
+    processes; ``result`` holds the model path and evaluation metrics.
+    Jobs of other kinds run analyses too long for a request (e.g. a
+    'backtest') on the same workers; ``params`` holds their arguments
+    beyond the horizon and ``result`` their outcome.
+    """
+    __tablename__ = "training_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    business_id = Column(Integer, nullable=False)
+    metric_name = Column(String, nullable=False)
+    model_type = Column(String(50), nullable=False)
+    horizon = Column(Integer, nullable=False, default=30)
+    incremental = Column(Boolean, nullable=False, default=False)
+    kind = Column(String(20), nullable=False, default="train")
+    params = Column(JSON)
+    status = Column(String(50), nullable=False, default="pending")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    result = Column(JSON)
+    error_message = Column(Text)
+
+    __table_args__ = (
+        CheckConstraint(
+            "status IN ('pending', 'running', 'completed', 'failed', 'cancelled')",
+            name="valid_training_job_status"
+        ),
+        Index("idx_training_jobs_series", "business_id", "metric_name", "model_type", "status"),
+        # At most one pending and one running training job per model, even
+        # across API processes; jobs that outlive their lease are failed so
+        # they release it
+        Index("uq_training_jobs_active_train", "business_id", "metric_name", "model_type", "status", unique=True,
+              sqlite_where=text("status IN ('pending', 'running') AND kind = 'train'"),
+              postgresql_where=text("status IN ('pending', 'running') AND kind = 'train'")),
+    )
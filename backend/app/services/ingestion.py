@@ -0,0 +1,491 @@
+"""Streaming ingestion of uploaded business data into ``timeseries_points``.
+
+Files are parsed in fixed-size chunks and each chunk is written as soon as it
+is parsed, so peak memory depends on the chunk size rather than the file size.
+Parquet and Arrow IPC uploads keep their schema: metric columns come from the
+column types and values are read from the Arrow buffers without text parsing.
+"""
+
+import hashlib
+import io
+import mmap
+import time
+import pandas as pd
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+from sqlalchemy.orm import Session
+
+# Optional pyarrow import (Parquet / Arrow IPC uploads)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+from app.db.bulk import BulkWriteStats, bulk_upsert_points
+from app.models.models import BusinessData
+from app.services.rollups import refresh_rollups
+from app.services.timeseries_store import long_frame_to_points, bump_series_versions
+
+# Column names recognised as the date column (case-insensitive)
+DATE_COLUMN_NAMES = ['date', 'timestamp', 'time', 'day']
+
+# Upload formats by file extension
+UPLOAD_FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+    '.arrows': 'arrow',
+}
+
+# Bytes hashed per read when fingerprinting an upload
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Leading bytes of the Arrow IPC file format (Feather v2); anything else is read as a stream
+ARROW_FILE_MAGIC = b"ARROW1"
+
+
+class UploadRejected(ValueError):
+    """Upload exceeds a size limit or has an unusable layout (HTTP 400)."""
+
+
+class _ByteLimitReader(io.RawIOBase):
+    """Read-only wrapper that fails as soon as more than ``max_bytes`` are read."""
+
+    def __init__(self, raw: BinaryIO, max_bytes: int):
+        self._raw = raw
+        self._max_bytes = max_bytes
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._raw.read(len(buffer))
+        n = len(data)
+        self.bytes_read += n
+        if self.bytes_read > self._max_bytes:
+            raise UploadRejected(f"File too large. Max size: {self._max_bytes // (1024*1024)}MB")
+        buffer[:n] = data
+        return n
+
+
+def iter_csv_chunks(
+    fileobj: BinaryIO,
+    chunk_rows: int,
+    max_bytes: int,
+    max_rows: int
+) -> Iterator[pd.DataFrame]:
+    """
+    Parse a CSV stream chunk by chunk, enforcing the limits while reading.
+
+    Args:
+        fileobj: Binary file object positioned at the start of the CSV
+        chunk_rows: Rows per parsed chunk
+        max_bytes: Reject once more than this many bytes have been read
+        max_rows: Reject once more than this many rows have been parsed
+
+    Yields:
+        DataFrame chunks in file order
+    """
+    reader = pd.read_csv(_ByteLimitReader(fileobj, max_bytes), chunksize=chunk_rows)
+    rows = 0
+    with reader:
+        for chunk in reader:
+            rows += len(chunk)
+            if rows > max_rows:
+                raise UploadRejected(f"Too many rows. Max: {max_rows:,}. Consider sampling your data.")
+            yield chunk
+
+
+def fingerprint_upload(fileobj: BinaryIO, max_bytes: int) -> str:
+    """
+    SHA-256 of the upload contents, read in blocks and rewound afterwards.
+
+    Raises:
+        UploadRejected: as soon as more than ``max_bytes`` have been hashed
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(HASH_BLOCK_SIZE), b""):
+        size += len(block)
+        if size > max_bytes:
+            raise UploadRejected(f"File too large. Max size: {max_bytes // (1024*1024)}MB")
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def detect_upload_format(filename: Optional[str]) -> Optional[str]:
+    """Map a filename to 'csv', 'parquet' or 'arrow' by extension."""
+    if not filename:
+        return None
+    for extension, upload_format in UPLOAD_FORMATS.items():
+        if filename.lower().endswith(extension):
+            return upload_format
+    return None
+
+
+def _numeric_columns(schema: "pa.Schema") -> List[str]:
+    """Integer, floating point and decimal columns of an Arrow schema."""
+    return [
+        field.name for field in schema
+        if pa.types.is_integer(field.type)
+        or pa.types.is_floating(field.type)
+        or pa.types.is_decimal(field.type)
+    ]
+
+
+def _batches_to_frames(batches, max_rows: int) -> Iterator[pd.DataFrame]:
+    """Convert Arrow record batches to DataFrames, enforcing the row limit."""
+    rows = 0
+    for batch in batches:
+        rows += batch.num_rows
+        if rows > max_rows:
+            raise UploadRejected(f"Too many rows. Max: {max_rows:,}. Consider sampling your data.")
+        yield batch.to_pandas(date_as_object=False)
+
+
+def iter_parquet_chunks(
+    fileobj: BinaryIO,
+    chunk_rows: int,
+    max_rows: int
+) -> Tuple[List[str], Iterator[pd.DataFrame]]:
+    """
+    Read a Parquet upload batch by batch.
+
+    The row count is in the footer, so oversize files are rejected before
+    any data page is decoded.
+
+    Returns:
+        Tuple of (numeric column names from the schema, DataFrame chunks)
+    """
+    parquet_file = pq.ParquetFile(fileobj)
+    if parquet_file.metadata.num_rows > max_rows:
+        raise UploadRejected(f"Too many rows. Max: {max_rows:,}. Consider sampling your data.")
+
+    batches = parquet_file.iter_batches(batch_size=chunk_rows)
+    return _numeric_columns(parquet_file.schema_arrow), _batches_to_frames(batches, max_rows)
+
+
+def iter_arrow_chunks(
+    fileobj: BinaryIO,
+    chunk_rows: int,
+    max_rows: int
+) -> Tuple[List[str], Iterator[pd.DataFrame]]:
+    """
+    Read an Arrow IPC upload (file/Feather v2 or stream format).
+
+    The spooled upload is memory-mapped when it lives on disk, so record
+    batches reference the mapped pages instead of copies. The map is closed
+    once the chunks are consumed, fail, or the iterator is abandoned.
+
+    Returns:
+        Tuple of (numeric column names from the schema, DataFrame chunks)
+    """
+    try:
+        mapped = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        # In-memory upload (no usable file descriptor)
+        mapped = None
+
+    chunks = _arrow_chunks(fileobj, mapped, chunk_rows, max_rows)
+    try:
+        # Runs up to the first yield: opens the reader and checks the row count
+        schema = next(chunks)
+    except BaseException:
+        chunks.close()
+        raise
+    return _numeric_columns(schema), chunks
+
+
+def _arrow_chunks(fileobj: BinaryIO, mapped: Optional[mmap.mmap], chunk_rows: int, max_rows: int):
+    """Yield the schema of an Arrow IPC upload, then its DataFrame chunks.
+
+    Every Arrow object referencing ``mapped`` lives in this frame, so the map
+    can be closed in the ``finally`` (an exported buffer blocks ``close``).
+    """
+    source = reader = table = batches = batch = None
+    try:
+        if mapped is not None:
+            source = pa.py_buffer(mapped)
+        else:
+            fileobj.seek(0)
+            source = pa.py_buffer(fileobj.read())
+
+        if source.slice(0, len(ARROW_FILE_MAGIC)).to_pybytes() == ARROW_FILE_MAGIC:
+            reader = pa.ipc.open_file(source)
+            # Reading the table only maps the batches, so the count is cheap
+            table = reader.read_all()
+            if table.num_rows > max_rows:
+                raise UploadRejected(f"Too many rows. Max: {max_rows:,}. Consider sampling your data.")
+            batches = table.to_batches(max_chunksize=chunk_rows)
+        else:
+            reader = pa.ipc.open_stream(source)
+            batches = (
+                small
+                for batch in reader
+                for small in pa.Table.from_batches([batch]).to_batches(max_chunksize=chunk_rows)
+            )
+
+        yield reader.schema
+        rows = 0
+        for batch in batches:
+            rows += batch.num_rows
+            if rows > max_rows:
+                raise UploadRejected(f"Too many rows. Max: {max_rows:,}. Consider sampling your data.")
+            # to_pandas copies out of the batch, so yielded frames do not pin the map
+            yield batch.to_pandas(date_as_object=False)
+    finally:
+        source = reader = table = batches = batch = None
+        if mapped is not None:
+            try:
+                mapped.close()
+            except BufferError:
+                # A traceback still holds a batch; the map closes when it is collected
+                pass
+
+
+def find_date_column(columns) -> Optional[str]:
+    """Return the first column that looks like a date column, if any."""
+    for col in columns:
+        if str(col).lower() in DATE_COLUMN_NAMES:
+            return col
+    return None
+
+
+def ingest_chunks(
+    session: Session,
+    chunks: Iterator[pd.DataFrame],
+    filename: str,
+    user_id: int,
+    numeric_cols: Optional[List[str]] = None,
+    content_hash: Optional[str] = None,
+    max_raw_records: int = 10_000
+) -> dict:
+    """
+    Write parsed chunks for one upload. The caller commits or rolls back.
+
+    The layout (long vs wide, which columns are metrics) is decided from the
+    first chunk and applied to every following chunk.
+
+    Args:
+        session: Database session
+        chunks: Iterator of raw DataFrame chunks
+        filename: Original upload filename
+        user_id: Owner of the data
+        numeric_cols: Numeric columns known from a typed schema (Parquet/Arrow);
+            inferred from the first chunk's dtypes when omitted
+        content_hash: Fingerprint of the file, stored on the dataset row
+        max_raw_records: Rows of an upload without metric columns kept as
+            its raw JSON records; the rest are counted but not stored
+
+    Returns:
+        dict with rows_processed, columns, points_stored (new or changed
+        points), points_unchanged, write_rows_per_sec (storage
+        throughput, excluding parsing) and records_truncated (raw records
+        beyond max_raw_records were not stored)
+    """
+    business_data = None
+    columns: List[str] = []
+    metric_cols: Optional[List[str]] = None
+    is_long = False
+    raw_records: List[dict] = []
+    rows_processed = 0
+    write_stats = BulkWriteStats()
+    # {metric_name: (first_date, last_date)} submitted, for rollup maintenance
+    metric_ranges = {}
+
+    for chunk in chunks:
+        if business_data is None:
+            date_col = find_date_column(chunk.columns)
+            if date_col is None:
+                raise UploadRejected("File must contain a 'date' column")
+
+        # Normalize date column name to 'date'
+        if date_col != 'date':
+            chunk = chunk.rename(columns={date_col: 'date'})
+
+        if business_data is None:
+            columns = list(chunk.columns)
+            # Check if already in long format (date, metric_name, value)
+            is_long = 'metric_name' in chunk.columns and 'value' in chunk.columns
+            if not is_long:
+                if numeric_cols is None:
+                    numeric_cols = chunk.select_dtypes(include=['int64', 'float64']).columns.tolist()
+                metric_cols = [col for col in numeric_cols if col not in (date_col, 'date')]
+
+            business_data = BusinessData(
+                user_id=user_id,
+                filename=filename,
+                data=None,
+                data_type='timeseries' if is_long or metric_cols else 'records',
+                content_hash=content_hash
+            )
+            session.add(business_data)
+            session.flush()
+
+        rows_processed += len(chunk)
+
+        if is_long:
+            df_long = chunk[['date', 'metric_name', 'value']]
+        elif metric_cols:
+            # Wide format - transform to long format for ML compatibility
+            df_long = chunk.melt(
+                id_vars=['date'],
+                value_vars=metric_cols,
+                var_name='metric_name',
+                value_name='value'
+            )
+        else:
+            # No metric columns: keep the raw records, there is nothing to forecast
+            room = max_raw_records - len(raw_records)
+            if room > 0:
+                raw_records.extend(chunk.head(room).to_dict('records'))
+            continue
+
+        points = long_frame_to_points(df_long, user_id, business_data.id)
+        # Written per metric, so only metrics whose points changed get their
+        # rollups refreshed and their version bumped (cached models and
+        # features of the others stay valid)
+        for metric, metric_points in points.groupby('metric_name', sort=False):
+            stats = bulk_upsert_points(session, metric_points)
+            write_stats.add(stats)
+            if not stats.written:
+                continue
+            dates = metric_points['date']
+            first, last = dates.min(), dates.max()
+            if metric in metric_ranges:
+                first = min(first, metric_ranges[metric][0])
+                last = max(last, metric_ranges[metric][1])
+            metric_ranges[metric] = (first, last)
+
+    if business_data is None:
+        raise UploadRejected("File is empty")
+    if raw_records:
+        business_data.data = raw_records
+    if metric_ranges:
+        refresh_rollups(session, user_id, metric_ranges)
+        bump_series_versions(session, user_id, metric_ranges)
+
+    return {
+        "rows_processed": rows_processed,
+        "columns": columns,
+        "points_stored": write_stats.written,
+        "points_unchanged": write_stats.unchanged,
+        "write_rows_per_sec": round(write_stats.rows_per_sec, 1),
+        "records_truncated": bool(raw_records) and rows_processed > len(raw_records),
+        "duplicate_of": None,
+    }
+
+
+def ingest_csv(
+    session: Session,
+    fileobj: BinaryIO,
+    filename: str,
+    user_id: int,
+    chunk_rows: int,
+    max_bytes: int,
+    max_rows: int,
+    max_raw_records: int = 10_000
+) -> dict:
+    """
+    Stream a CSV upload into storage in a single transaction.
+
+    Raises:
+        UploadRejected: if a limit is crossed or the layout is unusable;
+            nothing is stored in that case
+    """
+    return ingest_upload(
+        session, fileobj, filename, 'csv', user_id, chunk_rows, max_bytes, max_rows, max_raw_records
+    )
+
+
+def ingest_upload(
+    session: Session,
+    fileobj: BinaryIO,
+    filename: str,
+    upload_format: str,
+    user_id: int,
+    chunk_rows: int,
+    max_bytes: int,
+    max_rows: int,
+    max_raw_records: int = 10_000
+) -> dict:
+    """
+    Stream a CSV, Parquet or Arrow IPC upload into storage in a single transaction.
+
+    A file identical to the user's latest upload is a no-op
+    (``duplicate_of`` is set in the summary). Otherwise points are upserted,
+    so an extended file only writes its new or changed dates.
+
+    Args:
+        upload_format: 'csv', 'parquet' or 'arrow' (see ``detect_upload_format``)
+
+    Raises:
+        UploadRejected: if a limit is crossed, the layout is unusable or the
+            format is not supported; nothing is stored in that case
+    """
+    try:
+        content_hash = fingerprint_upload(fileobj, max_bytes)
+        # Only the latest upload: after A, B, A the second A must restore A's values
+        duplicate = session.query(BusinessData.id, BusinessData.content_hash).filter(
+            BusinessData.user_id == user_id
+        ).order_by(BusinessData.id.desc()).first()
+        if duplicate is not None and duplicate.content_hash == content_hash:
+            print(f"Skipped {filename}: identical to dataset {duplicate.id}")
+            return {
+                "rows_processed": 0,
+                "columns": [],
+                "points_stored": 0,
+                "points_unchanged": 0,
+                "write_rows_per_sec": 0.0,
+                "records_truncated": False,
+                "duplicate_of": duplicate.id,
+            }
+
+        numeric_cols = None
+        if upload_format == 'csv':
+            chunks = iter_csv_chunks(fileobj, chunk_rows, max_bytes, max_rows)
+        else:
+            if not HAS_PYARROW:
+                raise UploadRejected("Parquet/Arrow uploads require pyarrow. Please install: pip install pyarrow")
+            if upload_format == 'parquet':
+                numeric_cols, chunks = iter_parquet_chunks(fileobj, chunk_rows, max_rows)
+            elif upload_format == 'arrow':
+                numeric_cols, chunks = iter_arrow_chunks(fileobj, chunk_rows, max_rows)
+            else:
+                raise UploadRejected(f"Unsupported upload format: {upload_format}")
+
+        started = time.perf_counter()
+        summary = ingest_chunks(
+            session, chunks, filename, user_id, numeric_cols, content_hash, max_raw_records
+        )
+        session.commit()
+        elapsed = time.perf_counter() - started
+    except pd.errors.EmptyDataError:
+        session.rollback()
+        raise UploadRejected("CSV file is empty")
+    except UploadRejected:
+        session.rollback()
+        raise
+    except (OSError, ValueError) as e:
+        # pyarrow raises ArrowInvalid (a ValueError) / ArrowIOError for corrupt files
+        session.rollback()
+        if upload_format == 'csv':
+            raise
+        raise UploadRejected(f"Could not read {upload_format} file: {e}")
+    except Exception:
+        session.rollback()
+        raise
+
+    print(
+        f"Ingested {filename}: {summary['points_stored']} points written, "
+        f"{summary['points_unchanged']} unchanged in {elapsed:.2f}s "
+        f"(storage {summary['write_rows_per_sec']:,.0f} rows/sec)"
+    )
+    return summary
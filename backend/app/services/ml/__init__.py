@@ -3,6 +3,7 @@
 This package provides machine learning capabilities including:
 - XGBoost-based forecasting
 - Prophet baseline models
+- NumPy exponential smoothing (ETS) for short series and minimal installs
 - Time-series preprocessing and feature engineering
 - AI-powered insights generation
 """
@@ -0,0 +1,30 @@
+"""Crash- and race-safe writes of model artifacts."""
+
+import os
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Union
+
+
+@contextmanager
+def atomic_write(path: Union[str, Path]) -> Iterator[Path]:
+    """
+    Yield a temporary path to write to, then rename it over ``path``.
+    
+    The rename is atomic on the same filesystem, so readers always see either
+    the previous complete file or the new one, and concurrent writers cannot
+    interleave their bytes. The temporary name keeps the suffix because some
+    writers (XGBoost) pick the format from it.
+    
+    Args:
+        path: Final artifact path
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.stem}.{uuid.uuid4().hex}.tmp{path.suffix}")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
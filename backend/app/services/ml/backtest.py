@@ -0,0 +1,317 @@
+"""Rolling-origin backtests of forecasting models.
+
+A backtest refits a model type at several cutoffs near the end of a series
+and forecasts the horizon after each one, so accuracy is measured on data
+the model has not seen, at every forecast step. Folds are independent fits
+and run on a process pool. Results are stored per series, model type and
+horizon together with the series data version, and reused until new data
+arrives.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.services.timeseries_store import normalize_metric_name, load_series_version
+from .artifacts import atomic_write
+from .config import BACKTEST_FOLDS, BACKTEST_POOL_WORKERS, BACKTEST_STORE_DIR
+from .forecast_service import resolve_training_model_type, series_length
+from .models_ets import fit_predict_ets
+from .preprocessing import load_timeseries_data, clean_timeseries_data
+from .schemas import BacktestFold, BacktestResult
+
+# Model types that can be backtested: fit on a frame, forecast N days after it.
+# The global model is trained across series and is not refit per fold.
+FORECASTERS: Dict[str, Callable[[pd.DataFrame, int], np.ndarray]] = {"ets": fit_predict_ets}
+
+# Optional model imports - catch any error (ImportError, XGBoostError, etc.)
+try:
+    from .models_xgboost import fit_predict_xgboost, fit_predict_xgboost_direct
+    FORECASTERS.update(xgboost=fit_predict_xgboost, xgboost_direct=fit_predict_xgboost_direct)
+except Exception:
+    pass
+
+try:
+    from .models_prophet import fit_predict_prophet
+    FORECASTERS["prophet"] = fit_predict_prophet
+except Exception:
+    pass
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_backtest_pool() -> ProcessPoolExecutor:
+    """Return the shared backtest pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn, not fork: forking a process that runs server threads can
+            # copy locks in a held state into the child
+            _pool = ProcessPoolExecutor(
+                max_workers=BACKTEST_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_backtest_pool() -> None:
+    """Stop the backtest pool; the next backtest starts a new one."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class BacktestStore:
+    """Backtest results persisted as JSON, one file per series, model type and horizon."""
+    
+    def __init__(self, root: Path):
+        self.root = Path(root)
+    
+    def path(
+        self,
+        business_id: int,
+        metric_name: str,
+        model_type: str,
+        horizon: int,
+        folds: int,
+        step: int,
+        params: Optional[dict] = None
+    ) -> Path:
+        """Result file of a backtest configuration (metric names and parameters are hashed)."""
+        digest = hashlib.sha256(normalize_metric_name(metric_name).encode()).hexdigest()[:32]
+        name = f"{model_type}_h{horizon}_f{folds}_s{step}"
+        if params:
+            name += "_p" + hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+        return self.root / str(business_id) / digest / f"{name}.json"
+    
+    def get(
+        self,
+        business_id: int,
+        metric_name: str,
+        model_type: str,
+        horizon: int,
+        folds: int,
+        step: int,
+        data_version: int,
+        params: Optional[dict] = None
+    ) -> Optional[BacktestResult]:
+        """Stored result, if it was computed at ``data_version``."""
+        path = self.path(business_id, metric_name, model_type, horizon, folds, step, params)
+        try:
+            result = BacktestResult.model_validate_json(path.read_text())
+        except (OSError, ValueError):
+            return None
+        return result if result.data_version == data_version else None
+    
+    def put(self, result: BacktestResult, folds: int) -> None:
+        """Store a result computed at a known data version."""
+        path = self.path(
+            result.business_id, result.metric_name, result.model_type, result.horizon, folds, result.step,
+            result.params
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(path) as tmp_path:
+            tmp_path.write_text(result.model_dump_json())
+
+
+# Shared by every backtest in this process
+backtest_store = BacktestStore(BACKTEST_STORE_DIR)
+
+
+def _run_fold(model_type: str, train: pd.DataFrame, horizon: int, params: Optional[dict] = None) -> np.ndarray:
+    """Fit one fold and forecast the horizon after it (runs in a worker process)."""
+    if params:
+        return FORECASTERS[model_type](train, horizon, params)
+    return FORECASTERS[model_type](train, horizon)
+
+
+def fold_cutoffs(last_date: pd.Timestamp, horizon: int, folds: int, step: int) -> List[pd.Timestamp]:
+    """
+    Training cutoffs, latest first; the latest leaves exactly one horizon
+    of data after it.
+    """
+    return [last_date - pd.Timedelta(days=horizon + k * step) for k in range(folds)]
+
+
+def resolve_backtest_model_type(model_type: str, n_points: Optional[int] = None) -> str:
+    """
+    Model type a backtest fits: 'auto' is the model 'auto' would train for
+    a series of ``n_points``.
+    
+    Raises:
+        ValueError: if the model type is unknown or cannot be backtested
+    """
+    model_type = resolve_training_model_type(model_type, n_points)
+    if model_type not in FORECASTERS:
+        raise ValueError(f"Backtests are not supported for model type '{model_type}'.")
+    return model_type
+
+
+def stored_backtest(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    model_type: str,
+    horizon: int = 30,
+    folds: int = BACKTEST_FOLDS,
+    step: Optional[int] = None
+) -> Optional[BacktestResult]:
+    """
+    Stored result of a backtest (arguments as for run_backtest), if it was
+    run on the current series data.
+    
+    Raises:
+        ValueError: if the model type cannot be backtested
+    """
+    n_points = series_length(session, business_id, metric_name) if model_type == "auto" else None
+    model_type = resolve_backtest_model_type(model_type, n_points)
+    data_version = load_series_version(session, business_id, metric_name)
+    return backtest_store.get(business_id, metric_name, model_type, horizon, folds, step or horizon, data_version)
+
+
+def run_backtest(
+    session: Optional[Session],
+    business_id: int,
+    metric_name: str,
+    model_type: str,
+    horizon: int = 30,
+    folds: int = BACKTEST_FOLDS,
+    step: Optional[int] = None,
+    history: Optional[pd.DataFrame] = None,
+    data_version: Optional[int] = None,
+    parallel: bool = True,
+    params: Optional[dict] = None
+) -> BacktestResult:
+    """
+    Rolling-origin backtest of one model type on one series.
+    
+    For each cutoff the model is fit on the points up to the cutoff and
+    forecasts the ``horizon`` days after it; forecasts are compared to the
+    observed values by date. Cutoffs are ``step`` days apart, so with the
+    default step (the horizon) the forecast windows tile the end of the
+    series without overlapping.
+    
+    Args:
+        session: Database session (may be None when history is given)
+        business_id: Business ID
+        metric_name: Metric name
+        model_type: Any model type except 'xgboost_global'; 'auto' means
+            the model 'auto' would train for this series
+        horizon: Days forecast from every cutoff
+        folds: Number of cutoffs
+        step: Days between cutoffs (default: horizon)
+        history: Already loaded 'date'/'value' frame; skips the query
+        data_version: Series data version, if already known; without it
+            and without a session the result is neither read from nor
+            written to the backtest store
+        parallel: Run folds on the backtest pool (False runs them in this
+            process, e.g. inside a worker)
+        params: XGBoost parameters overriding XGBOOST_CONFIG (XGBoost
+            model types only, e.g. tuned ones)
+    
+    Returns:
+        BacktestResult with per-fold and per-step errors
+    
+    Raises:
+        ValueError: if the model type cannot be backtested or no fold has
+            enough training data
+    """
+    step = step or horizon
+    n_points = series_length(session, business_id, metric_name, history) if model_type == "auto" else None
+    model_type = resolve_backtest_model_type(model_type, n_points)
+    
+    if data_version is None and session is not None:
+        data_version = load_series_version(session, business_id, metric_name)
+    if data_version is not None:
+        cached = backtest_store.get(business_id, metric_name, model_type, horizon, folds, step, data_version, params)
+        if cached is not None:
+            return cached
+    
+    if history is None:
+        history = load_timeseries_data(session, business_id, metric_name)
+    df = clean_timeseries_data(history)
+    observed = df.set_index('date')['value']
+    
+    cutoffs = fold_cutoffs(df['date'].max(), horizon, folds, step)
+    trains = [df[df['date'] <= cutoff] for cutoff in cutoffs]
+    
+    # Submit every fold before waiting on any, so they run side by side
+    if parallel and len(cutoffs) > 1:
+        pool = get_backtest_pool()
+        pending = [pool.submit(_run_fold, model_type, train, horizon, params) for train in trains]
+        outcomes = []
+        for future in pending:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    # A worker died (e.g. out of memory); start fresh next time
+                    shutdown_backtest_pool()
+                outcomes.append(e)
+    else:
+        outcomes = []
+        for train in trains:
+            try:
+                outcomes.append(_run_fold(model_type, train, horizon, params))
+            except Exception as e:
+                outcomes.append(e)
+    
+    # Absolute errors per (fold, step); NaN where the target date has no data
+    errors = np.full((len(cutoffs), horizon), np.nan)
+    fold_results = []
+    for i, (cutoff, train, outcome) in enumerate(zip(cutoffs, trains, outcomes)):
+        fold = BacktestFold(cutoff=cutoff.date(), train_samples=len(train))
+        if isinstance(outcome, Exception):
+            fold.error = str(outcome)
+        else:
+            dates = pd.date_range(cutoff + timedelta(days=1), periods=horizon, freq='D')
+            actual = observed.reindex(dates).to_numpy(dtype=float)
+            errors[i] = np.abs(np.asarray(outcome, dtype=float) - actual)
+            fold.test_samples = int(np.isfinite(errors[i]).sum())
+            if fold.test_samples:
+                fold.mae = float(np.nanmean(errors[i]))
+        fold_results.append(fold)
+    
+    if not np.isfinite(errors).any():
+        reasons = [fold.error for fold in fold_results if fold.error]
+        raise ValueError(
+            f"No backtest fold could be evaluated for business_id={business_id}, metric={metric_name}"
+            + (f": {reasons[0]}" if reasons else "")
+        )
+    
+    seen = np.isfinite(errors).any(axis=0)
+    with np.errstate(invalid="ignore"):
+        mae_by_step = np.nanmean(np.where(seen, errors, 0.0), axis=0)
+        rmse_by_step = np.sqrt(np.nanmean(np.where(seen, errors ** 2, 0.0), axis=0))
+    
+    result = BacktestResult(
+        business_id=business_id,
+        metric_name=metric_name,
+        model_type=model_type,
+        horizon=horizon,
+        step=step,
+        data_version=data_version,
+        params=params or None,
+        folds=fold_results,
+        mae=float(np.nanmean(errors)),
+        rmse=float(np.sqrt(np.nanmean(errors ** 2))),
+        mae_by_step=[float(v) if ok else None for v, ok in zip(mae_by_step, seen)],
+        rmse_by_step=[float(v) if ok else None for v, ok in zip(rmse_by_step, seen)],
+        computed_at=datetime.utcnow()
+    )
+    if data_version is not None:
+        backtest_store.put(result, folds)
+    return result
@@ -0,0 +1,196 @@
+"""Batch forecasting over a bounded process pool.
+
+Model fitting and inference are CPU-bound and hold the GIL, so a batch is
+fanned out over worker processes instead of threads. The API process loads
+the trailing window each requested model reads (see BATCH_HISTORY_POINTS)
+with one query and ships each worker only that frame; workers never open a
+database session.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import pandas as pd
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.services.timeseries_store import load_series_versions
+from .config import FORECAST_POOL_WORKERS, BATCH_HISTORY_POINTS
+from .forecast_cache import forecast_cache
+from .forecast_service import ForecastService, ModelNotTrained
+from .preprocessing import load_timeseries_batch
+from .schemas import BatchForecastResult, ForecastRequest, ForecastResponse
+from .single_flight import AsyncSingleFlight
+from .training_jobs import enqueue_training
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Worker calls in flight on the API event loop, by request identity
+_batch_flights = AsyncSingleFlight()
+
+
+def get_forecast_pool() -> ProcessPoolExecutor:
+    """Return the shared worker pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn, not fork: forking a process that runs server threads can
+            # copy locks in a held state into the child
+            _pool = ProcessPoolExecutor(
+                max_workers=FORECAST_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_forecast_pool() -> None:
+    """Stop the worker pool; the next batch starts a new one."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _forecast_in_worker(request: ForecastRequest, history: pd.DataFrame) -> ForecastResponse:
+    """Run one forecast in a worker process."""
+    return ForecastService.generate_forecast(None, request, history=history)
+
+
+def _error_result(error: Exception) -> Tuple[int, str]:
+    """Status and detail the single-forecast endpoint returns for the same error."""
+    if isinstance(error, ValueError):
+        return 400, str(error)
+    if isinstance(error, ImportError):
+        return 503, f"ML dependency missing: {str(error)}"
+    return 500, f"Forecast failed: {str(error)}"
+
+
+def _plan_requests(
+    requests: List[ForecastRequest],
+    versions: Dict[Tuple[int, str], int]
+) -> List[Tuple[Optional[str], Optional[tuple], Optional[Exception]]]:
+    """
+    Model and forecast cache key of each request. Reads the registry, so it
+    runs in a thread, not on the event loop.
+
+    Returns:
+        (model_type, cache_key, error) per request, in request order
+    """
+    plans = []
+    for request in requests:
+        try:
+            chosen_model = ForecastService.choose_model(request.business_id, request.metric_name, request.model_type)
+            version = versions[(request.business_id, request.metric_name)]
+            plans.append((chosen_model, ForecastService.cache_key(request, version, chosen_model), None))
+        except Exception as e:
+            plans.append((None, None, e))
+    return plans
+
+
+def _load_histories(
+    session: Session,
+    windowed: List[Tuple[int, str]],
+    full: List[Tuple[int, str]]
+) -> Dict[Tuple[int, str], pd.DataFrame]:
+    """Trailing BATCH_HISTORY_POINTS of the ``windowed`` series, whole ``full`` series."""
+    histories = load_timeseries_batch(session, windowed, last_n=BATCH_HISTORY_POINTS) if windowed else {}
+    if full:
+        histories.update(load_timeseries_batch(session, full))
+    return histories
+
+
+async def iter_batch_forecasts(
+    session: Session,
+    requests: List[ForecastRequest]
+) -> AsyncIterator[BatchForecastResult]:
+    """
+    Generate forecasts concurrently, yielding each one as soon as it is done.
+    
+    A failing request yields an error result instead of failing the batch.
+    A series without a trained model gets a training job and a 202 result.
+    
+    Args:
+        session: Database session, used up front to load the data versions
+            and the history of every series not served from the cache (and
+            to queue training jobs)
+        requests: Forecasts to generate
+    
+    Returns:
+        Async iterator of BatchForecastResult in completion order
+    """
+    series = [(req.business_id, req.metric_name) for req in requests]
+    versions = await run_in_threadpool(load_series_versions, session, series)
+    plans = await run_in_threadpool(_plan_requests, requests, versions)
+    # Cached results are served without loading their series
+    cached = [
+        forecast_cache.get(cache_key) if cache_key is not None else None
+        for _, cache_key, _ in plans
+    ]
+    to_load = [
+        (request, chosen_model)
+        for request, (chosen_model, _, error), forecast in zip(requests, plans, cached)
+        if forecast is None and error is None
+    ]
+    histories = await run_in_threadpool(
+        _load_histories,
+        session,
+        [(req.business_id, req.metric_name) for req, chosen_model in to_load if chosen_model != "ets"],
+        [(req.business_id, req.metric_name) for req, chosen_model in to_load if chosen_model == "ets"],
+    )
+    loop = asyncio.get_running_loop()
+    pool = get_forecast_pool()
+    # The session is not thread-safe; queue training jobs one at a time
+    session_lock = asyncio.Lock()
+
+    async def run(index: int, request: ForecastRequest) -> BatchForecastResult:
+        result = BatchForecastResult(
+            index=index, business_id=request.business_id, metric_name=request.metric_name, status=200
+        )
+        _, cache_key, plan_error = plans[index]
+        result.forecast = cached[index]
+        try:
+            if plan_error is not None:
+                raise plan_error
+            if result.forecast is None:
+                history = histories.get((request.business_id, request.metric_name))
+                if history is None:
+                    raise ValueError(
+                        f"No data found for business_id={request.business_id}, metric={request.metric_name}"
+                    )
+                
+                async def compute() -> ForecastResponse:
+                    response = await loop.run_in_executor(pool, _forecast_in_worker, request, history)
+                    if cache_key is not None:
+                        forecast_cache.put(cache_key, response)
+                    return response
+                
+                # Identical requests in this or concurrent batches share one worker call
+                flight_key = cache_key or (
+                    request.business_id, request.metric_name, request.model_type, request.horizon,
+                    request.include_intervals
+                )
+                result.forecast = await _batch_flights.do(flight_key, compute)
+        except ModelNotTrained as e:
+            try:
+                async with session_lock:
+                    job = await run_in_threadpool(
+                        enqueue_training, session, e.business_id, e.metric_name, e.model_type, e.horizon
+                    )
+                result.status, result.error, result.job_id = 202, f"{e}; training job {job.id} queued", job.id
+            except Exception as queue_error:
+                result.status, result.error = _error_result(queue_error)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # A worker died (e.g. out of memory); start fresh next batch
+                shutdown_forecast_pool()
+            result.status, result.error = _error_result(e)
+        return result
+
+    for finished in asyncio.as_completed([run(i, req) for i, req in enumerate(requests)]):
+        yield await finished
@@ -0,0 +1,355 @@
+"""Compiled inference for XGBoost boosters.
+
+Recursive forecasts predict one row per step, and the per-call overhead of
+``Booster.inplace_predict`` (tens of microseconds) dominates the cost of
+walking a few hundred tree nodes. Like treelite, this module evaluates the
+trees in native code: a booster is flattened into node arrays (feature,
+threshold, children, default direction; leaves hold their value in the
+threshold slot) and walked by a small C routine. The routine does not
+depend on the model, so it is compiled once per host with the system C
+compiler and loaded with ctypes; models only add arrays, built once per
+booster (i.e. per cached model version). The library is built into a
+directory only this user can write to, and its SHA-256 is recorded next to
+it and checked before every load; a library that does not match is rebuilt
+rather than loaded.
+
+Without a C compiler, with COMPILED_TREES_ENABLED off, or for boosters it
+cannot reproduce exactly (categorical splits, non-identity objectives,
+linear or dart boosters), ``compile_booster`` returns None and callers
+predict with the booster itself.
+
+Compare both paths on a synthetic model with:
+    cd backend && python -m app.services.ml.compiled_trees
+"""
+
+import ctypes
+import hashlib
+import json
+import os
+import stat
+import subprocess
+import threading
+import weakref
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import xgboost as xgb
+
+from .artifacts import atomic_write
+from .config import COMPILED_TREES_ENABLED, TREE_RUNTIME_CC, TREE_RUNTIME_DIR
+
+# Objectives whose prediction is the raw margin (base_score + leaf sum)
+IDENTITY_OBJECTIVES = {"reg:squarederror", "reg:absoluteerror", "reg:pseudohubererror", "reg:quantileerror"}
+
+# Same accumulation order as XGBoost's CPU predictor (base score, then each
+# tree in turn, in float), so results match it exactly
+RUNTIME_SOURCE = r"""
+#include <math.h>
+
+typedef struct {
+    int n_trees;
+    int n_features;
+    float base_score;
+    const int *roots;
+    const int *feature;
+    const float *threshold;
+    const int *left;
+    const int *right;
+    const unsigned char *default_left;
+} Forest;
+
+static float predict_one(const Forest *f, const float *x) {
+    float sum = f->base_score;
+    for (int t = 0; t < f->n_trees; t++) {
+        int node = f->roots[t];
+        while (f->left[node] >= 0) {
+            float v = x[f->feature[node]];
+            if (isnan(v)) {
+                node = f->default_left[node] ? f->left[node] : f->right[node];
+            } else {
+                node = v < f->threshold[node] ? f->left[node] : f->right[node];
+            }
+        }
+        sum += f->threshold[node];
+    }
+    return sum;
+}
+
+float forest_predict_row(const Forest *f, const float *X, long row) {
+    return predict_one(f, X + row * f->n_features);
+}
+
+void forest_predict(const Forest *f, const float *X, long n_rows, float *out) {
+    for (long row = 0; row < n_rows; row++) {
+        out[row] = predict_one(f, X + row * f->n_features);
+    }
+}
+"""
+
+
+class _Forest(ctypes.Structure):
+    _fields_ = [
+        ("n_trees", ctypes.c_int),
+        ("n_features", ctypes.c_int),
+        ("base_score", ctypes.c_float),
+        ("roots", ctypes.c_void_p),
+        ("feature", ctypes.c_void_p),
+        ("threshold", ctypes.c_void_p),
+        ("left", ctypes.c_void_p),
+        ("right", ctypes.c_void_p),
+        ("default_left", ctypes.c_void_p),
+    ]
+
+
+_runtime = None
+_runtime_error: Optional[str] = None
+_runtime_lock = threading.Lock()
+
+# Compiled forest of each live booster (None: not compilable), so a cached
+# model is flattened once
+_forests: "weakref.WeakKeyDictionary[xgb.Booster, Optional[CompiledForest]]" = weakref.WeakKeyDictionary()
+_forests_lock = threading.Lock()
+
+
+def _private_dir(path: Path) -> Path:
+    """
+    Create ``path`` readable and writable by this user only, or check that
+    an existing one is.
+    
+    Raises:
+        PermissionError: if the directory is a symlink, belongs to another
+            user, or is writable by group or others
+    """
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    info = os.lstat(path)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+        or (hasattr(os, "getuid") and info.st_uid != os.getuid())
+    ):
+        raise PermissionError(f"{path} must be a directory owned and only writable by this user")
+    return path
+
+
+def _file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _verified(library: Path, checksum: Path) -> bool:
+    """Whether ``library`` exists and matches the SHA-256 recorded when it was built."""
+    try:
+        return _file_sha256(library) == checksum.read_text().strip()
+    except OSError:
+        return False
+
+
+def _build_runtime(directory: Path, digest: str, library: Path, checksum: Path) -> None:
+    """Compile the runtime into ``library`` and record its SHA-256 in ``checksum``."""
+    source = directory / f"forest_{digest}.c"
+    with atomic_write(source) as tmp_path:
+        tmp_path.write_text(RUNTIME_SOURCE)
+    with atomic_write(library) as tmp_library:
+        subprocess.run(
+            [TREE_RUNTIME_CC, "-O2", "-shared", "-fPIC", "-o", str(tmp_library), str(source)],
+            check=True, capture_output=True, timeout=120
+        )
+        # Recorded before the library is in place: a reader never finds a
+        # library without the checksum it was built with
+        with atomic_write(checksum) as tmp_path:
+            tmp_path.write_text(_file_sha256(tmp_library))
+
+
+def load_runtime() -> Optional[ctypes.CDLL]:
+    """
+    The compiled tree runtime, building it on first use.
+    
+    The shared library is named by the hash of its source, so processes
+    sharing TREE_RUNTIME_DIR build it once. The directory must be private
+    to this user, and the library is only loaded if it matches the
+    SHA-256 recorded when it was built (otherwise it is rebuilt).
+    
+    Returns:
+        The loaded library, or None if it cannot be built (the reason is
+        printed once)
+    """
+    global _runtime, _runtime_error
+    with _runtime_lock:
+        if _runtime is not None or _runtime_error is not None:
+            return _runtime
+        digest = hashlib.sha256(RUNTIME_SOURCE.encode()).hexdigest()[:16]
+        try:
+            directory = _private_dir(TREE_RUNTIME_DIR)
+            library = directory / f"forest_{digest}.so"
+            checksum = directory / f"forest_{digest}.sha256"
+            if not _verified(library, checksum):
+                _build_runtime(directory, digest, library, checksum)
+                if not _verified(library, checksum):
+                    raise OSError(f"{library} changed while it was being built")
+            lib = ctypes.CDLL(str(library))
+        except (OSError, subprocess.SubprocessError) as e:
+            _runtime_error = str(e)
+            print(f"Compiled tree inference not available, using native XGBoost prediction: {e}")
+            return None
+        
+        lib.forest_predict_row.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_long]
+        lib.forest_predict_row.restype = ctypes.c_float
+        lib.forest_predict.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_long, ctypes.c_void_p]
+        lib.forest_predict.restype = None
+        _runtime = lib
+        return lib
+
+
+def _base_score(learner: dict) -> Optional[float]:
+    """
+    The booster's single base score, or None if it has several or cannot
+    be read.
+    
+    XGBoost 2.0 stores a number ("5E-1"); later versions store a vector
+    ("[5E-1]") to allow one per target.
+    """
+    raw = learner["learner_model_param"].get("base_score")
+    try:
+        values = [float(value) for value in str(raw).strip().strip("[]").split(",")]
+    except ValueError:
+        return None
+    return values[0] if len(values) == 1 else None
+
+
+class CompiledForest:
+    """A booster's trees as flat node arrays, evaluated by the compiled runtime."""
+    
+    def __init__(self, lib: ctypes.CDLL, booster_json: dict):
+        learner = booster_json["learner"]
+        model = learner["gradient_booster"]["model"]
+        trees = model["trees"]
+        
+        roots, feature, threshold, left, right, default_left = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            lefts = np.asarray(tree["left_children"], dtype=np.int32)
+            rights = np.asarray(tree["right_children"], dtype=np.int32)
+            is_leaf = lefts < 0
+            roots.append(offset)
+            feature.append(np.asarray(tree["split_indices"], dtype=np.int32))
+            # Leaves keep their value in split_conditions
+            threshold.append(np.asarray(tree["split_conditions"], dtype=np.float32))
+            left.append(np.where(is_leaf, -1, lefts + offset))
+            right.append(np.where(is_leaf, -1, rights + offset))
+            default_left.append(np.asarray(tree["default_left"], dtype=np.uint8))
+            offset += len(lefts)
+        
+        # Kept referenced: the struct only holds their addresses
+        self._arrays = [
+            np.ascontiguousarray(np.asarray(roots, dtype=np.int32)),
+            *(np.ascontiguousarray(np.concatenate(parts)) for parts in (feature, threshold, left, right, default_left)),
+        ]
+        self.n_trees = len(trees)
+        self.n_nodes = offset
+        self.n_features = int(learner["learner_model_param"]["num_feature"])
+        self._struct = _Forest(
+            self.n_trees,
+            self.n_features,
+            _base_score(learner),
+            *(array.ctypes.data for array in self._arrays),
+        )
+        self._address = ctypes.addressof(self._struct)
+        self._lib = lib
+    
+    def row_predictor(self, X: np.ndarray) -> Callable[[int], float]:
+        """
+        Predictor of single rows of ``X``, for loops that fill X row by row.
+        
+        Args:
+            X: float32, C-contiguous feature matrix; must stay alive and in
+                place while the predictor is used
+        
+        Returns:
+            Function of a row index returning that row's prediction
+        """
+        if X.dtype != np.float32 or not X.flags.c_contiguous or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected a C-contiguous float32 matrix with {self.n_features} columns")
+        predict_row, forest, address = self._lib.forest_predict_row, self._address, X.ctypes.data
+        return lambda row: predict_row(forest, address, row)
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predictions for every row of a feature matrix."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected a matrix with {self.n_features} columns")
+        out = np.empty(len(X), dtype=np.float32)
+        self._lib.forest_predict(self._address, X.ctypes.data, len(X), out.ctypes.data)
+        return out
+
+
+def _compilable(booster_json: dict) -> bool:
+    """Whether the runtime reproduces this booster's predictions."""
+    learner = booster_json["learner"]
+    gradient_booster = learner["gradient_booster"]
+    if gradient_booster.get("name") != "gbtree":
+        return False
+    if learner["objective"]["name"] not in IDENTITY_OBJECTIVES:
+        return False
+    if int(learner["learner_model_param"].get("num_target", 1)) > 1:
+        return False
+    if _base_score(learner) is None:
+        return False
+    return all(not any(tree.get("split_type", [])) for tree in gradient_booster["model"]["trees"])
+
+
+def compile_booster(booster: xgb.Booster) -> Optional[CompiledForest]:
+    """
+    Compiled form of a booster, built on first use and kept while the
+    booster is alive.
+    
+    Returns:
+        CompiledForest, or None when compiled inference is disabled, not
+        available on this host, or cannot reproduce the booster
+    """
+    if not COMPILED_TREES_ENABLED:
+        return None
+    with _forests_lock:
+        if booster in _forests:
+            return _forests[booster]
+    
+    lib = load_runtime()
+    forest = None
+    if lib is not None:
+        booster_json = json.loads(booster.save_raw("json"))
+        if _compilable(booster_json):
+            forest = CompiledForest(lib, booster_json)
+    
+    with _forests_lock:
+        _forests[booster] = forest
+    return forest
+
+
+if __name__ == "__main__":
+    import time
+    
+    from .config import XGBOOST_CONFIG
+    
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(5000, 15)).astype(np.float32)
+    X[rng.random(X.shape) < 0.02] = np.nan
+    y = np.nansum(X[:, :5], axis=1) + rng.normal(size=len(X))
+    booster = xgb.XGBRegressor(**XGBOOST_CONFIG).fit(X, y).get_booster()
+    
+    forest = compile_booster(booster)
+    if forest is None:
+        raise SystemExit("Compiled tree inference is not available on this host")
+    
+    native = booster.inplace_predict(X)
+    compiled = forest.predict(X)
+    print(f"{forest.n_trees} trees, {forest.n_nodes} nodes; max |native - compiled| = {np.abs(native - compiled).max()}")
+    
+    rows = X[:1000].copy()
+    predict_row = forest.row_predictor(rows)
+    for name, predict in (
+        ("native", lambda row: float(booster.inplace_predict(rows[row:row + 1])[0])),
+        ("compiled", predict_row),
+    ):
+        start = time.perf_counter()
+        for row in range(len(rows)):
+            predict(row)
+        print(f"{name:>9}: {(time.perf_counter() - start) / len(rows) * 1e6:.1f} us per single-row predict")
@@ -5,9 +5,29 @@ from pathlib import Path
 
 # Model storage paths
 BASE_DIR = Path(__file__).parent
-MODELS_STORE_DIR = BASE_DIR / "models_store"
+MODELS_STORE_DIR = BASE_DIR / "models_store"  # loose model files from before the registry
 MODELS_STORE_DIR.mkdir(exist_ok=True)
 
+# Data written at runtime (registry, feature store, backtests) lives outside
+# the package; relative paths resolve against the working directory, like
+# the SQLite fallback database. Each store can be moved on its own.
+ML_DATA_DIR = Path(os.getenv("ML_DATA_DIR", "ml_data")).absolute()
+
+# Persisted per-series feature matrices (Parquet), see preprocessing.FeatureStore
+FEATURE_STORE_DIR = Path(os.getenv("FEATURE_STORE_DIR", ML_DATA_DIR / "feature_store"))
+
+# Versioned model registry (content-addressed artifacts + index.json manifest).
+# Set the same directory for the dashboard model-serving API to share it.
+MODEL_REGISTRY_DIR = Path(os.getenv("MODEL_REGISTRY_DIR", ML_DATA_DIR / "registry"))
+REGISTRY_REFRESH_SECONDS = float(os.getenv("REGISTRY_REFRESH_SECONDS", 1.0))  # index re-check interval
+REGISTRY_KEEP_VERSIONS = int(os.getenv("REGISTRY_KEEP_VERSIONS", 5))  # versions kept per model
+
+# In-process model cache budget (bytes of serialized model files)
+MODEL_CACHE_MAX_BYTES = int(os.getenv("MODEL_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# In-process forecast result cache (entries; one per series/horizon/versions)
+FORECAST_CACHE_MAX_ENTRIES = int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", 1024))
+
 # XGBoost configuration
 XGBOOST_CONFIG = {
     "n_estimators": 100,
@@ -17,6 +37,14 @@ XGBOOST_CONFIG = {
     "random_state": 42,
 }
 
+# Compiled XGBoost inference (see compiled_trees.py): boosters are evaluated
+# by a small C routine built once per host with TREE_RUNTIME_CC and kept in
+# TREE_RUNTIME_DIR (owner-only; the library is checked against its recorded
+# SHA-256 before loading); without a compiler, boosters predict natively
+COMPILED_TREES_ENABLED = os.getenv("COMPILED_TREES_ENABLED", "true").lower() in ("1", "true", "yes")
+TREE_RUNTIME_CC = os.getenv("CC", "cc")
+TREE_RUNTIME_DIR = Path(os.getenv("TREE_RUNTIME_DIR", ML_DATA_DIR / "tree_runtime"))
+
 # Prophet configuration
 PROPHET_CONFIG = {
     "changepoint_prior_scale": 0.05,
@@ -27,10 +55,122 @@ PROPHET_CONFIG = {
     "yearly_seasonality": True,
 }
 
+# Prophet inference: uncertainty samples per forecast (Prophet's default is
+# 1000; fewer is faster with noisier intervals), days of future forecast
+# computed and cached per model version, and how many such frames to keep
+PROPHET_UNCERTAINTY_SAMPLES = int(os.getenv("PROPHET_UNCERTAINTY_SAMPLES", 1000))
+PROPHET_FUTURE_DAYS = 90
+PROPHET_FUTURE_CACHE_ENTRIES = int(os.getenv("PROPHET_FUTURE_CACHE_ENTRIES", 256))
+
 # Feature engineering
 LAG_FEATURES = [1, 7, 14, 30]  # Lag days
 ROLLING_WINDOWS = [7, 14, 30]  # Rolling average windows
 
+# Points loaded for recursive inference: one feature depth is dropped as
+# lag/rolling warm-up, the next one seeds the recursion
+INFERENCE_LOOKBACK = 2 * max(LAG_FEATURES + ROLLING_WINDOWS)
+
+# XGBoost prediction intervals (split conformal): coverage, and the most
+# held-out forecast origins whose residuals calibrate them at training time
+XGBOOST_INTERVAL_WIDTH = 0.8
+CONFORMAL_MAX_ORIGINS = 40
+
+# Direct multi-horizon XGBoost: shortest horizon a model is trained for, and
+# cap on (origin, horizon) training pairs (pairs are subsampled above it)
+DIRECT_MIN_HORIZON = 90
+DIRECT_MAX_TRAINING_ROWS = 200_000
+
+# Rolling-origin backtests: folds per run (each forecasts one horizon from an
+# earlier cutoff), worker processes running folds, and where results are
+# kept (one file per series/model/horizon, reused while the data is unchanged)
+BACKTEST_FOLDS = int(os.getenv("BACKTEST_FOLDS", 3))
+BACKTEST_POOL_WORKERS = int(os.getenv("BACKTEST_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+BACKTEST_STORE_DIR = Path(os.getenv("BACKTEST_STORE_DIR", ML_DATA_DIR / "backtests"))
+
+# Model tournaments for 'auto': model types backtested on every series (the
+# most accurate one is recorded in the registry), the horizon they are scored
+# on, and series loaded per batch by a fleet-wide run
+TOURNAMENT_CANDIDATES = ["ets", "xgboost", "xgboost_direct", "prophet"]
+TOURNAMENT_HORIZON = int(os.getenv("TOURNAMENT_HORIZON", 30))
+TOURNAMENT_BATCH_SIZE = 50
+
+# Hyperparameter tuning of the XGBoost models (see tuning.py). Ranges are
+# (low, high, scale) with scale 'int', 'linear' or 'log'; parameters not
+# listed keep their XGBOOST_CONFIG value.
+TUNING_SEARCH_SPACE = {
+    "n_estimators": (50, 400, "int"),
+    "max_depth": (2, 8, "int"),
+    "learning_rate": (0.01, 0.3, "log"),
+    "min_child_weight": (1.0, 20.0, "log"),
+    "subsample": (0.6, 1.0, "linear"),
+    "colsample_bytree": (0.5, 1.0, "linear"),
+    "reg_lambda": (0.1, 10.0, "log"),
+}
+TUNING_TRIALS = int(os.getenv("TUNING_TRIALS", 27))  # parameter sets per search, XGBOOST_CONFIG included
+TUNING_FOLDS = 3  # successive-halving rungs; rung k scores trials on the k-th latest fold
+TUNING_REDUCTION_FACTOR = 3  # 1/N of the trials advance per rung (2 = median pruning)
+TUNING_HORIZON = int(os.getenv("TUNING_HORIZON", 30))
+# CPU budget: worker processes, each fitting with one thread
+TUNING_POOL_WORKERS = int(os.getenv("TUNING_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+# Wall-clock budget of a fleet-wide run, and of a single-series search
+TUNING_WINDOW_SECONDS = float(os.getenv("TUNING_WINDOW_SECONDS", 6 * 3600))
+TUNING_SERIES_SECONDS = float(os.getenv("TUNING_SERIES_SECONDS", 300))
+# Fleet runs tune one parameter set per metric (series cluster), scored on
+# a sample of its series, instead of one per series
+TUNING_CLUSTER_BY_METRIC = os.getenv("TUNING_CLUSTER_BY_METRIC", "true").lower() in ("1", "true", "yes")
+TUNING_CLUSTER_SAMPLE = int(os.getenv("TUNING_CLUSTER_SAMPLE", 5))
+TUNING_REFRESH_DAYS = int(os.getenv("TUNING_REFRESH_DAYS", 7))  # tuned parameters older than this are re-tuned
+
+# Global cross-series XGBoost model: one booster trained on every series,
+# each scaled by its recent mean level. With GLOBAL_MODEL_ENABLED, 'auto'
+# serves series without a model of their own from it (including series too
+# short to train one) instead of queueing a per-series training job.
+GLOBAL_MODEL_ENABLED = os.getenv("GLOBAL_MODEL_ENABLED", "false").lower() in ("1", "true", "yes")
+GLOBAL_MODEL_SERIES = (0, "*")  # (business_id, metric_name) the model is registered under
+GLOBAL_HISTORY_DAYS = int(os.getenv("GLOBAL_HISTORY_DAYS", 730))  # days of history loaded for training
+GLOBAL_SCALE_WINDOW = 90  # trailing points averaged into a series' scale
+GLOBAL_MAX_TRAINING_ROWS = int(os.getenv("GLOBAL_MAX_TRAINING_ROWS", 2_000_000))  # split evenly across series
+GLOBAL_LOAD_BATCH_SIZE = 200  # series loaded per query while building the training set
+# Share of training rows trained with their metric/business codes missing, the
+# way unseen series are encoded, so cold-start forecasts follow learned splits
+GLOBAL_UNSEEN_CODE_FRACTION = float(os.getenv("GLOBAL_UNSEEN_CODE_FRACTION", 0.1))
+
+# Exponential smoothing (ETS, additive damped trend + weekly seasonality).
+# Parameters are picked from this grid, all combinations searched at once.
+ETS_SEASON_LENGTH = 7
+ETS_PARAM_GRID = {
+    "alpha": [0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9],  # level smoothing
+    "beta_ratio": [0.0, 0.05, 0.1, 0.3],  # trend smoothing as a fraction of alpha
+    "gamma": [0.0, 0.05, 0.1, 0.2, 0.4],  # seasonal smoothing (kept <= 1 - alpha)
+    "phi": [0.8, 0.9, 0.95, 0.98, 1.0],  # trend damping (1.0 = undamped Holt-Winters)
+}
+ETS_MIN_SAMPLES = 3 * ETS_SEASON_LENGTH  # Minimum data points required for ETS
+ETS_SHORT_SERIES = 90  # 'auto' trains ETS for series shorter than this
+ETS_INTERVAL_WIDTH = 0.8  # Prediction interval coverage (Prophet's default)
+
+# Batch forecasts: worker processes for model work, and requests per batch
+FORECAST_POOL_WORKERS = int(os.getenv("FORECAST_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+MAX_BATCH_FORECASTS = int(os.getenv("MAX_BATCH_FORECASTS", 200))
+# Trailing points shipped to a batch worker per series: what XGBoost and the
+# global model read at inference, and enough for 'auto' to spot short series.
+# ETS models get the whole series (they catch up on every point since training).
+BATCH_HISTORY_POINTS = max(INFERENCE_LOOKBACK, GLOBAL_SCALE_WINDOW, ETS_SHORT_SERIES)
+
+# Training jobs: worker processes fitting models (queued jobs wait for a slot)
+TRAINING_POOL_WORKERS = int(os.getenv("TRAINING_POOL_WORKERS", min(2, os.cpu_count() or 1)))
+# Jobs running longer than this are taken to have lost their worker and are
+# failed (at startup, and when the same model is queued again); keep it well
+# above the longest training run
+TRAINING_JOB_LEASE_SECONDS = float(os.getenv("TRAINING_JOB_LEASE_SECONDS", 2 * 3600))
+
+# Incremental XGBoost retraining: boosting rounds added per update, days
+# before the previous cutoff refit alongside the new data, and when to fall
+# back to a full retrain (model age or number of stacked updates)
+INCREMENTAL_ROUNDS = int(os.getenv("INCREMENTAL_ROUNDS", 20))
+INCREMENTAL_CONTEXT_DAYS = int(os.getenv("INCREMENTAL_CONTEXT_DAYS", 90))
+FULL_RETRAIN_INTERVAL_DAYS = int(os.getenv("FULL_RETRAIN_INTERVAL_DAYS", 7))
+MAX_INCREMENTAL_UPDATES = int(os.getenv("MAX_INCREMENTAL_UPDATES", 10))
+
 # Forecast settings
 MIN_TRAINING_SAMPLES = 30  # Minimum data points required for training
 TRAIN_TEST_SPLIT = 0.8  # Train/test split ratio
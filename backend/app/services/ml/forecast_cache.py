@@ -0,0 +1,88 @@
+"""Process-wide cache of forecast results."""
+
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from .config import FORECAST_CACHE_MAX_ENTRIES
+from .schemas import ForecastResponse
+
+
+class ForecastCache:
+    """
+    LRU cache of forecast responses.
+    
+    Entries are keyed by (business_id, metric_name, model_type, horizon,
+    include_intervals, model artifact hash, series data version). Ingesting new points bumps the
+    data version and retraining changes the model hash, so a stale entry can
+    never match; it only lingers until evicted or replaced.
+    """
+    
+    def __init__(self, max_entries: int = FORECAST_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, ForecastResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def key(
+        business_id: int,
+        metric_name: str,
+        model_type: str,
+        horizon: int,
+        model_hash: str,
+        data_version: int,
+        include_intervals: bool = True
+    ) -> tuple:
+        """Cache key for one forecast."""
+        return (business_id, metric_name, model_type, horizon, include_intervals, model_hash, data_version)
+    
+    def get(self, key: tuple) -> Optional[ForecastResponse]:
+        """Return the cached response (shared; callers must not mutate it) or None."""
+        with self._lock:
+            response = self._entries.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return response
+    
+    def put(self, key: tuple, response: ForecastResponse) -> None:
+        """Store a response, replacing entries for older model/data versions."""
+        with self._lock:
+            self._discard(lambda k: k[:5] == key[:5] and k != key)
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, business_id: int, metric_name: str) -> None:
+        """Drop every cached forecast for a series."""
+        with self._lock:
+            self._discard(lambda k: k[0] == business_id and k[1] == metric_name)
+    
+    def clear(self) -> None:
+        """Drop every cached forecast."""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> dict:
+        """Current size and hit/miss counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+    
+    def _discard(self, predicate) -> None:
+        """Remove matching entries. Caller holds the lock."""
+        for key in [k for k in self._entries if predicate(k)]:
+            del self._entries[key]
+
+
+# Shared by every request in this process
+forecast_cache = ForecastCache()
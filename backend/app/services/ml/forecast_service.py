@@ -1,13 +1,24 @@
 """Forecast service orchestrating ML model training and predictions."""
 
+import pandas as pd
 from typing import Optional
 from sqlalchemy.orm import Session
 
+from app.services.timeseries_store import load_series_version
+from .config import ETS_SHORT_SERIES, GLOBAL_MODEL_ENABLED, GLOBAL_MODEL_SERIES
+from .forecast_cache import forecast_cache
+from .models_ets import train_ets_model, predict_ets, model_exists as ets_exists
+from .preprocessing import count_timeseries_points
+from .registry import registry
 from .schemas import ForecastRequest, ForecastResponse
+from .single_flight import SingleFlight
 
 # Optional model imports - catch any error (ImportError, XGBoostError, etc.)
 try:
     from .models_xgboost import train_xgboost_model, predict_xgboost, model_exists as xgboost_exists
+    from .models_xgboost import train_xgboost_direct_model, predict_xgboost_direct, direct_model_exists
+    from .models_xgboost import update_xgboost_model
+    from .models_xgboost import train_xgboost_global_model, predict_xgboost_global, global_model_exists
     HAS_XGBOOST = True
 except Exception as e:
     HAS_XGBOOST = False
@@ -15,6 +26,13 @@ except Exception as e:
     def xgboost_exists(*args, **kwargs): return False
     def train_xgboost_model(*args, **kwargs): raise ImportError("XGBoost not available")
     def predict_xgboost(*args, **kwargs): raise ImportError("XGBoost not available")
+    def direct_model_exists(*args, **kwargs): return False
+    def train_xgboost_direct_model(*args, **kwargs): raise ImportError("XGBoost not available")
+    def predict_xgboost_direct(*args, **kwargs): raise ImportError("XGBoost not available")
+    def update_xgboost_model(*args, **kwargs): raise ImportError("XGBoost not available")
+    def global_model_exists(*args, **kwargs): return False
+    def train_xgboost_global_model(*args, **kwargs): raise ImportError("XGBoost not available")
+    def predict_xgboost_global(*args, **kwargs): raise ImportError("XGBoost not available")
 
 try:
     from .models_prophet import train_prophet_model, predict_prophet, model_exists as prophet_exists
@@ -27,80 +45,259 @@ except Exception as e:
     def predict_prophet(*args, **kwargs): raise ImportError("Prophet not available")
 
 
+# In-flight forecasts and trainings in this process, by request identity
+_forecast_flights = SingleFlight()
+_training_flights = SingleFlight()
+
+
+class ModelNotTrained(Exception):
+    """Raised when a forecast needs a model that has not been trained yet."""
+    
+    def __init__(self, business_id: int, metric_name: str, model_type: str, horizon: int):
+        super().__init__(business_id, metric_name, model_type, horizon)
+        self.business_id = business_id
+        self.metric_name = metric_name
+        self.model_type = model_type
+        self.horizon = horizon
+    
+    def __str__(self) -> str:
+        return (
+            f"No trained {self.model_type} model for business {self.business_id}, "
+            f"metric {self.metric_name} (horizon {self.horizon})"
+        )
+
+
+def resolve_training_model_type(model_type: str, n_points: Optional[int] = None) -> str:
+    """
+    Map a requested model type to the concrete model to train.
+    
+    Args:
+        model_type: 'xgboost', 'xgboost_direct', 'xgboost_global', 'prophet',
+            'ets' or 'auto'
+        n_points: Length of the series, if known (see series_length)
+    
+    Returns:
+        Concrete model type. 'auto' picks ETS for series shorter than
+        ETS_SHORT_SERIES, else XGBoost, else Prophet, and ETS when neither
+        library is installed.
+    
+    Raises:
+        ValueError: if the model type is unknown or its library is missing
+    """
+    if model_type == "auto":
+        if n_points is not None and n_points < ETS_SHORT_SERIES:
+            return "ets"
+        if HAS_XGBOOST:
+            return "xgboost"
+        if HAS_PROPHET:
+            return "prophet"
+        return "ets"
+    if model_type == "ets":
+        return model_type
+    if model_type in ("xgboost", "xgboost_direct", "xgboost_global"):
+        if not HAS_XGBOOST:
+            raise ValueError("XGBoost not available. Please install: pip install xgboost")
+        return model_type
+    if model_type == "prophet":
+        if not HAS_PROPHET:
+            raise ValueError("Prophet not available. Please install: pip install prophet")
+        return model_type
+    raise ValueError(
+        f"Unknown model type: {model_type}. "
+        "Use 'xgboost', 'xgboost_direct', 'xgboost_global', 'prophet', 'ets' or 'auto'."
+    )
+
+
+def model_series(model_type: str, business_id: int, metric_name: str) -> tuple:
+    """(business_id, metric_name) a model of this type is registered and trained under."""
+    if model_type == "xgboost_global":
+        return GLOBAL_MODEL_SERIES
+    return business_id, metric_name
+
+
+def series_length(
+    session: Optional[Session],
+    business_id: int,
+    metric_name: str,
+    history: Optional[pd.DataFrame] = None
+) -> Optional[int]:
+    """Series length as far as 'auto' model selection needs it (None if unknown)."""
+    if history is not None:
+        return len(history)
+    if session is not None:
+        return count_timeseries_points(session, business_id, metric_name, limit=ETS_SHORT_SERIES)
+    return None
+
+
 class ForecastService:
     """Service for generating time-series forecasts."""
     
     @staticmethod
     def generate_forecast(
-        session: Session,
-        request: ForecastRequest
+        session: Optional[Session],
+        request: ForecastRequest,
+        history: Optional[pd.DataFrame] = None,
+        data_version: Optional[int] = None
     ) -> ForecastResponse:
         """
         Generate forecast using specified or best available model.
         
+        Results are served from the in-process forecast cache while neither
+        the series data version nor the registered model version changed.
+        
         Args:
-            session: Database session
+            session: Database session (may be None when history is given)
             request: ForecastRequest with business_id, metric_name, horizon, model_type
+            history: Already loaded 'date'/'value' frame for the series, used
+                instead of querying (e.g. in batch worker processes)
+            data_version: Series data version, if already known; without it
+                and without a session the cache is bypassed
         
         Returns:
             ForecastResponse with predictions
+        
+        Raises:
+            ModelNotTrained: if the chosen model has to be trained first
         """
         business_id = request.business_id
         metric_name = request.metric_name
         horizon = request.horizon
-        model_type = request.model_type
+        chosen_model = ForecastService.choose_model(business_id, metric_name, request.model_type, session, history)
         
-        # Determine which model to use
-        if model_type == "auto":
-            # Check which models exist, prefer XGBoost
-            if HAS_XGBOOST and xgboost_exists(business_id, metric_name):
-                chosen_model = "xgboost"
-            elif HAS_PROPHET and prophet_exists(business_id, metric_name):
-                chosen_model = "prophet"
-            elif HAS_XGBOOST:
-                # No model exists, train XGBoost by default if available
-                chosen_model = "xgboost"
-            elif HAS_PROPHET:
-                chosen_model = "prophet"
-            else:
-                raise ValueError("No ML models available. Please install XGBoost or Prophet.")
-        else:
-            chosen_model = model_type
-            if chosen_model == "xgboost" and not HAS_XGBOOST:
-                raise ValueError("XGBoost not available. Please install: pip install xgboost")
-            if chosen_model == "prophet" and not HAS_PROPHET:
-                raise ValueError("Prophet not available. Please install: pip install prophet")
-        
-        # Train model if it doesn't exist
+        # Models are trained by the job queue (see training_jobs), never inline
         if chosen_model == "xgboost":
             if not xgboost_exists(business_id, metric_name):
-                print(f"Training XGBoost model for business {business_id}, metric {metric_name}...")
-                _, metrics = train_xgboost_model(session, business_id, metric_name, horizon)
-                print(f"XGBoost training complete. Metrics: {metrics}")
-            
-            # Generate predictions
-            forecast_points = predict_xgboost(session, business_id, metric_name, horizon)
-            
+                raise ModelNotTrained(business_id, metric_name, chosen_model, horizon)
+        elif chosen_model == "xgboost_direct":
+            # A stored model covering a shorter horizon needs retraining too
+            if not direct_model_exists(business_id, metric_name, horizon):
+                raise ModelNotTrained(business_id, metric_name, chosen_model, horizon)
         elif chosen_model == "prophet":
             if not prophet_exists(business_id, metric_name):
-                print(f"Training Prophet model for business {business_id}, metric {metric_name}...")
-                _, metrics = train_prophet_model(session, business_id, metric_name, horizon)
-                print(f"Prophet training complete. Metrics: {metrics}")
+                raise ModelNotTrained(business_id, metric_name, chosen_model, horizon)
+        elif chosen_model == "ets":
+            if not ets_exists(business_id, metric_name):
+                raise ModelNotTrained(business_id, metric_name, chosen_model, horizon)
+        elif chosen_model == "xgboost_global":
+            if not global_model_exists():
+                raise ModelNotTrained(*GLOBAL_MODEL_SERIES, chosen_model, horizon)
+        
+        if data_version is None and session is not None:
+            data_version = load_series_version(session, business_id, metric_name)
+        cache_key = None
+        if data_version is not None:
+            cache_key = ForecastService.cache_key(request, data_version, chosen_model)
+        if cache_key is not None:
+            cached = forecast_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        def compute() -> ForecastResponse:
+            if chosen_model == "xgboost":
+                forecast_points = predict_xgboost(
+                    session, business_id, metric_name, horizon, history, request.include_intervals
+                )
+            elif chosen_model == "xgboost_direct":
+                forecast_points = predict_xgboost_direct(
+                    session, business_id, metric_name, horizon, history, request.include_intervals
+                )
+            elif chosen_model == "ets":
+                forecast_points = predict_ets(session, business_id, metric_name, horizon, history)
+            elif chosen_model == "xgboost_global":
+                forecast_points = predict_xgboost_global(session, business_id, metric_name, horizon, history)
+            else:
+                forecast_points = predict_prophet(session, business_id, metric_name, horizon, request.include_intervals)
             
-            # Generate predictions
-            forecast_points = predict_prophet(session, business_id, metric_name, horizon)
+            response = ForecastResponse(
+                business_id=business_id,
+                metric_name=metric_name,
+                horizon=horizon,
+                model_used=chosen_model,
+                points=forecast_points,
+                metrics=None  # Can optionally add model metrics here
+            )
+            if cache_key is not None:
+                forecast_cache.put(cache_key, response)
+            return response
         
-        else:
-            raise ValueError(f"Unknown model type: {chosen_model}. Use 'xgboost', 'prophet', or 'auto'.")
+        # Concurrent identical requests (e.g. dashboards opening together)
+        # share one computation instead of each running the model
+        return _forecast_flights.do(
+            cache_key or (business_id, metric_name, chosen_model, horizon, request.include_intervals), compute
+        )
+    
+    @staticmethod
+    def choose_model(
+        business_id: int,
+        metric_name: str,
+        model_type: str,
+        session: Optional[Session] = None,
+        history: Optional[pd.DataFrame] = None
+    ) -> str:
+        """
+        Resolve the model a forecast request will use.
+        
+        Args:
+            business_id: Business ID
+            metric_name: Metric name
+            model_type: Requested model type ('auto' picks the tournament
+                winner recorded in the registry, else a trained model,
+                preferring XGBoost, then the global model if enabled, or the
+                default model to train)
+            session: Database session, to size the series for 'auto'
+            history: Already loaded 'date'/'value' frame, same purpose
         
-        # Return response
-        return ForecastResponse(
-            business_id=business_id,
-            metric_name=metric_name,
-            horizon=horizon,
-            model_used=chosen_model,
-            points=forecast_points,
-            metrics=None  # Can optionally add model metrics here
+        Returns:
+            Concrete model type
+        """
+        if model_type == "auto":
+            # Winner of the last backtest tournament (see tournament.py),
+            # trained on demand like any other model
+            selected = registry.selection(business_id, metric_name)
+            if selected is not None:
+                try:
+                    return resolve_training_model_type(selected["model_type"])
+                except ValueError:
+                    pass  # its library is no longer installed
+            # Check which models exist, prefer XGBoost
+            if HAS_XGBOOST and xgboost_exists(business_id, metric_name):
+                return "xgboost"
+            if HAS_PROPHET and prophet_exists(business_id, metric_name):
+                return "prophet"
+            if ets_exists(business_id, metric_name):
+                return "ets"
+            # One shared model serves every series without its own
+            if GLOBAL_MODEL_ENABLED and HAS_XGBOOST:
+                return "xgboost_global"
+            # No model exists yet; train the default one for this series
+            return resolve_training_model_type("auto", series_length(session, business_id, metric_name, history))
+        return resolve_training_model_type(model_type)
+    
+    @staticmethod
+    def cache_key(
+        request: ForecastRequest,
+        data_version: int,
+        chosen_model: Optional[str] = None
+    ) -> Optional[tuple]:
+        """
+        Forecast cache key for a request.
+        
+        Args:
+            request: Forecast request
+            data_version: Current data version of the series
+            chosen_model: Model already resolved by choose_model, if any
+        
+        Returns:
+            Key for forecast_cache, or None while no model is registered
+        """
+        business_id, metric_name = request.business_id, request.metric_name
+        chosen_model = chosen_model or ForecastService.choose_model(business_id, metric_name, request.model_type)
+        entry = registry.current(chosen_model, *model_series(chosen_model, business_id, metric_name))
+        if entry is None:
+            return None
+        return forecast_cache.key(
+            business_id, metric_name, chosen_model, request.horizon, entry["sha256"], data_version,
+            request.include_intervals
         )
     
     @staticmethod
@@ -109,27 +306,62 @@ class ForecastService:
         business_id: int,
         metric_name: str,
         model_type: str = "xgboost",
-        horizon: int = 30
+        horizon: int = 30,
+        incremental: bool = False
     ) -> dict:
         """
-        Explicitly train a specific model.
+        Explicitly train a specific model. Blocks for the whole fit; API code
+        queues a training job instead (see training_jobs.enqueue_training).
         
         Args:
             session: Database session
             business_id: Business ID
             metric_name: Metric name
-            model_type: 'xgboost' or 'prophet'
+            model_type: 'xgboost', 'xgboost_direct', 'xgboost_global', 'prophet',
+                'ets' or 'auto' (the global model ignores the series)
             horizon: Forecast horizon
+            incremental: Update the current model with data appended since
+                it was trained (XGBoost; other types are fully retrained)
         
         Returns:
             dict with model_path and metrics
         """
-        if model_type == "xgboost":
+        n_points = series_length(session, business_id, metric_name) if model_type == "auto" else None
+        model_type = resolve_training_model_type(model_type, n_points)
+        business_id, metric_name = model_series(model_type, business_id, metric_name)
+        # Concurrent identical calls share one fit instead of registering duplicate versions
+        return _training_flights.do(
+            (business_id, metric_name, model_type, horizon, incremental),
+            lambda: ForecastService._train(session, business_id, metric_name, model_type, horizon, incremental)
+        )
+    
+    @staticmethod
+    def _train(
+        session: Session,
+        business_id: int,
+        metric_name: str,
+        model_type: str,
+        horizon: int,
+        incremental: bool = False
+    ) -> dict:
+        """Fit and save one model (see train_model)."""
+        if model_type == "xgboost" and incremental:
+            model_path, metrics = update_xgboost_model(session, business_id, metric_name, horizon)
+        elif model_type == "xgboost":
             model_path, metrics = train_xgboost_model(session, business_id, metric_name, horizon)
+        elif model_type == "xgboost_direct":
+            model_path, metrics = train_xgboost_direct_model(session, business_id, metric_name, horizon)
         elif model_type == "prophet":
             model_path, metrics = train_prophet_model(session, business_id, metric_name, horizon)
+        elif model_type == "ets":
+            model_path, metrics = train_ets_model(session, business_id, metric_name, horizon)
+        elif model_type == "xgboost_global":
+            model_path, metrics = train_xgboost_global_model(session, horizon)
         else:
-            raise ValueError(f"Unknown model type: {model_type}. Use 'xgboost' or 'prophet'.")
+            raise ValueError(
+                f"Unknown model type: {model_type}. "
+                "Use 'xgboost', 'xgboost_direct', 'xgboost_global', 'prophet' or 'ets'."
+            )
         
         return {
             "model_type": model_type,
@@ -0,0 +1,115 @@
+"""Process-wide LRU cache of deserialized forecasting models."""
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+from .config import MODEL_CACHE_MAX_BYTES
+
+
+class ModelCache:
+    """
+    LRU cache of loaded models with a memory budget.
+
+    Entries are keyed by (business_id, metric_name, model_type, file mtime,
+    file size), so a retrained model file is never served from a stale entry
+    even without explicit invalidation. The serialized file size is used as
+    the memory estimate for the budget.
+    """
+
+    def __init__(self, max_bytes: int = MODEL_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(
+        self,
+        business_id: int,
+        metric_name: str,
+        model_type: str,
+        path: Union[str, Path],
+        loader: Callable[[Path], Any]
+    ) -> Any:
+        """
+        Return the cached model for ``path`` or load it with ``loader``.
+
+        Args:
+            business_id: Business ID
+            metric_name: Metric name
+            model_type: 'xgboost', 'prophet', ...
+            path: Model file on disk
+            loader: Function that deserializes the file
+
+        Returns:
+            The loaded model (shared; callers must not mutate it)
+
+        Raises:
+            FileNotFoundError: if the model file does not exist
+        """
+        stat = os.stat(path)
+        key = (business_id, metric_name, model_type, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Deserialize outside the lock; a concurrent miss may load twice
+        model = loader(Path(path))
+        size = stat.st_size
+
+        with self._lock:
+            # Older versions of the same model are unreachable now
+            self._discard(lambda k: k[:3] == key[:3] and k != key)
+            if size <= self.max_bytes and key not in self._entries:
+                self._entries[key] = (model, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self._bytes -= evicted_size
+
+        return model
+
+    def invalidate(self, business_id: int, metric_name: str, model_type: Optional[str] = None) -> None:
+        """Drop cached models for a series (all model types unless given)."""
+        with self._lock:
+            self._discard(
+                lambda k: k[0] == business_id and k[1] == metric_name
+                and (model_type is None or k[2] == model_type)
+            )
+
+    def clear(self) -> None:
+        """Drop every cached model."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Current size and hit/miss counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _discard(self, predicate: Callable[[tuple], bool]) -> None:
+        """Remove matching entries. Caller holds the lock."""
+        for key in [k for k in self._entries if predicate(k)]:
+            _, size = self._entries.pop(key)
+            self._bytes -= size
+
+
+# Shared by every request in this process
+model_cache = ModelCache()
+
@@ -1,23 +1,40 @@
 """Prophet model training and prediction for time-series forecasting."""
 
+import copy
+import numpy as np
 import pandas as pd
 import pickle
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from pathlib import Path
 from prophet import Prophet
 from sqlalchemy.orm import Session
 
 from .preprocessing import prepare_data_for_prophet
-from .config import PROPHET_CONFIG, MODELS_STORE_DIR
+from .config import PROPHET_CONFIG, PROPHET_UNCERTAINTY_SAMPLES, PROPHET_FUTURE_DAYS, PROPHET_FUTURE_CACHE_ENTRIES
 from .schemas import ForecastPoint
+from .model_cache import model_cache
+from .registry import registry, date_window
+
+# Future forecasts by (model hash, uncertainty samples), see _future_forecast
+_future_forecasts: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+_future_lock = threading.Lock()
+
+
+def _load_prophet_model(model_path: Path) -> Prophet:
+    """Unpickle a saved Prophet model."""
+    with open(model_path, 'rb') as f:
+        return pickle.load(f)
 
 
 def train_prophet_model(
     session: Session,
     business_id: int,
     metric_name: str,
-    horizon: int = 30
+    horizon: int = 30,
+    history: Optional[pd.DataFrame] = None
 ) -> Tuple[str, dict]:
     """
     Train Prophet model on historical data.
@@ -27,12 +44,13 @@ def train_prophet_model(
         business_id: Business ID
         metric_name: Metric name to forecast
         horizon: Forecast horizon (not used in training)
+        history: Already loaded 'date'/'value' frame; skips the query
     
     Returns:
         Tuple of (model_path, metrics_dict)
     """
     # Load and prepare data
-    df = prepare_data_for_prophet(session, business_id, metric_name)
+    df = prepare_data_for_prophet(session, business_id, metric_name, history=history)
     
     # Initialize and train Prophet model
     model = Prophet(**PROPHET_CONFIG)
@@ -53,19 +71,93 @@ def train_prophet_model(
         "train_samples": len(df)
     }
     
-    # Save model using pickle
-    model_path = MODELS_STORE_DIR / f"prophet_{business_id}_{metric_name}.pkl"
-    with open(model_path, 'wb') as f:
-        pickle.dump(model, f)
+    # Register the pickled model and promote it
+    entry = registry.register(
+        "prophet", business_id, metric_name,
+        write=lambda path: path.write_bytes(pickle.dumps(model)),
+        suffix=".pkl",
+        metadata={
+            "metrics": metrics,
+            "training_window": date_window(df['ds']),
+            "features": ["ds"],
+            "params": PROPHET_CONFIG,
+            "horizon": horizon,
+        }
+    )
+    model_cache.invalidate(business_id, metric_name, "prophet")
+    
+    return entry["path"], metrics
+
+
+def fit_predict_prophet(history: pd.DataFrame, horizon: int) -> np.ndarray:
+    """
+    Fit Prophet on ``history`` and forecast the next ``horizon`` days,
+    without registering anything (used by backtests).
+    
+    Only the point forecast is needed, so uncertainty sampling is skipped.
+    
+    Args:
+        history: 'date'/'value' frame to train on
+        horizon: Number of days to forecast
+    
+    Returns:
+        Array of predicted values for the days after the last date
+    """
+    df = prepare_data_for_prophet(None, 0, "", history=history)
+    model = Prophet(**PROPHET_CONFIG, uncertainty_samples=0)
+    model.fit(df)
+    future = model.make_future_dataframe(periods=horizon, include_history=False)
+    return model.predict(future)['yhat'].to_numpy()
+
+
+def _future_forecast(model: Prophet, model_hash: str, horizon: int, uncertainty_samples: int) -> pd.DataFrame:
+    """
+    Prophet output for the ``horizon`` days after the training history.
+    
+    Only future dates are predicted, never the history. A fitted model's
+    forecast for a given date never changes, so the result is computed for
+    at least PROPHET_FUTURE_DAYS and cached per model version: later
+    requests, including shorter horizons and requests after new data was
+    ingested, slice the cached frame instead of re-running trend,
+    seasonality and uncertainty sampling.
+    
+    Args:
+        model: Fitted Prophet model (shared; not modified)
+        model_hash: Registry hash of the model version
+        horizon: Number of days to forecast
+        uncertainty_samples: Samples for yhat_lower/yhat_upper, 0 to skip
     
-    return str(model_path), metrics
+    Returns:
+        DataFrame with ds and yhat (plus yhat_lower/yhat_upper when sampled)
+    """
+    key = (model_hash, uncertainty_samples)
+    with _future_lock:
+        cached = _future_forecasts.get(key)
+        if cached is not None and len(cached) >= horizon:
+            _future_forecasts.move_to_end(key)
+            return cached.iloc[:horizon]
+    
+    # Per-call sample count without mutating the cached model
+    model = copy.copy(model)
+    model.uncertainty_samples = uncertainty_samples
+    future = model.make_future_dataframe(periods=max(horizon, PROPHET_FUTURE_DAYS), include_history=False)
+    columns = ['ds', 'yhat', 'yhat_lower', 'yhat_upper'] if uncertainty_samples else ['ds', 'yhat']
+    forecast = model.predict(future)[columns]
+    
+    with _future_lock:
+        _future_forecasts[key] = forecast
+        _future_forecasts.move_to_end(key)
+        while len(_future_forecasts) > PROPHET_FUTURE_CACHE_ENTRIES:
+            _future_forecasts.popitem(last=False)
+    return forecast.iloc[:horizon]
 
 
 def predict_prophet(
     session: Session,
     business_id: int,
     metric_name: str,
-    horizon: int = 30
+    horizon: int = 30,
+    include_intervals: bool = True
 ) -> List[ForecastPoint]:
     """
     Generate forecasts using trained Prophet model.
@@ -75,42 +167,36 @@ def predict_prophet(
         business_id: Business ID
         metric_name: Metric name to forecast
         horizon: Number of days to forecast
+        include_intervals: Sample uncertainty intervals (most of the cost)
     
     Returns:
-        List of ForecastPoint objects with confidence intervals
+        List of ForecastPoint objects, with confidence intervals if requested
     """
-    # Load model
-    model_path = MODELS_STORE_DIR / f"prophet_{business_id}_{metric_name}.pkl"
-    if not model_path.exists():
+    # Load model (unpickled once per model version and process)
+    entry = registry.current("prophet", business_id, metric_name)
+    if entry is None:
         raise FileNotFoundError(
-            f"Model not found at {model_path}. Train model first."
+            f"No prophet model registered for business {business_id}, metric '{metric_name}'. Train model first."
         )
     
-    with open(model_path, 'rb') as f:
-        model = pickle.load(f)
-    
-    # Create future dataframe
-    future = model.make_future_dataframe(periods=horizon)
-    
-    # Make predictions
-    forecast = model.predict(future)
-    
-    # Extract future predictions (last 'horizon' rows)
-    future_forecast = forecast.tail(horizon)
-    
-    # Convert to ForecastPoint objects
-    predictions = []
-    for _, row in future_forecast.iterrows():
-        predictions.append(
-            ForecastPoint(
-                date=row['ds'].date(),
-                value=float(row['yhat']),
-                lower_bound=float(row['yhat_lower']),
-                upper_bound=float(row['yhat_upper'])
-            )
-        )
+    model = model_cache.get_or_load(business_id, metric_name, "prophet", entry["path"], _load_prophet_model)
+    
+    samples = PROPHET_UNCERTAINTY_SAMPLES if include_intervals else 0
+    forecast = _future_forecast(model, entry["sha256"], horizon, samples)
+    
+    # Convert column-wise
+    dates = forecast['ds'].dt.date
+    values = forecast['yhat'].to_numpy(dtype=float)
+    if samples:
+        lower = forecast['yhat_lower'].to_numpy(dtype=float).tolist()
+        upper = forecast['yhat_upper'].to_numpy(dtype=float).tolist()
+    else:
+        lower = upper = [None] * len(values)
     
-    return predictions
+    return [
+        ForecastPoint(date=forecast_date, value=value, lower_bound=low, upper_bound=high)
+        for forecast_date, value, low, high in zip(dates, values.tolist(), lower, upper)
+    ]
 
 
 def model_exists(business_id: int, metric_name: str) -> bool:
@@ -122,7 +208,6 @@ def model_exists(business_id: int, metric_name: str) -> bool:
         metric_name: Metric name
     
     Returns:
-        True if model file exists
+        True if a version is registered
     """
-    model_path = MODELS_STORE_DIR / f"prophet_{business_id}_{metric_name}.pkl"
-    return model_path.exists()
+    return registry.exists("prophet", business_id, metric_name)
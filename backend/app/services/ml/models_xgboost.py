@@ -1,26 +1,136 @@
 """XGBoost model training and prediction for time-series forecasting."""
 
+import json
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import xgboost as xgb
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from sqlalchemy.orm import Session
 
-from .preprocessing import prepare_data_for_xgboost, load_timeseries_data, clean_timeseries_data
-from .preprocessing import add_date_features, add_lag_features, add_rolling_features
-from .config import XGBOOST_CONFIG, MODELS_STORE_DIR, TRAIN_TEST_SPLIT
+from app.services.timeseries_store import normalize_metric_name
+from .preprocessing import prepare_data_for_xgboost, load_timeseries_data, clean_timeseries_data, stream_all_timeseries
+from .preprocessing import add_date_features, build_features, load_feature_frame, split_features_target, DATE_FEATURES
+from .config import XGBOOST_CONFIG, TRAIN_TEST_SPLIT, INFERENCE_LOOKBACK, LAG_FEATURES, ROLLING_WINDOWS
+from .config import MIN_TRAINING_SAMPLES, DIRECT_MIN_HORIZON, DIRECT_MAX_TRAINING_ROWS
+from .config import INCREMENTAL_ROUNDS, INCREMENTAL_CONTEXT_DAYS, FULL_RETRAIN_INTERVAL_DAYS, MAX_INCREMENTAL_UPDATES
+from .config import GLOBAL_MODEL_SERIES, GLOBAL_HISTORY_DAYS, GLOBAL_SCALE_WINDOW, GLOBAL_MAX_TRAINING_ROWS
+from .config import GLOBAL_UNSEEN_CODE_FRACTION
+from .config import XGBOOST_INTERVAL_WIDTH, CONFORMAL_MAX_ORIGINS
+from .compiled_trees import CompiledForest, compile_booster
 from .schemas import ForecastPoint
+from .model_cache import model_cache
+from .registry import registry, date_window
+
+
+def _load_xgboost_model(model_path: Path) -> xgb.XGBRegressor:
+    """Deserialize a saved XGBoost model."""
+    model = xgb.XGBRegressor()
+    model.load_model(str(model_path))
+    return model
+
+
+def xgboost_params(model_type: str, business_id: int, metric_name: str) -> dict:
+    """XGBOOST_CONFIG with the parameters tuned for this model, if any (see tuning.py)."""
+    tuned = registry.tuned_params(model_type, business_id, metric_name)
+    return {**XGBOOST_CONFIG, **tuned["params"]} if tuned else XGBOOST_CONFIG
+
+
+def _conformal_intervals(residuals_by_step: List[np.ndarray], width: float = XGBOOST_INTERVAL_WIDTH) -> Optional[dict]:
+    """
+    Split-conformal interval offsets per forecast step.
+    
+    Args:
+        residuals_by_step: Held-out (actual - forecast) residuals, one array
+            per step ahead (index 0 = 1 day)
+        width: Interval coverage
+    
+    Returns:
+        {'width', 'lower', 'upper', 'calibration_residuals'}: offsets to add
+        to the point forecast of each step, or None without residuals
+    """
+    lower, upper = [], []
+    for residuals in residuals_by_step:
+        residuals = residuals[np.isfinite(residuals)]
+        n = len(residuals)
+        if n == 0:
+            break
+        # Finite-sample correction, so coverage holds for small calibration sets
+        high = min(1.0, (0.5 + width / 2) * (n + 1) / n)
+        lower.append(float(np.quantile(residuals, 1.0 - high)))
+        upper.append(float(np.quantile(residuals, high)))
+    if not lower:
+        return None
+    
+    # Errors compound over the horizon: a later step is never narrower
+    return {
+        "width": width,
+        "lower": np.minimum.accumulate(lower).tolist(),
+        "upper": np.maximum.accumulate(upper).tolist(),
+        "calibration_residuals": int(sum(np.isfinite(r).sum() for r in residuals_by_step)),
+    }
+
+
+def _interval_bounds(intervals: Optional[dict], values: np.ndarray) -> Tuple[list, list]:
+    """
+    Lower/upper bounds for a forecast from stored conformal offsets; steps
+    beyond the calibrated horizon reuse the last step's offsets.
+    
+    Returns:
+        Tuple of (lower_bounds, upper_bounds), None for every step when the
+        model has no intervals
+    """
+    if not intervals:
+        return [None] * len(values), [None] * len(values)
+    steps = np.minimum(np.arange(len(values)), len(intervals["lower"]) - 1)
+    lower = values + np.asarray(intervals["lower"])[steps]
+    upper = values + np.asarray(intervals["upper"])[steps]
+    return lower.tolist(), upper.tolist()
+
+
+def _recursive_residuals(booster: xgb.Booster, features: pd.DataFrame, first_test: int, horizon: int) -> List[np.ndarray]:
+    """
+    Residuals of recursive forecasts from held-out origins, per step ahead.
+    
+    Origins are spread over the test rows (at most CONFORMAL_MAX_ORIGINS);
+    each forecasts ``horizon`` days from the points up to it, as
+    predict_xgboost would, and is compared to the observed values by date.
+    
+    Args:
+        booster: Model fit on the rows before ``first_test``
+        features: Feature frame of the whole series (see build_features)
+        first_test: Position of the first held-out row
+        horizon: Steps to forecast from every origin
+    
+    Returns:
+        One residual array per step (NaN where the target date is unobserved)
+    """
+    values = features['value'].to_numpy(dtype=float)
+    observed = pd.Series(values, index=features['date'])
+    origins = np.arange(first_test - 1, len(features) - 1)
+    if len(origins) > CONFORMAL_MAX_ORIGINS:
+        origins = origins[np.linspace(0, len(origins) - 1, CONFORMAL_MAX_ORIGINS).round().astype(int)]
+    
+    # Hundreds of single-row predictions: worth compiling the booster for
+    forest = compile_booster(booster)
+    residuals = np.full((len(origins), horizon), np.nan)
+    for row, origin in enumerate(origins):
+        future_dates = pd.date_range(features['date'].iloc[origin] + timedelta(days=1), periods=horizon, freq='D')
+        history = values[max(origin + 1 - INFERENCE_LOOKBACK, 0):origin + 1]
+        predicted = _recursive_forecast(booster, history, future_dates, forest=forest)
+        residuals[row] = observed.reindex(future_dates).to_numpy() - predicted
+    return list(residuals.T)
 
 
 def train_xgboost_model(
     session: Session,
     business_id: int,
     metric_name: str,
-    horizon: int = 30
+    horizon: int = 30,
+    history: Optional[pd.DataFrame] = None
 ) -> Tuple[str, dict]:
     """
     Train XGBoost model on historical data.
@@ -30,12 +140,14 @@ def train_xgboost_model(
         business_id: Business ID
         metric_name: Metric name to forecast
         horizon: Forecast horizon (not used in training but saved with model)
+        history: Already loaded 'date'/'value' frame; skips the query
     
     Returns:
         Tuple of (model_path, metrics_dict)
     """
-    # Load and prepare data
-    X, y = prepare_data_for_xgboost(session, business_id, metric_name)
+    # Load and prepare data (precomputed features unless history is given)
+    features = load_feature_frame(session, business_id, metric_name, history)
+    X, y = split_features_target(features)
     
     # Split data
     split_idx = int(len(X) * TRAIN_TEST_SPLIT)
@@ -43,7 +155,8 @@ def train_xgboost_model(
     y_train, y_test = y[:split_idx], y[split_idx:]
     
     # Train model
-    model = xgb.XGBRegressor(**XGBOOST_CONFIG)
+    params = xgboost_params("xgboost", business_id, metric_name)
+    model = xgb.XGBRegressor(**params)
     model.fit(X_train, y_train)
     
     # Evaluate
@@ -58,18 +171,145 @@ def train_xgboost_model(
         "test_samples": len(X_test)
     }
     
-    # Save model
-    model_path = MODELS_STORE_DIR / f"xgboost_{business_id}_{metric_name}.json"
-    model.save_model(str(model_path))
+    # Calibrate intervals on multi-step forecasts from the held-out rows
+    intervals = _conformal_intervals(
+        _recursive_residuals(model.get_booster(), features, X_test.index[0], horizon)
+    ) if len(X_test) else None
+    
+    # Register and promote the new version
+    entry = registry.register(
+        "xgboost", business_id, metric_name,
+        write=lambda path: model.save_model(str(path)),
+        suffix=".json",
+        metadata={
+            "metrics": metrics,
+            "training_window": date_window(features['date']),
+            "features": list(X.columns),
+            "params": params,
+            "horizon": horizon,
+            "intervals": intervals,
+            "full_trained_at": datetime.utcnow().isoformat(),
+            "incremental_updates": 0,
+        }
+    )
+    model_cache.invalidate(business_id, metric_name, "xgboost")
     
-    return str(model_path), metrics
+    return entry["path"], metrics
+
+
+def _full_retrain_reason(entry: Optional[dict]) -> Optional[str]:
+    """Why the current model must be fully retrained instead of updated, if it must."""
+    if entry is None:
+        return "no trained model"
+    if not entry.get("training_window") or not entry.get("full_trained_at"):
+        return "model has no recorded training window"
+    age = datetime.utcnow() - datetime.fromisoformat(entry["full_trained_at"])
+    if age > timedelta(days=FULL_RETRAIN_INTERVAL_DAYS):
+        return f"last full retrain {age.days} days ago"
+    if entry.get("incremental_updates", 0) >= MAX_INCREMENTAL_UPDATES:
+        return f"{entry['incremental_updates']} incremental updates since the last full retrain"
+    return None
+
+
+def update_xgboost_model(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    horizon: int = 30,
+    history: Optional[pd.DataFrame] = None
+) -> Tuple[str, dict]:
+    """
+    Continue boosting the current XGBoost model on data appended since its
+    training cutoff.
+    
+    INCREMENTAL_ROUNDS trees are added to the existing booster, fit on the
+    new points plus the INCREMENTAL_CONTEXT_DAYS before the cutoff, so only
+    a recent slice of the series is loaded and the fit is a fraction of a
+    full retrain. Falls back to train_xgboost_model when there is no model
+    yet, the last full retrain is older than FULL_RETRAIN_INTERVAL_DAYS,
+    MAX_INCREMENTAL_UPDATES updates are already stacked on it, or the
+    feature set changed.
+    
+    Args:
+        session: Database session
+        business_id: Business ID
+        metric_name: Metric name to forecast
+        horizon: Forecast horizon (saved with the model)
+        history: Already loaded 'date'/'value' frame; skips the query
+    
+    Returns:
+        Tuple of (model_path, metrics_dict). metrics['mode'] is 'incremental',
+        'full' or 'unchanged' (no data newer than the cutoff)
+    """
+    full_history = history
+    entry = registry.current("xgboost", business_id, metric_name)
+    reason = _full_retrain_reason(entry)
+    if reason is None:
+        cutoff = pd.Timestamp(entry["training_window"]["end"])
+        # Extra feature depth so the first context row has its lags
+        window_start = cutoff - pd.Timedelta(days=INCREMENTAL_CONTEXT_DAYS + max(LAG_FEATURES + ROLLING_WINDOWS))
+        if history is None:
+            history = load_timeseries_data(session, business_id, metric_name, start_date=window_start.to_pydatetime())
+        df = clean_timeseries_data(history[history['date'] >= window_start])
+        if not (df['date'] > cutoff).any():
+            return entry["path"], {**entry["metrics"], "mode": "unchanged"}
+        
+        X, y = prepare_data_for_xgboost(session, business_id, metric_name, history=df)
+        previous = model_cache.get_or_load(business_id, metric_name, "xgboost", entry["path"], _load_xgboost_model)
+        if list(X.columns) != previous.get_booster().feature_names:
+            reason = "feature set changed"
+    
+    if reason is not None:
+        print(f"Full retrain of xgboost model for business {business_id}, metric {metric_name}: {reason}")
+        model_path, metrics = train_xgboost_model(session, business_id, metric_name, horizon, full_history)
+        return model_path, {**metrics, "mode": "full"}
+    
+    # Error of the previous version on points it has never seen
+    is_new = (df['date'].loc[X.index] > cutoff).to_numpy()
+    y_pred = previous.predict(X[is_new])
+    
+    # Warm start: the new trees fit the residuals of the existing ones
+    # Same parameters as the trees being extended (tuned ones included)
+    model = xgb.XGBRegressor(**{**entry["params"], "n_estimators": INCREMENTAL_ROUNDS})
+    model.fit(X, y, xgb_model=previous.get_booster())
+    
+    metrics = {
+        "mae": float(mean_absolute_error(y[is_new], y_pred)),
+        "rmse": float(np.sqrt(mean_squared_error(y[is_new], y_pred))),
+        "train_samples": len(X),
+        "new_samples": int(is_new.sum()),
+        "mode": "incremental"
+    }
+    
+    updated = registry.register(
+        "xgboost", business_id, metric_name,
+        write=lambda path: model.save_model(str(path)),
+        suffix=".json",
+        metadata={
+            "metrics": metrics,
+            "training_window": {"start": entry["training_window"]["start"], "end": df['date'].max().isoformat()},
+            "features": list(X.columns),
+            "params": {**entry["params"], "n_estimators": entry["params"]["n_estimators"] + INCREMENTAL_ROUNDS},
+            "horizon": horizon,
+            # Calibrated at the last full retrain
+            "intervals": entry.get("intervals"),
+            "full_trained_at": entry["full_trained_at"],
+            "incremental_updates": entry.get("incremental_updates", 0) + 1,
+            "base_version": entry["version"],
+        }
+    )
+    model_cache.invalidate(business_id, metric_name, "xgboost")
+    
+    return updated["path"], metrics
 
 
 def predict_xgboost(
     session: Session,
     business_id: int,
     metric_name: str,
-    horizon: int = 30
+    horizon: int = 30,
+    history: Optional[pd.DataFrame] = None,
+    include_intervals: bool = True
 ) -> List[ForecastPoint]:
     """
     Generate forecasts using trained XGBoost model.
@@ -79,86 +319,624 @@ def predict_xgboost(
         business_id: Business ID  
         metric_name: Metric name to forecast
         horizon: Number of days to forecast
+        history: Already loaded 'date'/'value' frame; skips the query
+        include_intervals: Fill in the conformal intervals stored with the
+            model (no extra model calls)
     
     Returns:
         List of ForecastPoint objects
     """
-    # Load model
-    model_path = MODELS_STORE_DIR / f"xgboost_{business_id}_{metric_name}.json"
-    if not model_path.exists():
+    # Load model (deserialized once per model version and process)
+    entry = registry.current("xgboost", business_id, metric_name)
+    if entry is None:
         raise FileNotFoundError(
-            f"Model not found at {model_path}. Train model first."
+            f"No xgboost model registered for business {business_id}, metric '{metric_name}'. Train model first."
         )
     
-    model = xgb.XGBRegressor()
-    model.load_model(str(model_path))
+    model = model_cache.get_or_load(business_id, metric_name, "xgboost", entry["path"], _load_xgboost_model)
+    
+    # Load only the recent history the lag/rolling features need
+    if history is None:
+        history = load_timeseries_data(session, business_id, metric_name, last_n=INFERENCE_LOOKBACK)
+    df = clean_timeseries_data(history.tail(INFERENCE_LOOKBACK))
+    
+    future_dates = pd.date_range(df['date'].max() + timedelta(days=1), periods=horizon, freq='D')
+    booster = model.get_booster()
+    values = _recursive_forecast(booster, df['value'].to_numpy(dtype=float), future_dates, forest=compile_booster(booster))
+    lower, upper = _interval_bounds(entry.get("intervals") if include_intervals else None, values)
+    
+    return [
+        ForecastPoint(
+            date=forecast_date,
+            value=float(value),
+            lower_bound=lower_bound,
+            upper_bound=upper_bound
+        )
+        for forecast_date, value, lower_bound, upper_bound in zip(future_dates.date, values, lower, upper)
+    ]
+
+
+def _recursive_forecast(
+    booster: xgb.Booster,
+    history: np.ndarray,
+    future_dates: pd.DatetimeIndex,
+    static: Optional[Dict[str, float]] = None,
+    forest: Optional[CompiledForest] = None
+) -> np.ndarray:
+    """
+    Recursive multi-step forecast where each prediction feeds the next step's
+    lag and rolling features.
     
-    # Load historical data
-    df = load_timeseries_data(session, business_id, metric_name)
-    df = clean_timeseries_data(df)
+    Calendar features for the whole horizon are computed up front with
+    add_date_features (the same code used in training). The recursion then
+    only touches a preallocated feature matrix, a ring buffer of the last
+    values and running window statistics updated in O(1) per step.
     
-    # Add features
-    df = add_date_features(df)
-    df = add_lag_features(df)
-    df = add_rolling_features(df)
-    df = df.dropna()
+    Args:
+        booster: Trained booster (features from add_date/lag/rolling_features)
+        history: Cleaned historical values, oldest first
+        future_dates: Dates to forecast, one per step
+        static: Values of features that are constant over the horizon
+            (the global model's series features)
+        forest: Compiled form of the booster (see compiled_trees.py), for
+            boosters used often enough to pay for compiling them
     
-    # Get last date and latest feature values
-    last_date = df['date'].max()
-    latest_values = df['value'].values
+    Returns:
+        Array of predicted values, one per future date
+    """
+    feature_names = booster.feature_names
+    horizon = len(future_dates)
+    depth = max(LAG_FEATURES + ROLLING_WINDOWS)
     
-    # Generate predictions
-    predictions = []
-    current_date = last_date
+    # Ring buffer of the last `depth` values; ring[pos] is the oldest.
+    # Short histories are padded with their first value.
+    ring = np.empty(depth)
+    tail = history[-depth:]
+    ring[:depth - len(tail)] = tail[0]
+    ring[depth - len(tail):] = tail
+    pos = 0
     
-    for i in range(horizon):
-        current_date = current_date + timedelta(days=1)
-        
-        # Create features for prediction
-        features = {}
-        features['day_of_week'] = current_date.dayofweek
-        features['day_of_month'] = current_date.day
-        features['month'] = current_date.month
-        features['quarter'] = (current_date.month - 1) // 3 + 1
-        features['year'] = current_date.year
-        features['is_weekend'] = 1 if current_date.dayofweek >= 5 else 0
-        features['is_month_start'] = 1 if current_date.day == 1 else 0
-        features['is_month_end'] = 1 if current_date.day == current_date.replace(
-            day=1, month=current_date.month % 12 + 1).day else 0
-        
-        # Lag features (use most recent predictions)
-        lag_values = list(latest_values[-30:]) + [p.value for p in predictions]
-        for lag in [1, 7, 14, 30]:
-            if len(lag_values) >= lag:
-                features[f'lag_{lag}'] = lag_values[-lag]
-            else:
-                features[f'lag_{lag}'] = latest_values[-1]
-        
-        # Rolling features
-        for window in [7, 14, 30]:
-            recent_vals = lag_values[-window:] if len(lag_values) >= window else lag_values
-            features[f'rolling_mean_{window}'] = np.mean(recent_vals)
-            features[f'rolling_std_{window}'] = np.std(recent_vals)
-        
-        # Create feature vector in correct order
-        feature_names = model.get_booster().feature_names
-        X_pred = pd.DataFrame([features])[feature_names]
+    # Feature matrix for the whole horizon, calendar columns filled in one pass
+    X = np.zeros((horizon, len(feature_names)), dtype=np.float32)
+    calendar = add_date_features(pd.DataFrame({'date': future_dates}))
+    lag_slots = []
+    window_slots = []
+    for col, name in enumerate(feature_names):
+        if name in calendar.columns and name not in ('date', 'value'):
+            X[:, col] = calendar[name].to_numpy()
+        elif name.startswith('lag_'):
+            lag_slots.append((col, int(name[len('lag_'):])))
+        elif static is not None and name in static:
+            X[:, col] = static[name]
+        elif not name.startswith('rolling_'):
+            raise ValueError(f"Unsupported feature in model: {name}")
+    
+    # Running mean and sum of squared deviations (M2) per window
+    windows = [w for w in ROLLING_WINDOWS if f'rolling_mean_{w}' in feature_names]
+    for window in windows:
+        values = ring[depth - window:]
+        window_slots.append([
+            window,
+            feature_names.index(f'rolling_mean_{window}'),
+            feature_names.index(f'rolling_std_{window}'),
+            float(values.mean()),
+            float(((values - values.mean()) ** 2).sum()),
+        ])
+    
+    if forest is not None:
+        predict_row = forest.row_predictor(X)
+    else:
+        def predict_row(step: int) -> float:
+            return booster.inplace_predict(X[step:step + 1])[0]
+    
+    predictions = np.empty(horizon)
+    for step in range(horizon):
+        row = X[step]
+        for col, lag in lag_slots:
+            row[col] = ring[(pos - lag) % depth]
+        for window, mean_col, std_col, mean, m2 in window_slots:
+            row[mean_col] = mean
+            # Sample std (ddof=1), matching pandas rolling().std() in training
+            row[std_col] = np.sqrt(max(m2, 0.0) / (window - 1))
         
-        # Predict
-        pred_value = model.predict(X_pred)[0]
+        value = float(predict_row(step))
+        predictions[step] = value
         
-        predictions.append(
-            ForecastPoint(
-                date=current_date.date(),
-                value=float(pred_value),
-                lower_bound=None,  # XGBoost doesn't provide confidence intervals by default
-                upper_bound=None
-            )
-        )
+        # Slide every window: `value` enters, the value at lag `window` leaves
+        for slot in window_slots:
+            window, _, _, mean, m2 = slot
+            leaving = ring[(pos - window) % depth]
+            new_mean = mean + (value - leaving) / window
+            slot[3] = new_mean
+            slot[4] = m2 + (value - leaving) * (value - new_mean + leaving - mean)
+        ring[pos] = value
+        pos = (pos + 1) % depth
     
     return predictions
 
 
+def _origin_features(features: pd.DataFrame) -> pd.DataFrame:
+    """
+    Features describing the series as of each row, used as forecast origin.
+    
+    Args:
+        features: Feature frame (see build_features)
+    
+    Returns:
+        DataFrame with last_value plus the lag/rolling feature columns
+    """
+    return features.drop(columns=['date', *DATE_FEATURES]).rename(columns={'value': 'last_value'})
+
+
+def _build_direct_pairs(
+    features: pd.DataFrame,
+    max_horizon: int
+) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build (origin, horizon step) training pairs for the direct model.
+    
+    Each row combines the origin's lag/rolling features with the calendar
+    features of the target date and the number of steps ahead, so one model
+    covers every step up to ``max_horizon``.
+    
+    Args:
+        features: Feature frame of the whole series (see build_features)
+        max_horizon: Largest number of steps ahead to train for
+    
+    Returns:
+        Tuple of (features_df, changes_from_last_value, origin_positions, target_positions)
+    """
+    origin = _origin_features(features)
+    calendar = features[DATE_FEATURES]
+    
+    valid = np.flatnonzero(origin.notna().all(axis=1).to_numpy())
+    if len(valid) < MIN_TRAINING_SAMPLES:
+        raise ValueError(
+            f"Insufficient data: {len(valid)} samples (minimum {MIN_TRAINING_SAMPLES} required)"
+        )
+    
+    # Every pair whose target is observed
+    origin_pos = np.repeat(valid, max_horizon)
+    steps = np.tile(np.arange(1, max_horizon + 1), len(valid))
+    observed = origin_pos + steps < len(features)
+    origin_pos, steps = origin_pos[observed], steps[observed]
+    
+    if len(origin_pos) > DIRECT_MAX_TRAINING_ROWS:
+        rng = np.random.default_rng(XGBOOST_CONFIG.get("random_state"))
+        keep = np.sort(rng.choice(len(origin_pos), DIRECT_MAX_TRAINING_ROWS, replace=False))
+        origin_pos, steps = origin_pos[keep], steps[keep]
+    
+    target_pos = origin_pos + steps
+    X = pd.concat([
+        origin.iloc[origin_pos].reset_index(drop=True),
+        calendar.iloc[target_pos].reset_index(drop=True),
+    ], axis=1)
+    X['horizon_step'] = steps
+    # Target is the change from the origin's last value, so the trees only
+    # learn movement relative to the current level and still work on
+    # series that trend beyond the range seen in training
+    y = features['value'].to_numpy()[target_pos] - X['last_value'].to_numpy()
+    
+    return X, y, origin_pos, target_pos
+
+
+def train_xgboost_direct_model(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    horizon: int = 30,
+    history: Optional[pd.DataFrame] = None
+) -> Tuple[str, dict]:
+    """
+    Train a direct multi-horizon XGBoost model.
+    
+    Instead of feeding predictions back in step by step, the model is
+    conditioned on the number of steps ahead and predicts every step from
+    the same origin, so errors do not compound and inference cost does not
+    grow with the horizon. The model covers at least DIRECT_MIN_HORIZON days.
+    
+    Args:
+        session: Database session
+        business_id: Business ID
+        metric_name: Metric name to forecast
+        horizon: Longest horizon the model must serve
+        history: Already loaded 'date'/'value' frame; skips the query
+    
+    Returns:
+        Tuple of (model_path, metrics_dict)
+    """
+    features = load_feature_frame(session, business_id, metric_name, history)
+    
+    max_horizon = max(horizon, DIRECT_MIN_HORIZON)
+    X, y, origin_pos, target_pos = _build_direct_pairs(features, max_horizon)
+    
+    # Split by time: train on pairs whose target is before the cutoff,
+    # evaluate on pairs forecast from the cutoff onwards
+    cutoff = int(len(features) * TRAIN_TEST_SPLIT)
+    train_rows = target_pos <= cutoff
+    test_rows = origin_pos >= cutoff
+    
+    params = xgboost_params("xgboost_direct", business_id, metric_name)
+    model = xgb.XGBRegressor(**params)
+    model.fit(X[train_rows], y[train_rows])
+    
+    # Errors on the change equal errors on the value (same offset on both)
+    y_pred = model.predict(X[test_rows])
+    mae = mean_absolute_error(y[test_rows], y_pred)
+    rmse = np.sqrt(mean_squared_error(y[test_rows], y_pred))
+    
+    metrics = {
+        "mae": float(mae),
+        "rmse": float(rmse),
+        "train_samples": int(train_rows.sum()),
+        "test_samples": int(test_rows.sum()),
+        "max_horizon": max_horizon
+    }
+    
+    # Held-out pairs already cover every step; their residuals calibrate the intervals
+    test_steps = X['horizon_step'].to_numpy()[test_rows]
+    residuals = y[test_rows] - y_pred
+    intervals = _conformal_intervals([residuals[test_steps == step] for step in range(1, max_horizon + 1)])
+    
+    entry = registry.register(
+        "xgboost_direct", business_id, metric_name,
+        write=lambda path: model.save_model(str(path)),
+        suffix=".json",
+        metadata={
+            "metrics": metrics,
+            "training_window": date_window(features['date']),
+            "features": list(X.columns),
+            "params": params,
+            "max_horizon": max_horizon,
+            "intervals": intervals,
+        }
+    )
+    model_cache.invalidate(business_id, metric_name, "xgboost_direct")
+    
+    return entry["path"], metrics
+
+
+def predict_xgboost_direct(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    horizon: int = 30,
+    history: Optional[pd.DataFrame] = None,
+    include_intervals: bool = True
+) -> List[ForecastPoint]:
+    """
+    Generate the whole horizon with one batched predict call.
+    
+    Args:
+        session: Database session
+        business_id: Business ID
+        metric_name: Metric name to forecast
+        horizon: Number of days to forecast
+        history: Already loaded 'date'/'value' frame; skips the query
+        include_intervals: Fill in the conformal intervals stored with the model
+    
+    Returns:
+        List of ForecastPoint objects
+    """
+    entry = registry.current("xgboost_direct", business_id, metric_name)
+    if entry is None:
+        raise FileNotFoundError(
+            f"No xgboost_direct model registered for business {business_id}, metric '{metric_name}'. Train model first."
+        )
+    max_horizon = int(entry.get("max_horizon") or 0)
+    if horizon > max_horizon:
+        raise ValueError(
+            f"Direct model covers {max_horizon} days; retrain with horizon >= {horizon}."
+        )
+    
+    booster = model_cache.get_or_load(
+        business_id, metric_name, "xgboost_direct", entry["path"], _load_xgboost_model
+    ).get_booster()
+    
+    if history is None:
+        history = load_timeseries_data(session, business_id, metric_name, last_n=INFERENCE_LOOKBACK)
+    df = clean_timeseries_data(history.tail(INFERENCE_LOOKBACK))
+    
+    future_dates = pd.date_range(df['date'].max() + timedelta(days=1), periods=horizon, freq='D')
+    values = _direct_forecast(booster, df, future_dates, compile_booster(booster))
+    lower, upper = _interval_bounds(entry.get("intervals") if include_intervals else None, values)
+    
+    return [
+        ForecastPoint(
+            date=forecast_date,
+            value=float(value),
+            lower_bound=lower_bound,
+            upper_bound=upper_bound
+        )
+        for forecast_date, value, lower_bound, upper_bound in zip(future_dates.date, values, lower, upper)
+    ]
+
+
+def _direct_forecast(
+    booster: xgb.Booster,
+    df: pd.DataFrame,
+    future_dates: pd.DatetimeIndex,
+    forest: Optional[CompiledForest] = None
+) -> np.ndarray:
+    """
+    Predict every future date from the last point of ``df`` in one call.
+    
+    Args:
+        booster: Trained direct booster (see _build_direct_pairs)
+        df: Cleaned 'date'/'value' frame; only the last feature depth is used
+        future_dates: Dates to forecast, one per step
+        forest: Compiled form of the booster, if it is reused
+    
+    Returns:
+        Array of predicted values, one per future date
+    """
+    horizon = len(future_dates)
+    # Features of the last point only need the short tail, not the store
+    origin = _origin_features(build_features(df.tail(INFERENCE_LOOKBACK))).iloc[-1]
+    calendar = add_date_features(pd.DataFrame({'date': future_dates}))
+    
+    # One row per step: same origin features, target-date calendar, step number
+    X = np.empty((horizon, len(booster.feature_names)), dtype=np.float32)
+    for col, name in enumerate(booster.feature_names):
+        if name == 'horizon_step':
+            X[:, col] = np.arange(1, horizon + 1)
+        elif name in origin.index:
+            X[:, col] = origin[name]
+        else:
+            X[:, col] = calendar[name].to_numpy()
+    
+    return origin['last_value'] + (forest.predict(X) if forest is not None else booster.inplace_predict(X))
+
+
+def fit_predict_xgboost(history: pd.DataFrame, horizon: int, params: Optional[dict] = None) -> np.ndarray:
+    """
+    Fit a recursive XGBoost model on ``history`` and forecast the next
+    ``horizon`` days, without registering anything (used by backtests
+    and hyperparameter tuning).
+    
+    Args:
+        history: 'date'/'value' frame to train on
+        horizon: Number of days to forecast
+        params: XGBoost parameters overriding XGBOOST_CONFIG
+    
+    Returns:
+        Array of predicted values for the days after the last date
+    """
+    df = clean_timeseries_data(history)
+    X, y = split_features_target(build_features(df))
+    model = xgb.XGBRegressor(**{**XGBOOST_CONFIG, **(params or {})})
+    model.fit(X, y)
+    
+    future_dates = pd.date_range(df['date'].max() + timedelta(days=1), periods=horizon, freq='D')
+    return _recursive_forecast(model.get_booster(), df['value'].to_numpy(dtype=float), future_dates)
+
+
+def fit_predict_xgboost_direct(history: pd.DataFrame, horizon: int, params: Optional[dict] = None) -> np.ndarray:
+    """
+    Fit a direct XGBoost model for ``horizon`` steps on ``history`` and
+    forecast them, without registering anything (used by backtests and
+    hyperparameter tuning).
+    
+    Args:
+        history: 'date'/'value' frame to train on
+        horizon: Number of days to forecast
+        params: XGBoost parameters overriding XGBOOST_CONFIG
+    
+    Returns:
+        Array of predicted values for the days after the last date
+    """
+    df = clean_timeseries_data(history)
+    X, y, _, _ = _build_direct_pairs(build_features(df), horizon)
+    model = xgb.XGBRegressor(**{**XGBOOST_CONFIG, **(params or {})})
+    model.fit(X, y)
+    
+    future_dates = pd.date_range(df['date'].max() + timedelta(days=1), periods=horizon, freq='D')
+    return _direct_forecast(model.get_booster(), df, future_dates)
+
+
+def _series_scale(values: np.ndarray) -> float:
+    """Mean absolute level of the last GLOBAL_SCALE_WINDOW values (1.0 if zero)."""
+    scale = float(np.abs(values[-GLOBAL_SCALE_WINDOW:]).mean()) if len(values) else 0.0
+    return scale if np.isfinite(scale) and scale > 0 else 1.0
+
+
+def _series_features(vocab: dict, business_id: int, metric_name: str, scale: float) -> Dict[str, float]:
+    """
+    Global model features identifying a series.
+    
+    Metrics and businesses are encoded by their position in the training
+    vocabulary; ones the model has never seen are missing (NaN). Training
+    masks the codes of a share of its rows the same way, so a new tenant is
+    forecast from what is common to all series.
+    """
+    return {
+        'metric_code': vocab['metrics'].get(normalize_metric_name(metric_name), np.nan),
+        'business_code': vocab['businesses'].get(int(business_id), np.nan),
+        'log_scale': float(np.log(scale)),
+    }
+
+
+def _load_global_model(model_path: Path) -> Tuple[xgb.Booster, dict]:
+    """Deserialize the global model and its series vocabulary."""
+    booster = xgb.Booster()
+    booster.load_model(str(model_path))
+    vocab = json.loads(booster.attr('series_vocab'))
+    return booster, {
+        'metrics': {name: code for code, name in enumerate(vocab['metrics'])},
+        'businesses': {business_id: code for code, business_id in enumerate(vocab['businesses'])},
+    }
+
+
+def train_xgboost_global_model(
+    session: Session,
+    horizon: int = 30,
+    series: Optional[Dict[Tuple[int, str], pd.DataFrame]] = None
+) -> Tuple[str, dict]:
+    """
+    Train one XGBoost model across every stored series.
+    
+    Each series is divided by its scale (mean absolute level of its last
+    GLOBAL_SCALE_WINDOW training points) before the usual date/lag/rolling
+    features are built, so series of any magnitude share the same trees.
+    The metric, the business and the log of the scale are added as series
+    features; on a random GLOBAL_UNSEEN_CODE_FRACTION of the training rows
+    each code is masked as missing, like for series outside the vocabulary.
+    The last (1 - TRAIN_TEST_SPLIT) of every series is held out for the
+    reported errors, which are in scaled units (relative to series level).
+    
+    Series are loaded and turned into features in batches, and each keeps
+    at most its even share of GLOBAL_MAX_TRAINING_ROWS (a random subset of
+    its rows), so memory is bounded by one batch plus the training set.
+    
+    Args:
+        session: Database session
+        horizon: Forecast horizon (not used in training but saved with model)
+        series: Already loaded {(business_id, metric_name): 'date'/'value'
+            frame}; skips the query
+    
+    Returns:
+        Tuple of (model_path, metrics_dict)
+    
+    Raises:
+        ValueError: if there is not enough data across all series
+    """
+    if series is None:
+        keys, batches = stream_all_timeseries(session, last_days=GLOBAL_HISTORY_DAYS)
+    else:
+        keys, batches = list(series), [series]
+    keys = [(int(business_id), normalize_metric_name(metric)) for business_id, metric in keys]
+    vocab = {
+        'metrics': sorted({metric for _, metric in keys}),
+        'businesses': sorted({business_id for business_id, _ in keys}),
+    }
+    codes = {
+        'metrics': {name: code for code, name in enumerate(vocab['metrics'])},
+        'businesses': {business_id: code for code, business_id in enumerate(vocab['businesses'])},
+    }
+    
+    rows_per_series = max(GLOBAL_MAX_TRAINING_ROWS // max(len(keys), 1), 1)
+    warmup = max(LAG_FEATURES + ROLLING_WINDOWS)
+    rng = np.random.default_rng(XGBOOST_CONFIG.get("random_state"))
+    frames = []
+    for batch in batches:
+        for (business_id, metric), history in batch.items():
+            business_id, metric = int(business_id), normalize_metric_name(metric)
+            df = clean_timeseries_data(history)
+            values = df['value'].to_numpy(dtype=float)
+            # Rows past the lag/rolling warm-up, and how many of them are trained on;
+            # the scale only sees points up to the last training row
+            n_train = int(max(len(df) - warmup, 0) * TRAIN_TEST_SPLIT)
+            scale = _series_scale(values[:warmup + n_train])
+            features = build_features(df.assign(value=values / scale)).dropna()
+            if features.empty:
+                continue
+            held_out = np.arange(len(features)) >= n_train
+            features = features.assign(**_series_features(codes, business_id, metric, scale), held_out=held_out)
+            if len(features) > rows_per_series:
+                features = features.iloc[np.sort(rng.choice(len(features), rows_per_series, replace=False))]
+            frames.append(features)
+    
+    data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    train_rows = ~data['held_out'].to_numpy(dtype=bool) if len(data) else np.zeros(0, dtype=bool)
+    if train_rows.sum() < MIN_TRAINING_SAMPLES:
+        raise ValueError(
+            f"Insufficient data: {int(train_rows.sum())} samples across {len(frames)} series "
+            f"(minimum {MIN_TRAINING_SAMPLES} required)"
+        )
+    
+    X = data.drop(columns=['date', 'value', 'held_out'])
+    y = data['value']
+    for column in ('metric_code', 'business_code'):
+        masked = train_rows & (rng.random(len(X)) < GLOBAL_UNSEEN_CODE_FRACTION)
+        X[column] = X[column].astype(float).mask(masked)
+    
+    model = xgb.XGBRegressor(**XGBOOST_CONFIG)
+    model.fit(X[train_rows], y[train_rows])
+    
+    metrics = {
+        "series": len(frames),
+        "train_samples": int(train_rows.sum()),
+        "test_samples": int((~train_rows).sum()),
+    }
+    if (~train_rows).any():
+        y_pred = model.predict(X[~train_rows])
+        metrics["scaled_mae"] = float(mean_absolute_error(y[~train_rows], y_pred))
+        metrics["scaled_rmse"] = float(np.sqrt(mean_squared_error(y[~train_rows], y_pred)))
+    
+    # The vocabulary travels inside the model file, not the registry index
+    model.get_booster().set_attr(series_vocab=json.dumps(vocab))
+    
+    entry = registry.register(
+        "xgboost_global", *GLOBAL_MODEL_SERIES,
+        write=lambda path: model.save_model(str(path)),
+        suffix=".json",
+        metadata={
+            "metrics": metrics,
+            "training_window": date_window(data['date']),
+            "features": list(X.columns),
+            "params": XGBOOST_CONFIG,
+            "horizon": horizon,
+        }
+    )
+    model_cache.invalidate(*GLOBAL_MODEL_SERIES, "xgboost_global")
+    
+    return entry["path"], metrics
+
+
+def predict_xgboost_global(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    horizon: int = 30,
+    history: Optional[pd.DataFrame] = None
+) -> List[ForecastPoint]:
+    """
+    Forecast one series with the global model.
+    
+    Works for any series with at least one point, including series the
+    model was not trained on or that are too short for a model of their own.
+    
+    Args:
+        session: Database session
+        business_id: Business ID
+        metric_name: Metric name to forecast
+        horizon: Number of days to forecast
+        history: Already loaded 'date'/'value' frame; skips the query
+    
+    Returns:
+        List of ForecastPoint objects
+    """
+    entry = registry.current("xgboost_global", *GLOBAL_MODEL_SERIES)
+    if entry is None:
+        raise FileNotFoundError("No xgboost_global model registered. Train model first.")
+    
+    # One model serves every series; loaded once per version and process
+    booster, vocab = model_cache.get_or_load(
+        *GLOBAL_MODEL_SERIES, "xgboost_global", entry["path"], _load_global_model
+    )
+    
+    lookback = max(INFERENCE_LOOKBACK, GLOBAL_SCALE_WINDOW)
+    if history is None:
+        history = load_timeseries_data(session, business_id, metric_name, last_n=lookback)
+    df = clean_timeseries_data(history.tail(lookback))
+    values = df['value'].to_numpy(dtype=float)
+    scale = _series_scale(values)
+    
+    future_dates = pd.date_range(df['date'].max() + timedelta(days=1), periods=horizon, freq='D')
+    static = _series_features(vocab, business_id, metric_name, scale)
+    predictions = scale * _recursive_forecast(booster, values / scale, future_dates, static, compile_booster(booster))
+    
+    return [
+        ForecastPoint(
+            date=forecast_date,
+            value=float(value),
+            lower_bound=None,
+            upper_bound=None
+        )
+        for forecast_date, value in zip(future_dates.date, predictions)
+    ]
+
+
 def model_exists(business_id: int, metric_name: str) -> bool:
     """
     Check if a trained model exists.
@@ -168,7 +946,32 @@ def model_exists(business_id: int, metric_name: str) -> bool:
         metric_name: Metric name
     
     Returns:
-        True if model file exists
+        True if a version is registered
+    """
+    return registry.exists("xgboost", business_id, metric_name)
+
+
+def direct_model_exists(business_id: int, metric_name: str, horizon: int = 1) -> bool:
+    """
+    Check if a trained direct model covering ``horizon`` days exists.
+    
+    Args:
+        business_id: Business ID
+        metric_name: Metric name
+        horizon: Number of days the model must cover
+    
+    Returns:
+        True if the current version was trained for the horizon
+    """
+    entry = registry.current("xgboost_direct", business_id, metric_name)
+    return entry is not None and int(entry.get("max_horizon") or 0) >= horizon
+
+
+def global_model_exists() -> bool:
+    """
+    Check if a trained global model exists.
+    
+    Returns:
+        True if a version is registered
     """
-    model_path = MODELS_STORE_DIR / f"xgboost_{business_id}_{metric_name}.json"
-    return model_path.exists()
+    return registry.exists("xgboost_global", *GLOBAL_MODEL_SERIES)
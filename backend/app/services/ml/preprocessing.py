@@ -1,70 +1,211 @@
 """Data preprocessing and feature engineering for time-series forecasting."""
 
+import hashlib
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Tuple, Optional
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Optional
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.orm import Session
 
-from app.models.models import BusinessData
-from .config import LAG_FEATURES, ROLLING_WINDOWS, MIN_TRAINING_SAMPLES
+from app.models.models import TimeseriesPoint
+from app.services.timeseries_store import normalize_metric_name, load_series_version, load_changed_from
+from .artifacts import atomic_write
+from .config import LAG_FEATURES, ROLLING_WINDOWS, MIN_TRAINING_SAMPLES, FEATURE_STORE_DIR, GLOBAL_LOAD_BATCH_SIZE
+
+# Optional pyarrow import (feature store persistence)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
 
 
 def load_timeseries_data(
     session: Session,
     business_id: int,
-    metric_name: str
+    metric_name: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    last_n: Optional[int] = None
 ) -> pd.DataFrame:
     """
-    Load time-series data from BusinessData table.
+    Load time-series data from the timeseries_points table.
+    
+    The metric filter and the optional date window / row limit are pushed
+    down into SQL, so only the requested slice of the series is read.
     
     Args:
         session: SQLAlchemy database session
         business_id: ID of the business
-        metric_name: Name of the metric to load
+        metric_name: Name of the metric to load (case-insensitive)
+        start_date: Only load points on or after this date
+        end_date: Only load points on or before this date
+        last_n: Only load the most recent ``last_n`` points
     
     Returns:
-        DataFrame with 'date' and 'value' columns
-    """
-    # Query BusinessData filtered by business_id
-    query = session.query(BusinessData).filter(
-        BusinessData.user_id == business_id
-    ).all()
-    
-    # Extract time-series from JSON data (case-insensitive metric matching)
-    metric_lower = metric_name.lower()
-    records = []
-    for record in query:
-        if record.data:
-            # Handle list format from CSV upload: [{"date": "...", "metric_name": "...", "value": ...}, ...]
-            if isinstance(record.data, list):
-                for row in record.data:
-                    if isinstance(row, dict):
-                        row_metric = row.get("metric_name", "")
-                        # Case-insensitive comparison
-                        if row_metric.lower() == metric_lower:
-                            records.append({
-                                "date": pd.to_datetime(row.get("date")),
-                                "value": float(row.get("value", 0))
-                            })
-            # Handle dict format: {"date": "2024-01-01", "metrics": {...}}
-            elif isinstance(record.data, dict):
-                metrics = record.data.get("metrics", {})
-                # Case-insensitive key lookup
-                for key, val in metrics.items():
-                    if key.lower() == metric_lower:
-                        records.append({
-                            "date": pd.to_datetime(record.data.get("date")),
-                            "value": float(val)
-                        })
-                        break
-    
-    df = pd.DataFrame(records)
-    
-    if df.empty:
+        DataFrame with 'date' and 'value' columns, sorted by date
+    """
+    stmt = select(TimeseriesPoint.date, TimeseriesPoint.value).where(
+        TimeseriesPoint.user_id == business_id,
+        TimeseriesPoint.metric_name == normalize_metric_name(metric_name)
+    )
+    if start_date is not None:
+        stmt = stmt.where(TimeseriesPoint.date >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(TimeseriesPoint.date <= end_date)
+    
+    if last_n:
+        # Newest first so the index serves the LIMIT, flipped back below
+        stmt = stmt.order_by(TimeseriesPoint.date.desc(), TimeseriesPoint.id.desc()).limit(last_n)
+    else:
+        stmt = stmt.order_by(TimeseriesPoint.date, TimeseriesPoint.id)
+    
+    rows = session.execute(stmt).all()
+    if not rows:
         raise ValueError(f"No data found for business_id={business_id}, metric={metric_name}")
+    if last_n:
+        rows.reverse()
+    
+    # Build columns in one step instead of converting row by row
+    dates, values = zip(*rows)
+    return pd.DataFrame({
+        'date': pd.to_datetime(np.array(dates, dtype='datetime64[ns]')),
+        'value': np.array(values, dtype=float),
+    })
+
+
+def count_timeseries_points(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    limit: Optional[int] = None
+) -> int:
+    """
+    Number of stored points of a series, counting at most ``limit``.
     
-    return df
+    With a limit the count stops early, so checking whether a series is
+    short costs the same however long the series is.
+    """
+    stmt = select(TimeseriesPoint.id).where(
+        TimeseriesPoint.user_id == business_id,
+        TimeseriesPoint.metric_name == normalize_metric_name(metric_name)
+    )
+    if limit:
+        stmt = stmt.limit(limit)
+    return session.execute(select(func.count()).select_from(stmt.subquery())).scalar_one()
+
+
+def load_timeseries_batch(
+    session: Session,
+    series: List[Tuple[int, str]],
+    start_date: Optional[datetime] = None,
+    last_n: Optional[int] = None
+) -> Dict[Tuple[int, str], pd.DataFrame]:
+    """
+    Load several series with a single query.
+    
+    Args:
+        session: SQLAlchemy database session
+        series: (business_id, metric_name) pairs; metric names are
+            case-insensitive
+        start_date: Only load points on or after this date
+        last_n: Only load the most recent ``last_n`` points of each series
+    
+    Returns:
+        {(business_id, metric_name): DataFrame with 'date' and 'value'},
+        keyed by the pairs as given; series without data are left out
+    """
+    keys = {(business_id, normalize_metric_name(metric_name)) for business_id, metric_name in series}
+    if not keys:
+        return {}
+    
+    stmt = select(
+        TimeseriesPoint.user_id, TimeseriesPoint.metric_name, TimeseriesPoint.date, TimeseriesPoint.value,
+        TimeseriesPoint.id
+    ).where(
+        tuple_(TimeseriesPoint.user_id, TimeseriesPoint.metric_name).in_(sorted(keys))
+    )
+    if start_date is not None:
+        stmt = stmt.where(TimeseriesPoint.date >= start_date)
+    if last_n:
+        # Rank each series newest first and keep the top ranks
+        recency = func.row_number().over(
+            partition_by=(TimeseriesPoint.user_id, TimeseriesPoint.metric_name),
+            order_by=(TimeseriesPoint.date.desc(), TimeseriesPoint.id.desc())
+        ).label('recency')
+        ranked = stmt.add_columns(recency).subquery()
+        stmt = select(ranked.c.user_id, ranked.c.metric_name, ranked.c.date, ranked.c.value, ranked.c.id).where(
+            ranked.c.recency <= last_n
+        )
+        order = (ranked.c.user_id, ranked.c.metric_name, ranked.c.date, ranked.c.id)
+    else:
+        order = (TimeseriesPoint.user_id, TimeseriesPoint.metric_name, TimeseriesPoint.date, TimeseriesPoint.id)
+    rows = session.execute(stmt.order_by(*order)).all()
+    if not rows:
+        return {}
+    
+    user_ids, metrics, dates, values, _ = zip(*rows)
+    df = pd.DataFrame({
+        'business_id': np.array(user_ids),
+        'metric_name': np.array(metrics, dtype=object),
+        'date': pd.to_datetime(np.array(dates, dtype='datetime64[ns]')),
+        'value': np.array(values, dtype=float),
+    })
+    frames = {
+        key: group[['date', 'value']].reset_index(drop=True)
+        for key, group in df.groupby(['business_id', 'metric_name'], sort=False)
+    }
+    
+    return {
+        (business_id, metric_name): frames[(business_id, normalize_metric_name(metric_name))]
+        for business_id, metric_name in series
+        if (business_id, normalize_metric_name(metric_name)) in frames
+    }
+
+
+def stream_all_timeseries(
+    session: Session,
+    last_days: Optional[int] = None,
+    batch_size: int = GLOBAL_LOAD_BATCH_SIZE
+) -> Tuple[List[Tuple[int, str]], Iterator[Dict[Tuple[int, str], pd.DataFrame]]]:
+    """
+    Every stored series, loaded ``batch_size`` series per query (global
+    model training), so only one batch of raw points is in memory at a time.
+    
+    Args:
+        session: SQLAlchemy database session
+        last_days: Only load points at most this many days older than the
+            newest stored point
+        batch_size: Series loaded per query
+    
+    Returns:
+        Tuple of the (business_id, metric_name) pairs with data in the window
+        (metric names as stored, lower-cased) and an iterator of
+        load_timeseries_batch results covering them
+    """
+    start_date = None
+    if last_days:
+        latest = session.execute(select(func.max(TimeseriesPoint.date))).scalar()
+        if latest is None:
+            return [], iter(())
+        start_date = latest - timedelta(days=last_days)
+    
+    stmt = select(TimeseriesPoint.user_id, TimeseriesPoint.metric_name).distinct()
+    if start_date is not None:
+        stmt = stmt.where(TimeseriesPoint.date >= start_date)
+    series = [
+        (int(business_id), metric_name) for business_id, metric_name in
+        session.execute(stmt.order_by(TimeseriesPoint.user_id, TimeseriesPoint.metric_name))
+    ]
+    
+    batches = (
+        load_timeseries_batch(session, series[start:start + batch_size], start_date)
+        for start in range(0, len(series), batch_size)
+    )
+    return series, batches
 
 
 def clean_timeseries_data(df: pd.DataFrame) -> pd.DataFrame:
@@ -94,6 +235,40 @@ def clean_timeseries_data(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def _date_feature_columns(dates: pd.Series) -> Dict[str, pd.Series]:
+    """Calendar feature columns for a 'date' column."""
+    day_of_week = dates.dt.dayofweek
+    return {
+        'day_of_week': day_of_week,
+        'day_of_month': dates.dt.day,
+        'month': dates.dt.month,
+        'quarter': dates.dt.quarter,
+        'year': dates.dt.year,
+        'is_weekend': day_of_week.isin([5, 6]).astype(int),
+        'is_month_start': dates.dt.is_month_start.astype(int),
+        'is_month_end': dates.dt.is_month_end.astype(int),
+    }
+
+
+def _lag_feature_columns(values: pd.Series, lags: list = None) -> Dict[str, pd.Series]:
+    """Lagged value columns."""
+    return {f'lag_{lag}': values.shift(lag) for lag in lags or LAG_FEATURES}
+
+
+def _rolling_feature_columns(values: pd.Series, windows: list = None) -> Dict[str, pd.Series]:
+    """Rolling mean/std columns."""
+    columns = {}
+    for window in windows or ROLLING_WINDOWS:
+        rolling = values.rolling(window=window)
+        columns[f'rolling_mean_{window}'] = rolling.mean()
+        columns[f'rolling_std_{window}'] = rolling.std()
+    return columns
+
+
+# Calendar feature names, in column order
+DATE_FEATURES = list(_date_feature_columns(pd.Series(pd.to_datetime([]))).keys())
+
+
 def add_date_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     Add date-based features.
@@ -104,18 +279,7 @@ def add_date_features(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         DataFrame with additional date features
     """
-    df = df.copy()
-    
-    df['day_of_week'] = df['date'].dt.dayofweek
-    df['day_of_month'] = df['date'].dt.day
-    df['month'] = df['date'].dt.month
-    df['quarter'] = df['date'].dt.quarter
-    df['year'] = df['date'].dt.year
-    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-    df['is_month_start'] = df['date'].dt.is_month_start.astype(int)
-    df['is_month_end'] = df['date'].dt.is_month_end.astype(int)
-    
-    return df
+    return df.assign(**_date_feature_columns(df['date']))
 
 
 def add_lag_features(df: pd.DataFrame, lags: list = None) -> pd.DataFrame:
@@ -129,13 +293,7 @@ def add_lag_features(df: pd.DataFrame, lags: list = None) -> pd.DataFrame:
     Returns:
         DataFrame with lag features
     """
-    df = df.copy()
-    lags = lags or LAG_FEATURES
-    
-    for lag in lags:
-        df[f'lag_{lag}'] = df['value'].shift(lag)
-    
-    return df
+    return df.assign(**_lag_feature_columns(df['value'], lags))
 
 
 def add_rolling_features(df: pd.DataFrame, windows: list = None) -> pd.DataFrame:
@@ -149,38 +307,168 @@ def add_rolling_features(df: pd.DataFrame, windows: list = None) -> pd.DataFrame
     Returns:
         DataFrame with rolling features
     """
-    df = df.copy()
-    windows = windows or ROLLING_WINDOWS
+    return df.assign(**_rolling_feature_columns(df['value'], windows))
+
+
+def build_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Date, lag and rolling features in one frame, built in a single pass.
     
-    for window in windows:
-        df[f'rolling_mean_{window}'] = df['value'].rolling(window=window).mean()
-        df[f'rolling_std_{window}'] = df['value'].rolling(window=window).std()
+    Same columns as add_date_features -> add_lag_features ->
+    add_rolling_features, without copying the frame at every step.
     
-    return df
+    Args:
+        df: Cleaned DataFrame with 'date' and 'value' columns
+    
+    Returns:
+        DataFrame with date, value and the feature columns; warm-up rows
+        keep their NaN lag/rolling values
+    """
+    return pd.DataFrame({
+        'date': df['date'],
+        'value': df['value'],
+        **_date_feature_columns(df['date']),
+        **_lag_feature_columns(df['value']),
+        **_rolling_feature_columns(df['value']),
+    })
 
 
-def prepare_data_for_xgboost(
-    session: Session,
+class FeatureStore:
+    """
+    Feature matrices (see build_features) persisted per series as Parquet.
+    
+    Each file records the series data version it was built from. When the
+    version changed, rows before the earliest date written since then (see
+    load_changed_from) are kept, only points from that date on are loaded,
+    and their features are computed from a context of the last
+    max(LAG_FEATURES + ROLLING_WINDOWS) kept rows. Appends reload just the
+    new dates; edits reload from the first edited date. Without a recorded
+    change date, or when nothing before it is kept, the matrix is rebuilt
+    from the whole series.
+    """
+    
+    def __init__(self, root: Path):
+        self.root = Path(root)
+    
+    def path(self, business_id: int, metric_name: str) -> Path:
+        """Parquet file of a series (metric names are hashed, not used as file names)."""
+        digest = hashlib.sha256(normalize_metric_name(metric_name).encode()).hexdigest()[:32]
+        return self.root / str(business_id) / f"{digest}.parquet"
+    
+    def get(
+        self,
+        session: Session,
+        business_id: int,
+        metric_name: str,
+        data_version: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Feature matrix of a series at its current data version.
+        
+        Args:
+            session: SQLAlchemy database session
+            business_id: ID of the business
+            metric_name: Name of the metric
+            data_version: Current series data version, if already known
+        
+        Returns:
+            DataFrame as returned by build_features
+        """
+        if data_version is None:
+            data_version = load_series_version(session, business_id, metric_name)
+        path = self.path(business_id, metric_name)
+        
+        features = None
+        if path.exists():
+            metadata = pq.read_schema(path).metadata or {}
+            stored_version = int(metadata.get(b'data_version', -1))
+            if stored_version == data_version:
+                return pd.read_parquet(path)
+            if 0 <= stored_version < data_version:
+                changed_from = load_changed_from(session, business_id, metric_name, stored_version, data_version)
+                if changed_from is not None:
+                    features = self._update(session, business_id, metric_name, pd.read_parquet(path), changed_from)
+        
+        if features is None:
+            history = load_timeseries_data(session, business_id, metric_name)
+            features = build_features(clean_timeseries_data(history))
+        
+        table = pa.Table.from_pandas(features, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b'data_version': str(data_version),
+        })
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(path) as tmp_path:
+            pq.write_table(table, tmp_path)
+        return features
+    
+    @staticmethod
+    def _update(
+        session: Session,
+        business_id: int,
+        metric_name: str,
+        stored: pd.DataFrame,
+        changed_from: datetime
+    ) -> Optional[pd.DataFrame]:
+        """
+        Recompute the rows of ``stored`` from ``changed_from`` on.
+        
+        Returns:
+            The updated features, or None when no stored row is older than
+            ``changed_from`` and the matrix must be rebuilt
+        """
+        kept = stored[stored['date'] < pd.Timestamp(changed_from)]
+        if kept.empty:
+            return None
+        changed = load_timeseries_data(session, business_id, metric_name, start_date=changed_from)
+        
+        # Kept (already cleaned) values seed the lags and forward fill
+        context = kept[['date', 'value']].iloc[-max(LAG_FEATURES + ROLLING_WINDOWS):]
+        df = clean_timeseries_data(pd.concat([context, changed], ignore_index=True))
+        tail = build_features(df).iloc[len(context):]
+        return pd.concat([kept, tail], ignore_index=True)
+
+
+# Shared by every request in this process
+feature_store = FeatureStore(FEATURE_STORE_DIR)
+
+
+def load_feature_frame(
+    session: Optional[Session],
     business_id: int,
-    metric_name: str
-) -> Tuple[pd.DataFrame, pd.Series]:
+    metric_name: str,
+    history: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
     """
-    Prepare data for XGBoost training.
+    Features of a whole series: from the feature store, or built from
+    ``history`` when given (or when pyarrow is not installed).
+    
+    Args:
+        session: SQLAlchemy database session
+        business_id: ID of the business
+        metric_name: Name of the metric
+        history: Already loaded 'date'/'value' frame; skips the store
     
     Returns:
-        Tuple of (features_df, target_series)
+        DataFrame as returned by build_features
     """
-    # Load and clean data
-    df = load_timeseries_data(session, business_id, metric_name)
-    df = clean_timeseries_data(df)
-    
-    # Add features
-    df = add_date_features(df)
-    df = add_lag_features(df)
-    df = add_rolling_features(df)
+    if history is None and HAS_PYARROW:
+        return feature_store.get(session, business_id, metric_name)
+    if history is None:
+        history = load_timeseries_data(session, business_id, metric_name)
+    return build_features(clean_timeseries_data(history))
+
+
+def split_features_target(features: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Training rows of a feature frame as (X, y).
     
+    Raises:
+        ValueError: if fewer than MIN_TRAINING_SAMPLES rows have every feature
+    """
     # Drop rows with NaN (from lag/rolling features)
-    df = df.dropna()
+    df = features.dropna()
     
     if len(df) < MIN_TRAINING_SAMPLES:
         raise ValueError(
@@ -189,25 +477,63 @@ def prepare_data_for_xgboost(
     
     # Separate features and target
     feature_cols = [col for col in df.columns if col not in ['date', 'value']]
-    X = df[feature_cols]
-    y = df['value']
+    return df[feature_cols], df['value']
+
+
+def prepare_data_for_xgboost(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    history: Optional[pd.DataFrame] = None
+) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Prepare data for XGBoost training.
     
-    return X, y
+    Whole-series requests read precomputed features from the feature store.
+    
+    Args:
+        session: SQLAlchemy database session
+        business_id: ID of the business
+        metric_name: Name of the metric
+        start_date: Optional start of the training window
+        end_date: Optional end of the training window
+        history: Already loaded 'date'/'value' frame; skips the query
+    
+    Returns:
+        Tuple of (features_df, target_series)
+    """
+    if history is None and (start_date is not None or end_date is not None):
+        history = load_timeseries_data(session, business_id, metric_name, start_date, end_date)
+    return split_features_target(load_feature_frame(session, business_id, metric_name, history))
 
 
 def prepare_data_for_prophet(
     session: Session,
     business_id: int,
-    metric_name: str
+    metric_name: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    history: Optional[pd.DataFrame] = None
 ) -> pd.DataFrame:
     """
     Prepare data for Prophet model (requires 'ds' and 'y' columns).
     
+    Args:
+        session: SQLAlchemy database session
+        business_id: ID of the business
+        metric_name: Name of the metric
+        start_date: Optional start of the training window
+        end_date: Optional end of the training window
+        history: Already loaded 'date'/'value' frame; skips the query
+    
     Returns:
         DataFrame with 'ds' (date) and 'y' (value) columns
     """
-    df = load_timeseries_data(session, business_id, metric_name)
-    df = clean_timeseries_data(df)
+    if history is None:
+        history = load_timeseries_data(session, business_id, metric_name, start_date, end_date)
+    df = clean_timeseries_data(history)
     
     if len(df) < MIN_TRAINING_SAMPLES:
         raise ValueError(
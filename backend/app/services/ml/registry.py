@@ -0,0 +1,451 @@
+"""Versioned model registry.
+
+Layout under MODEL_REGISTRY_DIR::
+
+    objects/ab/abcdef....json   immutable artifacts named by their SHA-256
+    index.json                  manifest: versions of every model with their
+                                metadata and which version is current
+    selections.json             model type selected for each series
+    tuned.json                  tuned hyperparameters
+
+Training writes the artifact first and then promotes it by atomically
+replacing ``index.json``, so readers never see a half-written model or a
+half-updated manifest. Selections and tuned parameters are written in
+fleet-sized batches by offline runs, so they live in their own files and
+promotions never rewrite them. Lookups are served from in-memory copies,
+re-read only when a file changed (checked at most every
+REGISTRY_REFRESH_SECONDS, or immediately when a model is not found).
+
+Models are keyed by ``{model_type}:{business_id}:{metric_name}`` with the
+metric name normalized like stored data, never used as a file name. Model
+selections (tournament winners, see tournament.py) are keyed by
+``{business_id}:{metric_name}``, tuned hyperparameters (see tuning.py) like
+the models they apply to.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+import pandas as pd
+
+from app.services.timeseries_store import normalize_metric_name
+from .artifacts import atomic_write
+from .config import MODEL_REGISTRY_DIR, MODELS_STORE_DIR, REGISTRY_KEEP_VERSIONS, REGISTRY_REFRESH_SECONDS
+
+# Cross-process lock for index updates (POSIX); threads are always serialized
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+INDEX_FILE = "index.json"
+INDEX_FORMAT = 1
+SELECTIONS_FILE = "selections.json"
+TUNED_FILE = "tuned.json"
+
+# Model files written before the registry existed
+LEGACY_MODEL_FILE = re.compile(r"^(xgboost_direct|xgboost|prophet)_(\d+)_(.+)\.(json|pkl)$")
+
+
+def model_key(model_type: str, business_id: int, metric_name: str) -> str:
+    """Registry key of a model."""
+    return f"{model_type}:{business_id}:{normalize_metric_name(metric_name)}"
+
+
+def series_key(business_id: int, metric_name: str) -> str:
+    """Registry key of a series' model selection."""
+    return f"{business_id}:{normalize_metric_name(metric_name)}"
+
+
+def date_window(dates: pd.Series) -> Dict[str, str]:
+    """Training window metadata for the dates a model was fit on."""
+    return {"start": pd.Timestamp(dates.min()).isoformat(), "end": pd.Timestamp(dates.max()).isoformat()}
+
+
+class ModelRegistry:
+    """Content-addressed, versioned store of trained models."""
+    
+    def __init__(
+        self,
+        root: Union[str, Path],
+        legacy_dir: Optional[Union[str, Path]] = None,
+        refresh_seconds: float = REGISTRY_REFRESH_SECONDS,
+        keep_versions: int = REGISTRY_KEEP_VERSIONS
+    ):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.index_path = self.root / INDEX_FILE
+        self.legacy_dir = Path(legacy_dir) if legacy_dir else None
+        self.refresh_seconds = refresh_seconds
+        self.keep_versions = keep_versions
+        
+        self._index = {"format": INDEX_FORMAT, "models": {}}
+        self._index_signature = None
+        self._checked_at = None
+        self._legacy_checked = False
+        # {file name: [records by key, file signature, last checked]}
+        self._records = {SELECTIONS_FILE: [{}, None, None], TUNED_FILE: [{}, None, None]}
+        self._lock = threading.RLock()
+    
+    # ------------------------------------------------------------------ reads
+    
+    def current(self, model_type: str, business_id: int, metric_name: str) -> Optional[dict]:
+        """
+        Manifest entry of the promoted version of a model.
+        
+        Args:
+            model_type: 'xgboost', 'xgboost_direct', 'prophet', ...
+            business_id: Business ID
+            metric_name: Metric name (case-insensitive)
+        
+        Returns:
+            Version metadata plus the absolute artifact ``path``, or None
+        """
+        key = model_key(model_type, business_id, metric_name)
+        with self._lock:
+            self._refresh()
+            entry = self._current_entry(key)
+            if entry is None:
+                # Another process may just have promoted it
+                self._refresh(force=True)
+                entry = self._current_entry(key)
+            return entry
+    
+    def exists(self, model_type: str, business_id: int, metric_name: str) -> bool:
+        """True if a version of the model is promoted."""
+        return self.current(model_type, business_id, metric_name) is not None
+    
+    def versions(self, model_type: str, business_id: int, metric_name: str) -> List[dict]:
+        """Every kept version of a model, oldest first."""
+        key = model_key(model_type, business_id, metric_name)
+        with self._lock:
+            self._refresh(force=True)
+            model = self._index["models"].get(key, {"versions": []})
+            return [self._with_path(version) for version in model["versions"]]
+    
+    def list_models(self) -> Dict[str, dict]:
+        """Current version of every model, by registry key."""
+        with self._lock:
+            self._refresh(force=True)
+            return {
+                key: entry for key, entry in
+                ((key, self._current_entry(key)) for key in self._index["models"])
+                if entry is not None
+            }
+    
+    def selection(self, business_id: int, metric_name: str) -> Optional[dict]:
+        """
+        Model type selected for a series by the last tournament.
+        
+        Served from memory (no forced re-read on a miss, as most series
+        have no selection), so it costs a dict lookup.
+        
+        Returns:
+            Selection record (model_type, scores, data_version, ...) or None
+        """
+        with self._lock:
+            return self._read_records(SELECTIONS_FILE).get(series_key(business_id, metric_name))
+    
+    def tuned_params(self, model_type: str, business_id: int, metric_name: str) -> Optional[dict]:
+        """
+        Hyperparameters tuned for a model by the last search.
+        
+        Like selection(), a dict lookup in memory.
+        
+        Returns:
+            Tuning record (params, score, default_score, tuned_at, ...) or None
+        """
+        with self._lock:
+            return self._read_records(TUNED_FILE).get(model_key(model_type, business_id, metric_name))
+    
+    # ----------------------------------------------------------------- writes
+    
+    def register(
+        self,
+        model_type: str,
+        business_id: int,
+        metric_name: str,
+        write: Callable[[Path], None],
+        suffix: str,
+        metadata: dict,
+        promote: bool = True
+    ) -> dict:
+        """
+        Store a new model version and (by default) make it current.
+        
+        Args:
+            model_type: 'xgboost', 'xgboost_direct', 'prophet', ...
+            business_id: Business ID
+            metric_name: Metric name
+            write: Writes the serialized model to the given path
+            suffix: Artifact file suffix ('.json', '.pkl', ...)
+            metadata: Manifest fields (metrics, training_window, features, ...)
+            promote: Make this version current
+        
+        Returns:
+            The new version's manifest entry, with ``path``
+        """
+        sha256, artifact = self._store_artifact(write, suffix)
+        key = model_key(model_type, business_id, metric_name)
+        
+        with self._index_update() as index:
+            model = index["models"].setdefault(key, {"current": None, "versions": []})
+            version = {
+                **metadata,
+                "version": 1 + max((v["version"] for v in model["versions"]), default=0),
+                "model_type": model_type,
+                "business_id": business_id,
+                "metric_name": normalize_metric_name(metric_name),
+                "sha256": sha256,
+                "artifact": artifact.relative_to(self.root).as_posix(),
+                "created_at": datetime.utcnow().isoformat(),
+            }
+            model["versions"].append(version)
+            if promote:
+                model["current"] = version["version"]
+            self._prune(index, model)
+        
+        return self._with_path(version)
+    
+    def promote(self, model_type: str, business_id: int, metric_name: str, version: int) -> dict:
+        """
+        Make a kept version current (e.g. to roll back a bad retrain).
+        
+        Raises:
+            ValueError: if the version is not in the registry
+        """
+        key = model_key(model_type, business_id, metric_name)
+        with self._index_update() as index:
+            model = index["models"].get(key, {"versions": []})
+            matches = [v for v in model["versions"] if v["version"] == version]
+            if not matches:
+                raise ValueError(f"Unknown version {version} of model {key}")
+            model["current"] = version
+        return self._with_path(matches[0])
+    
+    def record_selections(self, selections: List[dict]) -> None:
+        """
+        Store the selected model type of many series in one file update.
+        
+        Args:
+            selections: Records with at least business_id, metric_name and
+                model_type; a series' previous selection is replaced
+        """
+        if not selections:
+            return
+        with self._records_update(SELECTIONS_FILE) as stored:
+            for record in selections:
+                stored[series_key(record["business_id"], record["metric_name"])] = {
+                    **record, "metric_name": normalize_metric_name(record["metric_name"])
+                }
+    
+    def record_tuned_params(self, records: List[dict]) -> None:
+        """
+        Store the tuned hyperparameters of many models in one file update.
+        
+        Args:
+            records: Records with at least model_type, business_id,
+                metric_name and params; a model's previous record is replaced
+        """
+        if not records:
+            return
+        with self._records_update(TUNED_FILE) as stored:
+            for record in records:
+                stored[model_key(record["model_type"], record["business_id"], record["metric_name"])] = {
+                    **record, "metric_name": normalize_metric_name(record["metric_name"])
+                }
+    
+    # --------------------------------------------------------------- internals
+    
+    def _current_entry(self, key: str) -> Optional[dict]:
+        model = self._index["models"].get(key)
+        if not model or model.get("current") is None:
+            return None
+        for version in model["versions"]:
+            if version["version"] == model["current"]:
+                return self._with_path(version)
+        return None
+    
+    def _with_path(self, version: dict) -> dict:
+        return {**version, "path": str(self.root / version["artifact"])}
+    
+    def _refresh(self, force: bool = False) -> None:
+        """Re-read index.json if it changed. Caller holds the lock."""
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.refresh_seconds:
+            return
+        self._checked_at = now
+        
+        if not self._reload() and not self._legacy_checked:
+            self._legacy_checked = True
+            if self._legacy_files():
+                # Creating the index imports them
+                with self._index_update():
+                    pass
+                self._reload()
+    
+    def _reload(self) -> bool:
+        """Load index.json if it changed; False if it does not exist yet."""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return False
+        
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature != self._index_signature:
+            with open(self.index_path) as f:
+                self._index = json.load(f)
+            self._index_signature = signature
+        return True
+    
+    def _store_artifact(self, write: Callable[[Path], None], suffix: str):
+        """Write, hash and move an artifact to its content address."""
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.objects_dir / f".{uuid.uuid4().hex}.tmp{suffix}"
+        try:
+            write(tmp_path)
+            digest = hashlib.sha256()
+            with open(tmp_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            sha256 = digest.hexdigest()
+            
+            artifact = self.objects_dir / sha256[:2] / f"{sha256}{suffix}"
+            artifact.parent.mkdir(exist_ok=True)
+            # Identical content is already stored under the same name
+            if not artifact.exists():
+                os.replace(tmp_path, artifact)
+            return sha256, artifact
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+    
+    def _read_records(self, name: str, force: bool = False) -> dict:
+        """Records of selections.json or tuned.json, re-read if the file
+        changed. Caller holds the lock."""
+        state = self._records[name]
+        now = time.monotonic()
+        if not force and state[2] is not None and now - state[2] < self.refresh_seconds:
+            return state[0]
+        state[2] = now
+        
+        path = self.root / name
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # Written into index.json before they had their own file
+            self._refresh()
+            state[0] = self._index.get(name.split(".")[0], {})
+            return state[0]
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature != state[1]:
+            with open(path) as f:
+                state[0] = json.load(f)
+            state[1] = signature
+        return state[0]
+    
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold the thread lock and the cross-process file lock."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.root / ".lock", "a") as lock_file:
+            if HAS_FCNTL:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if HAS_FCNTL:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _write_json(self, name: str, document: dict, indent: Optional[int] = None) -> None:
+        """Replace a registry file in one rename, so readers never see it half-written."""
+        with atomic_write(self.root / name) as tmp_path:
+            tmp_path.write_text(json.dumps(document, indent=indent, sort_keys=True, default=str))
+    
+    @contextmanager
+    def _records_update(self, name: str) -> Iterator[dict]:
+        """Read-modify-write selections.json or tuned.json under the locks."""
+        with self._file_lock():
+            records = dict(self._read_records(name, force=True))
+            yield records
+            self._write_json(name, records)
+            self._read_records(name, force=True)
+    
+    @contextmanager
+    def _index_update(self) -> Iterator[dict]:
+        """Read-modify-write index.json under the thread and file locks."""
+        with self._file_lock():
+            exists = self._reload()
+            index = json.loads(json.dumps(self._index))
+            if not exists:
+                self._import_legacy_models(index)
+            # Move records an older registry kept in the index to their files
+            for name in (SELECTIONS_FILE, TUNED_FILE):
+                legacy = index.pop(name.split(".")[0], None)
+                if legacy is not None and not (self.root / name).exists():
+                    self._write_json(name, legacy)
+            yield index
+            
+            # Promotion: readers switch to the new manifest in one rename
+            self._write_json(INDEX_FILE, index, indent=1)
+            self._index = index
+            self._reload()
+    
+    def _prune(self, index: dict, model: dict) -> None:
+        """Forget versions beyond keep_versions (never the current one) and
+        delete artifacts no version references any more."""
+        excess = len(model["versions"]) - self.keep_versions
+        if excess <= 0:
+            return
+        dropped = [v for v in model["versions"] if v["version"] != model["current"]][:excess]
+        model["versions"] = [v for v in model["versions"] if v not in dropped]
+        
+        referenced = {v["artifact"] for m in index["models"].values() for v in m["versions"]}
+        for version in dropped:
+            if version["artifact"] not in referenced:
+                (self.root / version["artifact"]).unlink(missing_ok=True)
+    
+    def _legacy_files(self) -> list:
+        """Loose ``{type}_{business_id}_{metric}`` files written before the registry."""
+        if self.legacy_dir is None or not self.legacy_dir.is_dir():
+            return []
+        return [
+            (path, LEGACY_MODEL_FILE.match(path.name))
+            for path in sorted(self.legacy_dir.iterdir())
+            if path.is_file() and LEGACY_MODEL_FILE.match(path.name)
+        ]
+    
+    def _import_legacy_models(self, index: dict) -> None:
+        """Register legacy model files as version 1 when the index is created.
+        The files themselves are left in place."""
+        legacy = self._legacy_files()
+        for path, match in legacy:
+            model_type, business_id, metric_name, _ = match.groups()
+            sha256, artifact = self._store_artifact(lambda tmp: shutil.copyfile(path, tmp), path.suffix)
+            index["models"][model_key(model_type, int(business_id), metric_name)] = {"current": 1, "versions": [{
+                "version": 1,
+                "model_type": model_type,
+                "business_id": int(business_id),
+                "metric_name": normalize_metric_name(metric_name),
+                "sha256": sha256,
+                "artifact": artifact.relative_to(self.root).as_posix(),
+                "created_at": datetime.utcfromtimestamp(path.stat().st_mtime).isoformat(),
+                "imported_from": path.name,
+            }]}
+        if legacy:
+            print(f"Imported {len(legacy)} legacy model file(s) into the model registry")
+
+
+# Shared by every request in this process
+registry = ModelRegistry(MODEL_REGISTRY_DIR, legacy_dir=MODELS_STORE_DIR)
@@ -1,16 +1,21 @@
 """Pydantic schemas for ML forecasting requests and responses."""
 
 from pydantic import BaseModel, Field
-from datetime import date as date_type
+from datetime import date as date_type, datetime
 from typing import Optional, List
 
+from .config import MAX_BATCH_FORECASTS
+
 
 class ForecastRequest(BaseModel):
     """Request schema for forecast generation."""
     business_id: int = Field(..., description="ID of the business")
     metric_name: str = Field(..., description="Name of the metric to forecast")
     horizon: int = Field(30, description="Forecast horizon in days", ge=1, le=365)
-    model_type: Optional[str] = Field("auto", description="Model type: 'xgboost', 'prophet', or 'auto'")
+    model_type: Optional[str] = Field("auto", description="Model type: 'xgboost', 'xgboost_direct', 'xgboost_global', 'prophet', 'ets', or 'auto'")
+    include_intervals: bool = Field(
+        True, description="Compute prediction intervals; Prophet skips uncertainty sampling when false"
+    )
 
 
 class ForecastPoint(BaseModel):
@@ -26,11 +31,81 @@ class ForecastResponse(BaseModel):
     business_id: int
     metric_name: str
     horizon: int
-    model_used: str = Field(..., description="Model that was used: 'xgboost' or 'prophet'")
+    model_used: str = Field(..., description="Model that was used: 'xgboost', 'xgboost_direct', 'xgboost_global', 'prophet' or 'ets'")
     points: List[ForecastPoint] = Field(..., description="List of forecast points")
     metrics: Optional[dict] = Field(None, description="Model performance metrics")
 
 
+class BatchForecastRequest(BaseModel):
+    """Request schema for forecasting many series in one call."""
+    requests: List[ForecastRequest] = Field(
+        ..., description="Forecasts to generate", min_length=1, max_length=MAX_BATCH_FORECASTS
+    )
+
+
+class BatchForecastResult(BaseModel):
+    """One line of the streamed batch forecast response."""
+    index: int = Field(..., description="Position of the request in the batch")
+    business_id: int
+    metric_name: str
+    status: int = Field(..., description="HTTP status the single-forecast endpoint would return")
+    forecast: Optional[ForecastResponse] = Field(None, description="Forecast, when status is 200")
+    error: Optional[str] = Field(None, description="Error detail, when status is not 200")
+    job_id: Optional[int] = Field(None, description="Training job to poll, when status is 202")
+
+
+class BacktestFold(BaseModel):
+    """One rolling-origin fold: fit up to the cutoff, forecast the days after it."""
+    cutoff: date_type = Field(..., description="Last date of the training data")
+    train_samples: int
+    test_samples: int = Field(0, description="Forecast days with an observed value")
+    mae: Optional[float] = None
+    error: Optional[str] = Field(None, description="Why the fold could not be run")
+
+
+class BacktestResult(BaseModel):
+    """Out-of-sample accuracy of a model type on one series."""
+    business_id: int
+    metric_name: str
+    model_type: str
+    horizon: int
+    step: int = Field(..., description="Days between consecutive cutoffs")
+    data_version: Optional[int] = Field(None, description="Series data version the folds were run on")
+    params: Optional[dict] = Field(None, description="XGBoost parameters overriding the defaults, if any")
+    folds: List[BacktestFold]
+    mae: float = Field(..., description="Mean absolute error over every forecast day of every fold")
+    rmse: float
+    mae_by_step: List[Optional[float]] = Field(
+        ..., description="MAE per days ahead (index 0 = 1 day), None where no fold has an observation"
+    )
+    rmse_by_step: List[Optional[float]]
+    computed_at: datetime
+
+
+class TrainingJobOut(BaseModel):
+    """Status of a queued model training job (or backtest, or tournament)."""
+    id: int
+    business_id: int
+    metric_name: str
+    model_type: str
+    horizon: int
+    incremental: bool = False
+    kind: str = Field("train", description="'train', 'backtest', 'tournament' or 'tune'")
+    params: Optional[dict] = Field(None, description="Arguments of a backtest or tuning job besides the horizon")
+    status: str = Field(..., description="'pending', 'running', 'completed', 'failed' or 'cancelled'")
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    result: Optional[dict] = Field(
+        None, description="Model path and evaluation metrics, the BacktestResult, the tournament selection "
+                          "or the tuning record, once completed"
+    )
+    error_message: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+
 class InsightsRequest(BaseModel):
     """Request schema for AI insights generation."""
     business_id: int = Field(..., description="ID of the business")
@@ -0,0 +1,69 @@
+"""Request coalescing: concurrent identical calls share one execution."""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one execution (threads).
+    
+    The first caller runs the function; callers arriving while it is in
+    flight block and receive the same result or exception. Nothing is
+    remembered once the call finishes; caching is left to the caller.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """
+        Run ``fn`` unless a call with ``key`` is in flight, then share its outcome.
+        
+        Args:
+            key: Identity of the call
+            fn: Function to run
+        
+        Returns:
+            Result of the single execution
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """Like SingleFlight, for coroutines running on one event loop."""
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Future"] = {}
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await ``fn()`` unless a call with ``key`` is in flight, then share its outcome."""
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # A cancelled waiter must not cancel the call the others share
+        return await asyncio.shield(task)
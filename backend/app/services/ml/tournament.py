@@ -0,0 +1,238 @@
+"""Backtest-driven model selection for ``model_type="auto"``.
+
+A tournament backtests every candidate model type on a series (see
+backtest.py) and records the one with the lowest out-of-sample MAE in the
+model registry, together with all scores and the data version they were
+computed at. Candidates are scored on the same folds: the ones every
+candidate that could be backtested completed. ``ForecastService.choose_model`` then resolves 'auto' with a
+registry lookup. A fleet run only re-scores series whose data version
+changed since their last tournament.
+
+Run nightly with:
+    cd backend && python -m app.services.ml.tournament
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.models.models import TimeseriesPoint
+from app.services.timeseries_store import load_series_version, load_series_versions
+from .backtest import FORECASTERS, run_backtest
+from .config import BACKTEST_FOLDS, BACKTEST_POOL_WORKERS, TOURNAMENT_BATCH_SIZE, TOURNAMENT_CANDIDATES, TOURNAMENT_HORIZON
+from .preprocessing import load_timeseries_data, load_timeseries_batch
+from .registry import registry
+from .schemas import BacktestResult
+
+
+def candidate_model_types() -> List[str]:
+    """Tournament candidates whose libraries are installed."""
+    return [model_type for model_type in TOURNAMENT_CANDIDATES if model_type in FORECASTERS]
+
+
+def _common_fold_scores(results: Dict[str, BacktestResult]) -> Tuple[Dict[str, float], int]:
+    """
+    MAE of every candidate over the folds all of them completed.
+    
+    A candidate may fail early folds another one completes (e.g. XGBoost
+    on the shortest training windows); averaging each over its own folds
+    would compare errors on different days.
+    
+    Returns:
+        ({model_type: MAE}, number of folds scored)
+    
+    Raises:
+        ValueError: if no fold was completed by every candidate
+    """
+    completed = [{fold.cutoff for fold in result.folds if fold.mae is not None} for result in results.values()]
+    common = set.intersection(*completed)
+    if not common:
+        raise ValueError("No backtest fold was completed by every candidate: " + ", ".join(results))
+    
+    scores = {}
+    for model_type, result in results.items():
+        folds = [fold for fold in result.folds if fold.cutoff in common]
+        # Weighted by observed days, as the MAE over every forecast day
+        scores[model_type] = sum(fold.mae * fold.test_samples for fold in folds) / sum(
+            fold.test_samples for fold in folds
+        )
+    return scores, len(common)
+
+
+def run_tournament(
+    session: Optional[Session],
+    business_id: int,
+    metric_name: str,
+    horizon: int = TOURNAMENT_HORIZON,
+    history: Optional[pd.DataFrame] = None,
+    data_version: Optional[int] = None,
+    record: bool = True,
+    parallel: bool = True
+) -> dict:
+    """
+    Backtest every candidate model type on one series and pick the winner.
+    
+    Candidates are backtested concurrently; their folds share the backtest
+    process pool. XGBoost candidates are fit with the parameters tuned for
+    the series' model, if any (see tuning.py), as training would. A
+    candidate that cannot be fit (e.g. too little data for XGBoost) is left
+    out; the others are scored on the folds all of them completed.
+    
+    Args:
+        session: Database session (may be None when history and
+            data_version are given)
+        business_id: Business ID
+        metric_name: Metric name
+        horizon: Days forecast from every backtest cutoff
+        history: Already loaded 'date'/'value' frame; skips the query
+        data_version: Series data version, if already known
+        record: Store the selection in the model registry
+        parallel: Run folds on the backtest pool (False runs them in this
+            process, e.g. inside a worker)
+    
+    Returns:
+        Selection record: model_type (the winner), scores (MAE by model
+        type over the common folds), errors (why candidates were left
+        out), horizon, folds, folds_scored, data_version and decided_at
+    
+    Raises:
+        ValueError: if no candidate could be backtested, or no fold was
+            completed by all of them
+    """
+    if history is None:
+        history = load_timeseries_data(session, business_id, metric_name)
+    if data_version is None and session is not None:
+        data_version = load_series_version(session, business_id, metric_name)
+    
+    def backtest(model_type: str):
+        # Only XGBoost models have tuned parameters (see tuning.py)
+        tuned = registry.tuned_params(model_type, business_id, metric_name)
+        try:
+            result = run_backtest(
+                None, business_id, metric_name, model_type, horizon, BACKTEST_FOLDS,
+                history=history, data_version=data_version, parallel=parallel,
+                params=tuned["params"] if tuned else None
+            )
+            return model_type, result, None
+        except Exception as e:
+            return model_type, None, str(e)
+    
+    candidates = candidate_model_types()
+    with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+        outcomes = list(executor.map(backtest, candidates))
+    
+    results = {model_type: result for model_type, result, _ in outcomes if result is not None}
+    errors = {model_type: error for model_type, _, error in outcomes if error is not None}
+    if not results:
+        raise ValueError(
+            f"No model could be backtested for business_id={business_id}, metric={metric_name}: "
+            + "; ".join(f"{model_type}: {error}" for model_type, error in errors.items())
+        )
+    scores, folds_scored = _common_fold_scores(results)
+    
+    selection = {
+        "business_id": business_id,
+        "metric_name": metric_name,
+        "model_type": min(scores, key=scores.get),
+        "scores": scores,
+        "errors": errors,
+        "horizon": horizon,
+        "folds": BACKTEST_FOLDS,
+        "folds_scored": folds_scored,
+        "data_version": data_version,
+        "decided_at": datetime.utcnow().isoformat(),
+    }
+    if record:
+        registry.record_selections([selection])
+    return selection
+
+
+def current_selection(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    horizon: int = TOURNAMENT_HORIZON
+) -> Optional[dict]:
+    """The recorded selection of a series, if it was decided on its current data at this horizon."""
+    selection = registry.selection(business_id, metric_name)
+    if selection is None or selection.get("horizon") != horizon:
+        return None
+    if selection.get("data_version") != load_series_version(session, business_id, metric_name):
+        return None
+    return selection
+
+
+def run_tournaments(
+    session: Session,
+    series: Optional[List[Tuple[int, str]]] = None,
+    horizon: int = TOURNAMENT_HORIZON,
+    force: bool = False
+) -> Dict[str, int]:
+    """
+    Run tournaments for every stored series whose data changed.
+    
+    A series is skipped when its recorded selection was computed at the
+    current data version and the same horizon. Series are loaded and
+    their selections written in batches of TOURNAMENT_BATCH_SIZE.
+    
+    Args:
+        session: Database session
+        series: (business_id, metric_name) pairs (default: every series)
+        horizon: Days forecast from every backtest cutoff
+        force: Re-run series whose selection is current too
+    
+    Returns:
+        Counts of series: total, skipped, decided and failed
+    """
+    if series is None:
+        series = [
+            (business_id, metric_name) for business_id, metric_name in
+            session.query(TimeseriesPoint.user_id, TimeseriesPoint.metric_name)
+            .group_by(TimeseriesPoint.user_id, TimeseriesPoint.metric_name).all()
+        ]
+    versions = load_series_versions(session, series)
+    
+    def is_current(key: Tuple[int, str]) -> bool:
+        selection = registry.selection(*key)
+        return (
+            selection is not None
+            and selection.get("data_version") == versions[key]
+            and selection.get("horizon") == horizon
+        )
+    
+    stale = [key for key in series if force or not is_current(key)]
+    counts = {"series": len(series), "skipped": len(series) - len(stale), "decided": 0, "failed": 0}
+    
+    for start in range(0, len(stale), TOURNAMENT_BATCH_SIZE):
+        batch = stale[start:start + TOURNAMENT_BATCH_SIZE]
+        histories = load_timeseries_batch(session, batch)
+        
+        def play(key: Tuple[int, str]) -> Optional[dict]:
+            try:
+                return run_tournament(
+                    None, *key, horizon=horizon, history=histories[key], data_version=versions[key], record=False
+                )
+            except Exception as e:
+                print(f"Tournament failed for business {key[0]}, metric {key[1]}: {e}")
+                return None
+        
+        # A few series at once keep the backtest pool busy between candidates
+        with ThreadPoolExecutor(max_workers=max(BACKTEST_POOL_WORKERS, 1)) as executor:
+            selections = list(executor.map(play, [key for key in batch if key in histories]))
+        
+        decided = [selection for selection in selections if selection is not None]
+        registry.record_selections(decided)
+        counts["decided"] += len(decided)
+        counts["failed"] += len(batch) - len(decided)
+    
+    return counts
+
+
+if __name__ == "__main__":
+    from app.db.database import SessionLocal
+    
+    with SessionLocal() as db:
+        print(f"Tournaments: {run_tournaments(db)}")
@@ -0,0 +1,545 @@
+"""Asynchronous model training jobs.
+
+Training requests are recorded in the ``training_jobs`` table and executed
+on a dedicated process pool, so API workers never fit models inline.
+Backtests, model tournaments and hyperparameter searches are queued the
+same way as jobs of their own kind. Clients poll ``GET /ml/jobs/{id}``
+for the outcome.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from app.models.models import TrainingJob
+from .backtest import resolve_backtest_model_type, run_backtest
+from .config import BACKTEST_FOLDS, TOURNAMENT_HORIZON, TRAINING_JOB_LEASE_SECONDS, TRAINING_POOL_WORKERS
+from .config import TUNING_HORIZON, TUNING_SERIES_SECONDS
+from .forecast_service import ForecastService, model_series, resolve_training_model_type, series_length
+from .tournament import run_tournament
+from .tuning import check_tunable, tune_series
+
+# Jobs in these states still produce a model; new requests join them
+ACTIVE_STATUSES = ("pending", "running")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_training_pool() -> ProcessPoolExecutor:
+    """Return the shared training pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn, not fork: forking a process that runs server threads can
+            # copy locks in a held state into the child
+            _pool = ProcessPoolExecutor(
+                max_workers=TRAINING_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_training_pool(pool: Optional[ProcessPoolExecutor] = None) -> None:
+    """
+    Stop the training pool; pending jobs are picked up on next start.
+    
+    Args:
+        pool: Only stop the shared pool if it is still this one (a broken
+            pool is discarded once, not its replacement)
+    """
+    global _pool
+    with _pool_lock:
+        if pool is not None and _pool is not pool:
+            return
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def enqueue_training(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    model_type: str = "auto",
+    horizon: int = 30,
+    incremental: bool = False
+) -> TrainingJob:
+    """
+    Record a training job and hand it to the training pool.
+    
+    If the same series and model type already has a job that serves the
+    request, that job is returned instead of queueing another one. A pending
+    job is widened to cover the request first: a full retrain supersedes an
+    incremental update, and the longer horizon wins. A running job is
+    returned when it covers the request; otherwise a follow-up job is queued
+    behind it and starts once it finished. A partial unique index allows one
+    pending and one running job per model across processes. Jobs running
+    for longer than TRAINING_JOB_LEASE_SECONDS are failed first (see
+    fail_stale_jobs).
+    
+    Args:
+        session: Database session
+        business_id: Business ID
+        metric_name: Metric name
+        model_type: 'xgboost', 'xgboost_direct', 'xgboost_global', 'prophet',
+            'ets' or 'auto'; the global model is queued under
+            GLOBAL_MODEL_SERIES whatever series is given
+        horizon: Forecast horizon the model must serve
+        incremental: Update the current model with newly appended data
+            instead of retraining from scratch (see update_xgboost_model)
+    
+    Returns:
+        The new or already active TrainingJob
+    
+    Raises:
+        ValueError: if the model type is unknown or not installed
+    """
+    n_points = series_length(session, business_id, metric_name) if model_type == "auto" else None
+    model_type = resolve_training_model_type(model_type, n_points)
+    business_id, metric_name = model_series(model_type, business_id, metric_name)
+    
+    # A job that lost its worker must not hold the model's active slot
+    fail_stale_jobs(session, kind="train", business_id=business_id, metric_name=metric_name, model_type=model_type)
+    active = _join_active_job(session, business_id, metric_name, model_type, horizon, incremental)
+    if active is not None:
+        return active
+    
+    # The first job for the model, or a follow-up to a running job that
+    # does not cover the request
+    job = TrainingJob(
+        business_id=business_id,
+        metric_name=metric_name,
+        model_type=model_type,
+        horizon=horizon,
+        incremental=incremental,
+        status="pending"
+    )
+    session.add(job)
+    try:
+        session.commit()
+    except IntegrityError:
+        # Another request queued the same model in the meantime
+        session.rollback()
+        active = _join_active_job(session, business_id, metric_name, model_type, horizon, incremental)
+        if active is None:
+            raise
+        return active
+    session.refresh(job)
+    
+    # Waits for a running job of the same model (see run_training_job)
+    submit_training_job(job.id)
+    return job
+
+
+def _active_job(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    model_type: str,
+    status: str
+) -> Optional[TrainingJob]:
+    """The training job for a model in the given active status, if any."""
+    return (
+        session.query(TrainingJob)
+        .filter(
+            TrainingJob.kind == "train",
+            TrainingJob.business_id == business_id,
+            TrainingJob.metric_name == metric_name,
+            TrainingJob.model_type == model_type,
+            TrainingJob.status == status
+        )
+        .first()
+    )
+
+
+def _covers(job: TrainingJob, horizon: int, incremental: bool) -> bool:
+    """Whether a job's model serves a request for this horizon and mode."""
+    return job.horizon >= horizon and (incremental or not job.incremental)
+
+
+def _join_active_job(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    model_type: str,
+    horizon: int,
+    incremental: bool
+) -> Optional[TrainingJob]:
+    """
+    The active job that serves a request, if any: the pending job, widened
+    to cover it, or else a running job that already covers it.
+    """
+    pending = _active_job(session, business_id, metric_name, model_type, "pending")
+    if pending is not None and _widen_pending(session, pending, horizon, incremental):
+        return pending
+    running = _active_job(session, business_id, metric_name, model_type, "running")
+    if running is not None and _covers(running, horizon, incremental):
+        return running
+    return None
+
+
+def _widen_pending(session: Session, job: TrainingJob, horizon: int, incremental: bool) -> bool:
+    """
+    Widen a pending job so it also serves a new request for the same model.
+    
+    The update only applies while the job is still pending (a worker may
+    claim it concurrently).
+    
+    Returns:
+        False if a worker claimed the job before it could be widened
+    """
+    if _covers(job, horizon, incremental):
+        return True
+    
+    updated = (
+        session.query(TrainingJob)
+        .filter(TrainingJob.id == job.id, TrainingJob.status == "pending")
+        .update({
+            "horizon": max(job.horizon, horizon),
+            "incremental": job.incremental and incremental,
+        }, synchronize_session=False)
+    )
+    session.commit()
+    session.refresh(job)
+    return bool(updated)
+
+
+def enqueue_backtest(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    model_type: str = "auto",
+    horizon: int = 30,
+    folds: int = BACKTEST_FOLDS
+) -> TrainingJob:
+    """
+    Record a rolling-origin backtest job (see run_backtest) and hand it to
+    the training pool; the BacktestResult becomes the job result.
+    
+    An active backtest with the same arguments is returned instead of
+    queueing another one.
+    
+    Args:
+        session: Database session
+        business_id: Business ID
+        metric_name: Metric name
+        model_type: Any model type except 'xgboost_global'; 'auto' is
+            resolved to the model 'auto' would train for the series now
+        horizon: Days forecast from every cutoff
+        folds: Number of cutoffs
+    
+    Returns:
+        The new or already active TrainingJob
+    
+    Raises:
+        ValueError: if the model type cannot be backtested
+    """
+    n_points = series_length(session, business_id, metric_name) if model_type == "auto" else None
+    model_type = resolve_backtest_model_type(model_type, n_points)
+    return _enqueue_analysis(session, "backtest", business_id, metric_name, model_type, horizon, {"folds": folds})
+
+
+def enqueue_tournament(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    horizon: int = TOURNAMENT_HORIZON
+) -> TrainingJob:
+    """
+    Record a model tournament job for one series (see run_tournament); the
+    selection becomes the job result. The job's model type is 'auto', the
+    model type the selection decides.
+    
+    An active tournament for the same series and horizon is returned
+    instead of queueing another one.
+    """
+    return _enqueue_analysis(session, "tournament", business_id, metric_name, "auto", horizon, None)
+
+
+def enqueue_tuning(
+    session: Session,
+    business_id: int,
+    metric_name: str,
+    model_type: str = "xgboost",
+    horizon: int = TUNING_HORIZON,
+    budget_seconds: float = TUNING_SERIES_SECONDS
+) -> TrainingJob:
+    """
+    Record a hyperparameter search job for one series' model (see
+    tune_series); the tuning record becomes the job result.
+    
+    An active search with the same arguments is returned instead of
+    queueing another one.
+    
+    Raises:
+        ValueError: if the model type cannot be tuned
+        ImportError: if XGBoost is not installed
+    """
+    check_tunable(model_type)
+    return _enqueue_analysis(
+        session, "tune", business_id, metric_name, model_type, horizon, {"budget_seconds": budget_seconds}
+    )
+
+
+def _enqueue_analysis(
+    session: Session,
+    kind: str,
+    business_id: int,
+    metric_name: str,
+    model_type: str,
+    horizon: int,
+    params: Optional[dict]
+) -> TrainingJob:
+    """Record a job of an analysis kind, unless an identical one is active."""
+    active = (
+        session.query(TrainingJob)
+        .filter(
+            TrainingJob.kind == kind,
+            TrainingJob.business_id == business_id,
+            TrainingJob.metric_name == metric_name,
+            TrainingJob.model_type == model_type,
+            TrainingJob.horizon == horizon,
+            TrainingJob.status.in_(ACTIVE_STATUSES)
+        )
+        .order_by(TrainingJob.id)
+        .all()
+    )
+    for job in active:
+        if job.params == params:
+            return job
+    
+    job = TrainingJob(
+        business_id=business_id,
+        metric_name=metric_name,
+        model_type=model_type,
+        horizon=horizon,
+        kind=kind,
+        params=params,
+        status="pending"
+    )
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    submit_training_job(job.id)
+    return job
+
+
+def submit_training_job(job_id: int) -> None:
+    """Schedule a recorded job on the training pool."""
+    pool = get_training_pool()
+    future = pool.submit(run_training_job, job_id)
+    future.add_done_callback(lambda f: _report_pool_failure(job_id, pool, f))
+    future.add_done_callback(lambda f: _submit_follow_up_job(job_id, f))
+
+
+def _report_pool_failure(job_id: int, pool: ProcessPoolExecutor, future: Future) -> None:
+    """
+    Settle jobs that never reached their own error handling.
+    
+    When a worker dies (out of memory, killed) the pool is broken: it is
+    discarded, the job the worker was running is marked failed, and jobs
+    that were still waiting for a worker are submitted to a fresh pool.
+    Cancelled futures (pool shutdown) stay pending for requeue_pending_jobs.
+    """
+    if future.cancelled() or future.exception() is None:
+        return
+    error = future.exception()
+    print(f"Training job {job_id} crashed: {error}")
+    if isinstance(error, BrokenProcessPool):
+        shutdown_training_pool(pool)
+    
+    from app.db.database import SessionLocal
+    
+    try:
+        with SessionLocal() as session:
+            job = session.get(TrainingJob, job_id)
+            if job is None or job.status not in ACTIVE_STATUSES:
+                return
+            if job.status == "pending" and isinstance(error, BrokenProcessPool):
+                # Never started: another job's worker took the pool down
+                submit_training_job(job_id)
+                return
+            job.status = "failed"
+            job.error_message = f"Training worker stopped before finishing: {error}"
+            job.completed_at = datetime.utcnow()
+            session.commit()
+    except Exception as e:
+        print(f"Could not record the failure of training job {job_id}: {e}")
+
+
+def _submit_follow_up_job(job_id: int, future: Future) -> None:
+    """Submit the job queued behind a finished one for the same model."""
+    if future.cancelled():
+        return
+    
+    from app.db.database import SessionLocal
+    
+    try:
+        with SessionLocal() as session:
+            job = session.get(TrainingJob, job_id)
+            if job is None or job.kind != "train" or job.status in ACTIVE_STATUSES:
+                return
+            follow_up = _active_job(session, job.business_id, job.metric_name, job.model_type, "pending")
+            if follow_up is not None:
+                submit_training_job(follow_up.id)
+    except Exception as e:
+        print(f"Could not submit the job queued behind training job {job_id}: {e}")
+
+
+def _run_backtest_job(session: Session, job: TrainingJob) -> dict:
+    """Result of a backtest job: the BacktestResult as JSON."""
+    # Folds are fit one after the other: a pool inside the worker would
+    # outlive it and take cores beyond TRAINING_POOL_WORKERS
+    result = run_backtest(
+        session, job.business_id, job.metric_name, job.model_type, job.horizon, job.params["folds"],
+        parallel=False
+    )
+    return result.model_dump(mode="json")
+
+
+def _run_tournament_job(session: Session, job: TrainingJob) -> dict:
+    """Result of a tournament job: the recorded selection."""
+    return run_tournament(session, job.business_id, job.metric_name, job.horizon, parallel=False)
+
+
+def _run_tune_job(session: Session, job: TrainingJob) -> dict:
+    """Result of a tuning job: the recorded tuning result."""
+    # The search's own pool is shut down before it returns, so it does
+    # not outlive the worker
+    return tune_series(
+        session, job.business_id, job.metric_name, job.model_type, job.horizon, job.params["budget_seconds"]
+    )
+
+
+# Job kinds besides 'train': {kind: function(session, job) returning the job result}
+ANALYSES: Dict[str, Callable[[Session, TrainingJob], dict]] = {
+    "backtest": _run_backtest_job,
+    "tournament": _run_tournament_job,
+    "tune": _run_tune_job,
+}
+
+
+def run_training_job(job_id: int) -> None:
+    """
+    Execute one training job (or analysis job, see ANALYSES). Runs inside
+    a training worker process.
+    
+    The job is claimed with a conditional update, so a job submitted twice
+    (e.g. re-queued at startup) is only run once. A training job queued
+    behind a running one for the same model stays pending; it is submitted
+    again when that one finishes.
+    
+    Args:
+        job_id: ID of a pending TrainingJob
+    """
+    from app.db.database import SessionLocal
+    
+    session = SessionLocal()
+    try:
+        job = session.get(TrainingJob, job_id)
+        if job is None:
+            return
+        claim = session.query(TrainingJob).filter(TrainingJob.id == job_id, TrainingJob.status == "pending")
+        if job.kind == "train":
+            other = aliased(TrainingJob)
+            claim = claim.filter(~session.query(other.id).filter(
+                other.kind == "train",
+                other.business_id == job.business_id,
+                other.metric_name == job.metric_name,
+                other.model_type == job.model_type,
+                other.status == "running"
+            ).exists())
+        try:
+            claimed = claim.update(
+                {"status": "running", "started_at": datetime.utcnow()}, synchronize_session=False
+            )
+            session.commit()
+        except IntegrityError:
+            # Another worker claimed a job of the same model first
+            session.rollback()
+            claimed = 0
+        if not claimed:
+            return
+        
+        job = session.get(TrainingJob, job_id)
+        try:
+            if job.kind in ANALYSES:
+                print(f"Running {job.kind} of {job.model_type} for business {job.business_id}, metric {job.metric_name}...")
+                job.result = ANALYSES[job.kind](session, job)
+                job.status = "completed"
+                print(f"{job.kind.capitalize()} job {job_id} complete.")
+            else:
+                print(f"Training {job.model_type} model for business {job.business_id}, metric {job.metric_name}...")
+                result = ForecastService.train_model(
+                    session, job.business_id, job.metric_name, job.model_type, job.horizon, job.incremental
+                )
+                job.status = "completed"
+                job.result = {"model_path": result["model_path"], "metrics": result["metrics"]}
+                print(f"Training job {job_id} complete. Metrics: {result['metrics']}")
+        except Exception as e:
+            session.rollback()
+            job = session.get(TrainingJob, job_id)
+            job.status = "failed"
+            job.error_message = str(e)
+            print(f"Training job {job_id} failed: {e}")
+        
+        job.completed_at = datetime.utcnow()
+        session.commit()
+    finally:
+        session.close()
+
+
+def fail_stale_jobs(session: Session, **series) -> int:
+    """
+    Mark jobs running for longer than TRAINING_JOB_LEASE_SECONDS as failed.
+    
+    Such jobs lost their worker (the API process was killed, or its pool
+    broke before the failure could be recorded); without this they would
+    hold their model's active-job slot forever.
+    
+    Args:
+        session: Database session; committed if any job was failed
+        **series: Optional business_id, metric_name and model_type filters
+    
+    Returns:
+        Number of jobs marked failed
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=TRAINING_JOB_LEASE_SECONDS)
+    query = session.query(TrainingJob).filter(TrainingJob.status == "running", TrainingJob.started_at < cutoff)
+    for column, value in series.items():
+        query = query.filter(getattr(TrainingJob, column) == value)
+    failed = query.update({
+        "status": "failed",
+        "error_message": "Training worker stopped before finishing (job lease expired)",
+        "completed_at": datetime.utcnow(),
+    }, synchronize_session=False)
+    if failed:
+        session.commit()
+    return failed
+
+
+def requeue_pending_jobs(session: Session) -> int:
+    """
+    Submit jobs left pending by a previous process (call at startup), after
+    failing jobs whose worker has gone (see fail_stale_jobs).
+    
+    Returns:
+        Number of jobs submitted
+    """
+    stale = fail_stale_jobs(session)
+    if stale:
+        print(f"Failed {stale} training jobs whose worker stopped")
+    job_ids = [
+        job_id for (job_id,) in
+        session.query(TrainingJob.id).filter(TrainingJob.status == "pending").order_by(TrainingJob.id)
+    ]
+    for job_id in job_ids:
+        submit_training_job(job_id)
+    return len(job_ids)
@@ -0,0 +1,423 @@
+"""Hyperparameter search for the XGBoost forecast models.
+
+Trials are parameter sets sampled from TUNING_SEARCH_SPACE, scored on
+rolling-origin folds (see backtest.fold_cutoffs), so a trial is only ever
+judged on days after its training data. The search is successive halving:
+every trial is fit on the latest fold, the best 1/TUNING_REDUCTION_FACTOR
+of them on the next earlier fold too, and so on; a trial's score is its
+mean scaled error over the folds it reached. XGBOOST_CONFIG always takes
+part as the first trial, so tuned parameters never score worse than the
+defaults on the folds they were compared on.
+
+Fits run on a process pool of TUNING_POOL_WORKERS processes with one
+thread each, which bounds the CPU a search uses. A search stops at its
+deadline and keeps the best trial of the deepest rung it completed; trials
+still running check the deadline every boosting round and give up, so
+they do not hold the pool past it. A fleet run splits its time window
+over the series (or metric clusters) it still has to tune, so one slow
+series cannot starve the rest.
+
+The results are stored in the model registry and picked up by the next
+training run of each model (see models_xgboost.xgboost_params).
+
+Tune the fleet within TUNING_WINDOW_SECONDS with:
+    cd backend && python -m app.services.ml.tuning
+"""
+
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.models.models import TimeseriesPoint
+from app.services.timeseries_store import normalize_metric_name
+from .backtest import fold_cutoffs
+from .config import TUNING_SEARCH_SPACE, TUNING_TRIALS, TUNING_FOLDS, TUNING_REDUCTION_FACTOR, TUNING_HORIZON
+from .config import TUNING_POOL_WORKERS, TUNING_WINDOW_SECONDS, TUNING_SERIES_SECONDS
+from .config import TUNING_CLUSTER_BY_METRIC, TUNING_CLUSTER_SAMPLE, TUNING_REFRESH_DAYS, INFERENCE_LOOKBACK
+from .preprocessing import load_timeseries_data, load_timeseries_batch, clean_timeseries_data
+from .registry import registry
+
+# Optional model imports - catch any error (ImportError, XGBoostError, etc.)
+try:
+    import xgboost as xgb
+    from .models_xgboost import fit_predict_xgboost, fit_predict_xgboost_direct
+    TUNABLE = {"xgboost": fit_predict_xgboost, "xgboost_direct": fit_predict_xgboost_direct}
+    
+    class _StopAtDeadline(xgb.callback.TrainingCallback):
+        """Abort a trial's fit once the search deadline passed (checked every boosting round)."""
+        
+        def __init__(self, deadline: float):
+            super().__init__()
+            self.deadline = deadline
+        
+        def after_iteration(self, model, epoch, evals_log) -> bool:
+            if time.time() > self.deadline:
+                raise TimeoutError("Tuning deadline passed")
+            return False
+except Exception:
+    TUNABLE = {}
+
+# (train, actual) per series of one fold; actual is indexed by forecast date
+Fold = List[Tuple[pd.DataFrame, pd.Series]]
+
+
+def sample_params(rng: np.random.Generator, space: dict = TUNING_SEARCH_SPACE) -> dict:
+    """Draw one parameter set from the search space."""
+    params = {}
+    for name, (low, high, scale) in space.items():
+        if scale == "int":
+            params[name] = int(rng.integers(low, high + 1))
+        elif scale == "log":
+            params[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        else:
+            params[name] = float(rng.uniform(low, high))
+    return params
+
+
+def check_tunable(model_type: str) -> None:
+    """
+    Raises:
+        ValueError: if the model type cannot be tuned
+        ImportError: if XGBoost is not installed
+    """
+    if model_type not in ("xgboost", "xgboost_direct"):
+        raise ValueError(f"Hyperparameter tuning is not supported for model type '{model_type}'.")
+    if model_type not in TUNABLE:
+        raise ImportError("XGBoost not available")
+
+
+def _score_trial(
+    model_type: str,
+    params: dict,
+    fold: Fold,
+    horizon: int,
+    deadline: Optional[float] = None
+) -> float:
+    """
+    Mean scaled MAE of one parameter set on one fold of every series
+    (runs in a worker process).
+    
+    Errors are divided by the series' mean absolute level, so series of
+    different magnitudes weigh the same in a cluster.
+    
+    Raises:
+        TimeoutError: once time.time() passes ``deadline``, mid-fit included
+    """
+    fit_params = {**params, "n_jobs": 1}
+    if deadline is not None:
+        fit_params["callbacks"] = [_StopAtDeadline(deadline)]
+    errors = []
+    for train, actual in fold:
+        if deadline is not None and time.time() > deadline:
+            raise TimeoutError("Tuning deadline passed")
+        try:
+            predicted = TUNABLE[model_type](train, horizon, fit_params)
+        except ValueError:
+            continue
+        error = np.abs(np.asarray(predicted, dtype=float) - actual.to_numpy(dtype=float))
+        if np.isfinite(error).any():
+            errors.append(np.nanmean(error) / (np.abs(train['value']).mean() or 1.0))
+    if not errors:
+        raise ValueError("no series of the fold could be fit")
+    return float(np.mean(errors))
+
+
+def build_folds(histories: List[pd.DataFrame], horizon: int, folds: int = TUNING_FOLDS) -> List[Fold]:
+    """
+    Split series into rolling-origin folds, latest first.
+    
+    A series is left out of folds whose training part is shorter than
+    INFERENCE_LOOKBACK points.
+    
+    Raises:
+        ValueError: if no series is long enough for the latest fold
+    """
+    result: List[Fold] = [[] for _ in range(folds)]
+    for history in histories:
+        df = clean_timeseries_data(history)
+        observed = df.set_index('date')['value']
+        for k, cutoff in enumerate(fold_cutoffs(df['date'].max(), horizon, folds, horizon)):
+            train = df[df['date'] <= cutoff]
+            if len(train) >= INFERENCE_LOOKBACK:
+                dates = pd.date_range(cutoff + timedelta(days=1), periods=horizon, freq='D')
+                result[k].append((train, observed.reindex(dates)))
+    if not result[0]:
+        raise ValueError(
+            f"Too little history to tune: need {INFERENCE_LOOKBACK} points before the last {horizon} days"
+        )
+    return [fold for fold in result if fold]
+
+
+def successive_halving(
+    pool: ProcessPoolExecutor,
+    model_type: str,
+    folds: List[Fold],
+    horizon: int,
+    trials: int = TUNING_TRIALS,
+    deadline: Optional[float] = None,
+    seed: int = 0
+) -> dict:
+    """
+    Search parameters for one series or cluster.
+    
+    Args:
+        pool: Process pool the trials run on
+        model_type: 'xgboost' or 'xgboost_direct'
+        folds: Rolling-origin folds, latest first (see build_folds)
+        horizon: Days forecast from every cutoff
+        trials: Parameter sets tried, XGBOOST_CONFIG included
+        deadline: time.time() value after which no rung is started and
+            the running one is abandoned; its running trials stop too
+        seed: Seed of the parameter sampler
+    
+    Returns:
+        Search result: params (overrides of XGBOOST_CONFIG, empty when the
+        defaults won), score and default_score (mean scaled MAE), trials
+        (sets scored), rungs (completed) and timed_out
+    
+    Raises:
+        ValueError: if no trial could be scored
+        TimeoutError: if the deadline passed before the first rung completed
+    """
+    rng = np.random.default_rng(seed)
+    candidates = [{}] + [sample_params(rng) for _ in range(trials - 1)]
+    scores: Dict[int, List[float]] = {i: [] for i in range(len(candidates))}
+    survivors = list(scores)
+    completed = []
+    timed_out = False
+    
+    for fold in folds:
+        remaining = None if deadline is None else deadline - time.time()
+        if remaining is not None and remaining <= 0:
+            timed_out = True
+            break
+        
+        futures = {
+            pool.submit(_score_trial, model_type, candidates[i], fold, horizon, deadline): i for i in survivors
+        }
+        done, pending = wait(futures, timeout=remaining)
+        if pending:
+            # A partly scored rung would compare trials on different folds.
+            # Running trials are past the deadline and stop within a
+            # boosting round; waiting for them frees the pool for the caller.
+            for future in pending:
+                future.cancel()
+            wait(pending)
+            timed_out = True
+            break
+        
+        rung = []
+        for future in done:
+            i = futures[future]
+            try:
+                scores[i].append(future.result())
+                rung.append(i)
+            except Exception:
+                # Invalid parameters for this data: the trial is out
+                pass
+        if not rung:
+            break
+        
+        rung.sort(key=lambda i: np.mean(scores[i]))
+        completed = rung
+        survivors = rung[:max(1, math.ceil(len(rung) / TUNING_REDUCTION_FACTOR))]
+        if len(survivors) == 1:
+            break
+    
+    if not completed:
+        if timed_out:
+            raise TimeoutError("Tuning deadline passed before any trial was scored")
+        raise ValueError("No tuning trial could be scored")
+    
+    best = completed[0]
+    return {
+        "params": candidates[best],
+        "score": float(np.mean(scores[best])),
+        "default_score": float(np.mean(scores[0])) if scores[0] else None,
+        "trials": sum(1 for i in scores if scores[i]),
+        "rungs": len(scores[best]),
+        "timed_out": timed_out,
+    }
+
+
+def _tuning_pool(workers: int = TUNING_POOL_WORKERS) -> ProcessPoolExecutor:
+    """Worker pool of one tuning run (spawned: the API runs server threads)."""
+    return ProcessPoolExecutor(max_workers=max(workers, 1), mp_context=multiprocessing.get_context("spawn"))
+
+
+def _tuning_records(
+    model_type: str,
+    series: List[Tuple[int, str]],
+    result: dict,
+    horizon: int,
+    cluster: Optional[str] = None
+) -> List[dict]:
+    tuned_at = datetime.utcnow().isoformat()
+    return [
+        {
+            **result,
+            "model_type": model_type,
+            "business_id": business_id,
+            "metric_name": metric_name,
+            "horizon": horizon,
+            "cluster": cluster,
+            "tuned_at": tuned_at,
+        }
+        for business_id, metric_name in series
+    ]
+
+
+def tune_series(
+    session: Optional[Session],
+    business_id: int,
+    metric_name: str,
+    model_type: str = "xgboost",
+    horizon: int = TUNING_HORIZON,
+    budget_seconds: float = TUNING_SERIES_SECONDS,
+    history: Optional[pd.DataFrame] = None,
+    record: bool = True
+) -> dict:
+    """
+    Tune the parameters of one series' model.
+    
+    Args:
+        session: Database session (may be None when history is given)
+        business_id: Business ID
+        metric_name: Metric name
+        model_type: 'xgboost' or 'xgboost_direct'
+        horizon: Days forecast from every fold cutoff
+        budget_seconds: Wall-clock limit of the search
+        history: Already loaded 'date'/'value' frame; skips the query
+        record: Store the result in the model registry
+    
+    Returns:
+        Tuning record (see successive_halving) with the series and tuned_at
+    
+    Raises:
+        ValueError: if the model type cannot be tuned or the series is too short
+        TimeoutError: if the budget ran out before the first rung completed
+        ImportError: if XGBoost is not installed
+    """
+    check_tunable(model_type)
+    deadline = time.time() + budget_seconds
+    
+    if history is None:
+        history = load_timeseries_data(session, business_id, metric_name)
+    folds = build_folds([history], horizon)
+    
+    pool = _tuning_pool()
+    try:
+        result = successive_halving(pool, model_type, folds, horizon, deadline=deadline)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    
+    (record_,) = _tuning_records(model_type, [(business_id, metric_name)], result, horizon)
+    if record:
+        registry.record_tuned_params([record_])
+    return record_
+
+
+def tune_fleet(
+    session: Session,
+    model_type: str = "xgboost",
+    horizon: int = TUNING_HORIZON,
+    budget_seconds: float = TUNING_WINDOW_SECONDS,
+    cluster_by_metric: bool = TUNING_CLUSTER_BY_METRIC,
+    force: bool = False
+) -> Dict[str, int]:
+    """
+    Tune every stored series within a fixed time window.
+    
+    Series whose parameters were tuned in the last TUNING_REFRESH_DAYS are
+    skipped. With ``cluster_by_metric`` the series of each metric share one
+    search, scored on up to TUNING_CLUSTER_SAMPLE of them, and its result
+    is recorded for all of them. Each search gets an equal share of the
+    time left, so time saved by a fast one goes to the ones after it;
+    searches not started when the window closes are counted as skipped.
+    
+    Args:
+        session: Database session
+        model_type: 'xgboost' or 'xgboost_direct'
+        horizon: Days forecast from every fold cutoff
+        budget_seconds: Wall-clock limit of the whole run
+        cluster_by_metric: One search per metric instead of per series
+        force: Re-tune series with recent parameters too
+    
+    Returns:
+        Counts: series, skipped (recently tuned), searches, tuned (series
+        with a recorded result), failed and out_of_time (series not
+        reached, or whose search did not finish a rung in its share)
+    """
+    check_tunable(model_type)
+    end = time.time() + budget_seconds
+    
+    series = [
+        (business_id, metric_name) for business_id, metric_name in
+        session.query(TimeseriesPoint.user_id, TimeseriesPoint.metric_name)
+        .group_by(TimeseriesPoint.user_id, TimeseriesPoint.metric_name).all()
+    ]
+    refresh_before = (datetime.utcnow() - timedelta(days=TUNING_REFRESH_DAYS)).isoformat()
+    
+    def is_current(key: Tuple[int, str]) -> bool:
+        tuned = registry.tuned_params(model_type, *key)
+        return tuned is not None and tuned.get("horizon") == horizon and tuned.get("tuned_at", "") >= refresh_before
+    
+    stale = [key for key in series if force or not is_current(key)]
+    if cluster_by_metric:
+        clusters: Dict[str, List[Tuple[int, str]]] = {}
+        for key in stale:
+            clusters.setdefault(normalize_metric_name(key[1]), []).append(key)
+        groups = list(clusters.items())
+    else:
+        groups = [(None, [key]) for key in stale]
+    
+    counts = {"series": len(series), "skipped": len(series) - len(stale), "searches": 0,
+              "tuned": 0, "failed": 0, "out_of_time": 0}
+    rng = np.random.default_rng(0)
+    pool = _tuning_pool()
+    try:
+        for i, (cluster, members) in enumerate(groups):
+            remaining = end - time.time()
+            if remaining <= 0:
+                counts["out_of_time"] += sum(len(m) for _, m in groups[i:])
+                break
+            
+            sample = members
+            if len(members) > TUNING_CLUSTER_SAMPLE:
+                sample = [members[j] for j in rng.choice(len(members), TUNING_CLUSTER_SAMPLE, replace=False)]
+            try:
+                histories = load_timeseries_batch(session, sample)
+                folds = build_folds([histories[key] for key in sample if key in histories], horizon)
+                result = successive_halving(
+                    pool, model_type, folds, horizon,
+                    deadline=time.time() + remaining / (len(groups) - i), seed=i
+                )
+            except TimeoutError:
+                counts["out_of_time"] += len(members)
+                continue
+            except Exception as e:
+                print(f"Tuning failed for {cluster or members[0]}: {e}")
+                counts["failed"] += len(members)
+                continue
+            
+            registry.record_tuned_params(_tuning_records(model_type, members, result, horizon, cluster))
+            counts["searches"] += 1
+            counts["tuned"] += len(members)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    
+    return counts
+
+
+if __name__ == "__main__":
+    from app.db.database import SessionLocal
+    
+    with SessionLocal() as db:
+        print(f"Tuning: {tune_fleet(db)}")
@@ -0,0 +1,207 @@
+"""Materialized daily/weekly/monthly rollups of ``timeseries_points``.
+
+Rollups are recomputed at ingest time for the periods an upload touched, so
+readers (long-range charts, the rollups query API) get a few hundred
+pre-aggregated rows instead of scanning raw history.
+"""
+
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.orm import Session
+
+from app.models.models import TimeseriesPoint, TimeseriesRollup
+from app.services.timeseries_store import normalize_metric_name
+
+GRANULARITIES = ("daily", "weekly", "monthly")
+
+# Aggregates exposed by the query API, mapped to rollup columns
+AGGREGATES = {
+    "sum": "value_sum",
+    "mean": "value_mean",
+    "min": "value_min",
+    "max": "value_max",
+    "count": "value_count",
+}
+
+
+def period_start(dates: pd.Series, granularity: str) -> pd.Series:
+    """Start of the period containing each date (weeks start on Monday)."""
+    days = dates.dt.normalize()
+    if granularity == "daily":
+        return days
+    if granularity == "weekly":
+        return days - pd.to_timedelta(days.dt.dayofweek, unit="D")
+    if granularity == "monthly":
+        return days - pd.to_timedelta(days.dt.day - 1, unit="D")
+    raise ValueError(f"Unknown granularity: {granularity}. Use one of {', '.join(GRANULARITIES)}.")
+
+
+def _period_bounds(start: pd.Timestamp, end: pd.Timestamp, granularity: str) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """Expand [start, end] to whole periods; the returned end is exclusive."""
+    first = period_start(pd.Series([start]), granularity).iloc[0]
+    last = period_start(pd.Series([end]), granularity).iloc[0]
+    if granularity == "daily":
+        return first, last + pd.Timedelta(days=1)
+    if granularity == "weekly":
+        return first, last + pd.Timedelta(days=7)
+    return first, last + pd.offsets.MonthBegin(1)
+
+
+def _daily_aggregates(
+    session: Session,
+    user_id: int,
+    metric: str,
+    lower: pd.Timestamp,
+    upper: pd.Timestamp
+) -> pd.DataFrame:
+    """
+    Per-day sum/min/max/count of the points in [lower, upper), aggregated
+    by the database in one query.
+
+    Returns:
+        DataFrame with 'date' (day) and value_sum/min/max/count columns
+    """
+    day = func.date(TimeseriesPoint.date)
+    rows = session.execute(
+        select(
+            day,
+            func.sum(TimeseriesPoint.value),
+            func.min(TimeseriesPoint.value),
+            func.max(TimeseriesPoint.value),
+            func.count(TimeseriesPoint.value)
+        ).where(
+            TimeseriesPoint.user_id == user_id,
+            TimeseriesPoint.metric_name == metric,
+            TimeseriesPoint.date >= lower.to_pydatetime(),
+            TimeseriesPoint.date < upper.to_pydatetime()
+        ).group_by(day)
+    ).all()
+    daily = pd.DataFrame(rows, columns=["date", "value_sum", "value_min", "value_max", "value_count"])
+    daily["date"] = pd.to_datetime(daily["date"])
+    return daily.astype({"value_sum": float, "value_min": float, "value_max": float, "value_count": int})
+
+
+def roll_up(daily: pd.DataFrame, granularity: str) -> pd.DataFrame:
+    """
+    Combine per-day aggregates into one row per period.
+
+    Args:
+        daily: Output of _daily_aggregates
+        granularity: 'daily', 'weekly' or 'monthly'
+
+    Returns:
+        DataFrame with period_start and the value_* rollup columns
+    """
+    grouped = daily.assign(period_start=period_start(daily["date"], granularity)).groupby("period_start")
+    rollup = grouped.agg(
+        value_min=("value_min", "min"),
+        value_max=("value_max", "max"),
+        value_count=("value_count", "sum"),
+    )
+    # A period without any non-null value has no sum (NULL), not a sum of 0
+    rollup["value_sum"] = grouped["value_sum"].sum(min_count=1)
+    rollup = rollup.reset_index()
+    rollup["value_mean"] = (rollup["value_sum"] / rollup["value_count"]).where(rollup["value_count"] > 0)
+    return rollup[["period_start", *AGGREGATES.values()]]
+
+
+def refresh_rollups(
+    session: Session,
+    user_id: int,
+    metric_ranges: Dict[str, Tuple[datetime, datetime]]
+) -> int:
+    """
+    Recompute rollups for every period overlapping the given date ranges.
+
+    Call after writing points (uploads, connector syncs) inside the same
+    transaction. Each period is rebuilt from the stored points, so updated
+    values replace earlier aggregates instead of being added to them. The
+    points of a metric are aggregated per day by the database once; weekly
+    and monthly rollups are built from those daily aggregates.
+
+    Args:
+        session: Database session; the caller commits
+        user_id: Owner of the data
+        metric_ranges: {metric_name: (first_date, last_date)} that changed
+
+    Returns:
+        Number of rollup rows written
+    """
+    written = 0
+    now = datetime.utcnow()
+    for metric_name, (first_date, last_date) in metric_ranges.items():
+        metric = normalize_metric_name(metric_name)
+        bounds = {
+            granularity: _period_bounds(pd.Timestamp(first_date), pd.Timestamp(last_date), granularity)
+            for granularity in GRANULARITIES
+        }
+        # Whole weeks and whole months around the range, whichever reach further
+        daily = _daily_aggregates(
+            session, user_id, metric,
+            min(lower for lower, _ in bounds.values()), max(upper for _, upper in bounds.values())
+        )
+
+        for granularity, (lower, upper) in bounds.items():
+            session.execute(
+                delete(TimeseriesRollup).where(
+                    TimeseriesRollup.user_id == user_id,
+                    TimeseriesRollup.metric_name == metric,
+                    TimeseriesRollup.granularity == granularity,
+                    TimeseriesRollup.period_start >= lower.to_pydatetime(),
+                    TimeseriesRollup.period_start < upper.to_pydatetime()
+                )
+            )
+            in_range = daily[(daily["date"] >= lower) & (daily["date"] < upper)]
+            if in_range.empty:
+                continue
+
+            rollup = roll_up(in_range, granularity).astype(object)
+            rollup = rollup.where(pd.notna(rollup), None)
+            rollup["period_start"] = [ts.to_pydatetime() for ts in rollup["period_start"]]
+            rollup["user_id"] = user_id
+            rollup["metric_name"] = metric
+            rollup["granularity"] = granularity
+            rollup["updated_at"] = now
+
+            records = rollup.to_dict("records")
+            session.execute(insert(TimeseriesRollup), records)
+            written += len(records)
+
+    return written
+
+
+def load_rollups(
+    session: Session,
+    user_id: int,
+    metric_name: str,
+    granularity: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> pd.DataFrame:
+    """
+    Read materialized rollups for one metric.
+
+    Returns:
+        DataFrame with period_start and sum/mean/min/max/count columns,
+        sorted by period_start (empty if nothing is stored)
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}. Use one of {', '.join(GRANULARITIES)}.")
+
+    columns = [getattr(TimeseriesRollup, column) for column in AGGREGATES.values()]
+    stmt = select(TimeseriesRollup.period_start, *columns).where(
+        TimeseriesRollup.user_id == user_id,
+        TimeseriesRollup.metric_name == normalize_metric_name(metric_name),
+        TimeseriesRollup.granularity == granularity
+    )
+    if start_date is not None:
+        stmt = stmt.where(TimeseriesRollup.period_start >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(TimeseriesRollup.period_start <= end_date)
+
+    rows = session.execute(stmt.order_by(TimeseriesRollup.period_start)).all()
+    df = pd.DataFrame(rows, columns=["period_start", *AGGREGATES.keys()])
+    df["period_start"] = pd.to_datetime(df["period_start"])
+    return df
@@ -0,0 +1,201 @@
+"""Storage helpers for long-format time-series points (``timeseries_points``)."""
+
+import pandas as pd
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.db.bulk import bulk_upsert_points
+from app.models.models import SeriesChange, SeriesVersion
+
+
+def normalize_metric_name(metric_name: Any) -> str:
+    """Metric names are matched case-insensitively, so they are stored lower-cased."""
+    return str(metric_name).lower()
+
+
+def long_frame_to_points(
+    df_long: pd.DataFrame,
+    user_id: int,
+    business_data_id: int
+) -> pd.DataFrame:
+    """
+    Normalize a long-format frame into rows for ``timeseries_points``.
+
+    Args:
+        df_long: DataFrame with 'date', 'metric_name' and 'value' columns
+        user_id: Owner of the data
+        business_data_id: Dataset (upload) the rows belong to
+
+    Returns:
+        DataFrame with one column per ``TimeseriesPoint`` field
+    """
+    points = pd.DataFrame({
+        "user_id": user_id,
+        "business_data_id": business_data_id,
+        "metric_name": df_long["metric_name"].astype(str).str.lower(),
+        "date": pd.to_datetime(df_long["date"], errors="coerce"),
+        "value": pd.to_numeric(df_long["value"], errors="coerce"),
+    })
+
+    # Rows without a parseable date can never be forecast; NaN values are kept
+    # (as NULL) so cleaning can forward-fill them like before
+    return points.dropna(subset=["date"])
+
+
+def blob_to_long_frame(data: Any) -> pd.DataFrame:
+    """
+    Convert a legacy ``BusinessData.data`` JSON blob to long format.
+
+    Handles both the CSV-upload list format
+    ``[{"date": ..., "metric_name": ..., "value": ...}, ...]`` and the dict
+    format ``{"date": ..., "metrics": {...}}``.
+    """
+    if isinstance(data, list):
+        rows = [row for row in data if isinstance(row, dict) and "metric_name" in row]
+        if not rows:
+            return pd.DataFrame(columns=["date", "metric_name", "value"])
+        df = pd.DataFrame(rows)
+        if "value" not in df.columns:
+            df["value"] = 0
+        return df[["date", "metric_name", "value"]]
+
+    if isinstance(data, dict):
+        metrics = data.get("metrics") or {}
+        return pd.DataFrame({
+            "date": data.get("date"),
+            "metric_name": list(metrics.keys()),
+            "value": list(metrics.values()),
+        })
+
+    return pd.DataFrame(columns=["date", "metric_name", "value"])
+
+
+def upsert_points(session: Session, points: pd.DataFrame) -> int:
+    """
+    Upsert normalized points through the bulk write path. The caller owns
+    the transaction.
+
+    Returns:
+        Number of rows inserted or changed
+    """
+    return bulk_upsert_points(session, points).written
+
+
+def bump_series_versions(
+    session: Session,
+    user_id: int,
+    metric_ranges: Dict[str, Tuple[datetime, datetime]]
+) -> None:
+    """
+    Increment the data version of each metric after its points changed, and
+    record the earliest date written (see load_changed_from). The caller
+    owns the transaction.
+
+    Args:
+        session: Database session
+        user_id: Owner of the data
+        metric_ranges: {metric_name: (first_date, last_date)} of the points written
+    """
+    first_dates: Dict[str, datetime] = {}
+    for metric, (first_date, _) in metric_ranges.items():
+        metric = normalize_metric_name(metric)
+        first_date = pd.Timestamp(first_date).to_pydatetime()
+        first_dates[metric] = min(first_date, first_dates.get(metric, first_date))
+    if not first_dates:
+        return
+
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    now = datetime.utcnow()
+    stmt = insert(SeriesVersion).values([
+        {"user_id": user_id, "metric_name": metric, "version": 1, "updated_at": now}
+        for metric in sorted(first_dates)
+    ])
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[SeriesVersion.user_id, SeriesVersion.metric_name],
+        set_={"version": SeriesVersion.version + 1, "updated_at": now}
+    ))
+
+    # The rows just bumped stay locked by this transaction
+    versions = session.execute(
+        select(SeriesVersion.metric_name, SeriesVersion.version).where(
+            SeriesVersion.user_id == user_id,
+            SeriesVersion.metric_name.in_(sorted(first_dates))
+        )
+    ).all()
+    session.execute(insert(SeriesChange).values([
+        {"user_id": user_id, "metric_name": metric, "version": version, "first_date": first_dates[metric]}
+        for metric, version in versions
+    ]).on_conflict_do_nothing())
+
+
+def load_series_versions(session: Session, series: List[Tuple[int, str]]) -> Dict[Tuple[int, str], int]:
+    """
+    Current data version of several series with one query.
+
+    Args:
+        session: Database session
+        series: (user_id, metric_name) pairs; metric names are case-insensitive
+
+    Returns:
+        {(user_id, metric_name): version} keyed by the pairs as given
+        (0 for series that were never written)
+    """
+    keys = sorted({(user_id, normalize_metric_name(metric)) for user_id, metric in series})
+    if not keys:
+        return {}
+
+    rows = session.execute(
+        select(SeriesVersion.user_id, SeriesVersion.metric_name, SeriesVersion.version)
+        .where(tuple_(SeriesVersion.user_id, SeriesVersion.metric_name).in_(keys))
+    ).all()
+    versions = {(user_id, metric): version for user_id, metric, version in rows}
+
+    return {
+        (user_id, metric): versions.get((user_id, normalize_metric_name(metric)), 0)
+        for user_id, metric in series
+    }
+
+
+def load_series_version(session: Session, user_id: int, metric_name: str) -> int:
+    """Current data version of one series (0 if it was never written)."""
+    version = session.execute(
+        select(SeriesVersion.version).where(
+            SeriesVersion.user_id == user_id,
+            SeriesVersion.metric_name == normalize_metric_name(metric_name)
+        )
+    ).scalar()
+    return version or 0
+
+
+def load_changed_from(
+    session: Session,
+    user_id: int,
+    metric_name: str,
+    since_version: int,
+    version: int
+) -> Optional[datetime]:
+    """
+    Earliest date written by the version bumps after ``since_version`` up to
+    ``version``: points before it are the same at both versions.
+
+    Returns:
+        The date, or None when not every bump in between was recorded
+        (versions written before change tracking existed)
+    """
+    changes, first_date = session.execute(
+        select(func.count(), func.min(SeriesChange.first_date)).where(
+            SeriesChange.user_id == user_id,
+            SeriesChange.metric_name == normalize_metric_name(metric_name),
+            SeriesChange.version > since_version,
+            SeriesChange.version <= version
+        )
+    ).one()
+    if changes != version - since_version:
+        return None
+    return first_date
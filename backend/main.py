@@ -5,12 +5,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api import endpoints
 from app.api.stripe_webhook import router as stripe_router
 from app.db.database import engine, Base
-from app.models.models import User, BusinessData, Metrics, Predictions
+from app.models.models import User, BusinessData, Metrics, Predictions, TimeseriesPoint, TrainingJob
+from app.db.migrations import run_migrations
 from error_handling import setup_error_handling
 
-# Create database tables (skip if DB unavailable, e.g. SQLite path issues)
+# Create database tables and apply pending migrations (skip if DB unavailable, e.g. SQLite path issues)
 try:
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 except Exception as e:
     import logging
     logging.warning(f"Could not create DB tables: {e}. API will run but DB features may fail.")
@@ -39,6 +41,28 @@ setup_error_handling(app)
 app.include_router(endpoints.router, prefix="/api/v1", tags=["main"])
 app.include_router(stripe_router, prefix="/api/v1/stripe", tags=["stripe"])
 
+@app.on_event("startup")
+def resume_training_jobs():
+    """Run training jobs that were still queued when the API last stopped."""
+    if endpoints.HAS_ML:
+        from app.db.database import SessionLocal
+        from app.services.ml.training_jobs import requeue_pending_jobs
+        try:
+            with SessionLocal() as session:
+                requeue_pending_jobs(session)
+        except Exception as e:
+            import logging
+            logging.warning(f"Could not resume training jobs: {e}")
+
+@app.on_event("shutdown")
+def shutdown_worker_pools():
+    """Stop ML worker processes with the API."""
+    if endpoints.HAS_ML:
+        from app.services.ml.batch_forecast import shutdown_forecast_pool
+        from app.services.ml.training_jobs import shutdown_training_pool
+        shutdown_forecast_pool()
+        shutdown_training_pool()
+
 @app.get("/")
 async def root():
     return {
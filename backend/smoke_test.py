@@ -7,15 +7,53 @@ This script verifies that all components are properly glued together:
 - ML services can be initialized
 """
 
-from fastapi.testclient import TestClient
-from main import app
-import json
+import inspect
 import io
-import csv
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# ML runtime data of the app under test (model registry, feature store, ...),
+# including its worker processes, goes to a scratch directory
+os.environ.setdefault("ML_DATA_DIR", tempfile.mkdtemp(prefix="echolon_smoke_ml_"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from main import app  # noqa: E402
 
 # Initialize test client
 client = TestClient(app)
 
+
+def _isolate_ml_stores(monkeypatch, root: Path) -> None:
+    """Point the shared model registry, feature store and backtest store at ``root``."""
+    from app.services.ml.backtest import backtest_store
+    from app.services.ml.preprocessing import feature_store
+    from app.services.ml.registry import ModelRegistry, registry
+    
+    monkeypatch.setattr(registry, "__dict__", ModelRegistry(root / "registry").__dict__)
+    monkeypatch.setattr(feature_store, "root", root / "feature_store")
+    monkeypatch.setattr(backtest_store, "root", root / "backtests")
+
+
+@pytest.fixture
+def ml_stores(tmp_path, monkeypatch):
+    """Empty ML stores for one test, restored afterwards."""
+    _isolate_ml_stores(monkeypatch, tmp_path)
+    return tmp_path
+
+
+def _wait_for_job(job_id: int, timeout: float = 120) -> dict:
+    """Poll a queued job until it finished (or the timeout passed)."""
+    import time
+    deadline = time.time() + timeout
+    while True:
+        job = client.get(f"/api/v1/ml/jobs/{job_id}").json()
+        if job["status"] not in ("pending", "running") or time.time() > deadline:
+            return job
+        time.sleep(0.5)
+
 # ============================================================================
 # HEALTH CHECK TESTS
 # ============================================================================
@@ -68,11 +106,14 @@ def test_all_endpoints_registered():
     
     required_endpoints = [
         "/api/v1/upload_csv",
+        "/api/v1/upload_dataset",
         "/api/v1/insights",
         "/api/v1/predictions",
         "/api/v1/ml/forecast",
+        "/api/v1/ml/forecast/batch",
         "/api/v1/ml/insights",
-        "/api/v1/ml/train/{business_id}/{metric_name}"
+        "/api/v1/ml/train/{business_id}/{metric_name}",
+        "/api/v1/ml/jobs/{job_id}"
     ]
     
     for endpoint in required_endpoints:
@@ -108,6 +149,10 @@ def test_csv_upload_missing_columns():
 
 def test_csv_upload_valid():
     """Test that valid CSV is accepted and processed."""
+    from datetime import datetime
+    from app.db.database import SessionLocal
+    from app.models.models import TimeseriesPoint
+    
     # Create valid CSV
     csv_content = "date,metric_name,value\n2024-01-01,revenue,1000\n2024-01-02,revenue,1200\n"
     response = client.post(
@@ -118,12 +163,667 @@ def test_csv_upload_valid():
     data = response.json()
     assert data["status"] == "success"
     assert data["rows_processed"] == 2
+    # Stored rows rather than points_stored, which only counts changed values
+    # (a rerun on the same database changes none)
+    with SessionLocal() as session:
+        stored = (
+            session.query(TimeseriesPoint.date, TimeseriesPoint.value)
+            .filter(TimeseriesPoint.user_id == 1, TimeseriesPoint.metric_name == "revenue",
+                    TimeseriesPoint.date.in_([datetime(2024, 1, 1), datetime(2024, 1, 2)]))
+            .order_by(TimeseriesPoint.date)
+            .all()
+        )
+    assert [value for _, value in stored] == [1000.0, 1200.0]
     print(f"✓ CSV upload successful ({data['rows_processed']} rows processed)")
 
+def test_csv_upload_wide_format():
+    """Test that a wide CSV is streamed and melted into one point per metric per row."""
+    import uuid
+    
+    # Fresh metrics each run: only points whose values changed are counted
+    suffix = uuid.uuid4().hex[:8]
+    rows = "".join(f"2024-01-{day:02d},{day * 100},{day}\n" for day in range(1, 11))
+    csv_content = f"Date,revenue_{suffix},orders_{suffix}\n" + rows
+    response = client.post(
+        "/api/v1/upload_csv",
+        files={"file": ("wide.csv", csv_content.encode())}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows_processed"] == 10
+    assert data["points_stored"] == 20
+    print(f"✓ Wide CSV upload successful ({data['points_stored']} points stored)")
+
+def test_upload_bumps_changed_series_only():
+    """Test that a re-upload only bumps the version of metrics whose values changed."""
+    from app.db.database import SessionLocal
+    from app.services.timeseries_store import load_series_versions
+    
+    def upload(rows):
+        response = client.post(
+            "/api/v1/upload_csv",
+            files={"file": ("versions.csv", ("date,version_a,version_b\n" + rows).encode())}
+        )
+        assert response.status_code == 200
+    
+    def versions():
+        with SessionLocal() as session:
+            return load_series_versions(session, [(1, "version_a"), (1, "version_b")])
+    
+    upload("2024-05-01,1,10\n2024-05-02,2,20\n")
+    before = versions()
+    upload("2024-05-01,1,10\n2024-05-02,3,20\n")  # only version_a changed
+    after = versions()
+    assert after[(1, "version_a")] == before[(1, "version_a")] + 1
+    assert after[(1, "version_b")] == before[(1, "version_b")]
+    print("✓ Re-uploads only bump the versions of changed series")
+
+def test_reupload_restores_values():
+    """Test that re-uploading an earlier file after a changed one is not skipped as a duplicate."""
+    file_a = b"date,reupload_metric\n2024-06-01,1\n2024-06-02,2\n"
+    file_b = b"date,reupload_metric\n2024-06-01,1\n2024-06-02,5\n"
+    
+    def upload(content):
+        response = client.post("/api/v1/upload_csv", files={"file": ("reupload.csv", content)})
+        assert response.status_code == 200
+        return response.json()
+    
+    upload(file_a)
+    assert upload(file_a)["duplicate_of"] is not None  # identical to the latest upload
+    assert upload(file_b)["points_stored"] == 1
+    data = upload(file_a)
+    assert data["duplicate_of"] is None
+    assert data["points_stored"] == 1  # 2024-06-02 is back to 2
+    print("✓ Re-uploading an earlier file restores its values")
+
+def test_csv_upload_records_capped(monkeypatch):
+    """Test that an upload without metric columns keeps a bounded copy of its raw rows."""
+    from app.api import endpoints
+    rows = "".join(f"2024-03-{day:02d},note {day}\n" for day in range(1, 21))
+    monkeypatch.setattr(endpoints, "MAX_RAW_RECORDS", 5)
+    response = client.post(
+        "/api/v1/upload_csv",
+        files={"file": ("notes.csv", ("date,note\n" + rows).encode())}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows_processed"] == 20
+    assert data["points_stored"] == 0
+    assert data["records_truncated"] is True
+    print("✓ Raw records of a metric-less upload are capped")
+
+def test_dataset_upload_parquet():
+    """Test that a Parquet file is ingested using its column types."""
+    import uuid
+    import pandas as pd
+    
+    # Fresh metric each run: only points whose values changed are counted
+    buffer = io.BytesIO()
+    pd.DataFrame({
+        "date": pd.date_range("2024-01-01", periods=10),
+        f"revenue_{uuid.uuid4().hex[:8]}": [float(day * 100) for day in range(10)],
+        "region": ["north"] * 10,
+    }).to_parquet(buffer)
+    response = client.post(
+        "/api/v1/upload_dataset",
+        files={"file": ("data.parquet", buffer.getvalue())}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["format"] == "parquet"
+    assert data["points_stored"] == 10
+    print(f"✓ Parquet upload successful ({data['points_stored']} points stored)")
+
+def test_rollups_endpoint():
+    """Test that uploads maintain monthly rollups that the query API serves."""
+    rows = "".join(f"2023-02-{day:02d},{day}\n" for day in range(1, 29))
+    response = client.post(
+        "/api/v1/upload_csv",
+        files={"file": ("rollup.csv", ("date,rollup_metric\n" + rows).encode())}
+    )
+    assert response.status_code == 200
+    response = client.get("/api/v1/timeseries/1/rollup_metric/rollups?granularity=monthly")
+    assert response.status_code == 200
+    periods = response.json()["periods"]
+    assert len(periods) == 1
+    assert periods[0]["count"] == 28
+    assert periods[0]["sum"] == sum(range(1, 29))
+    print("✓ Rollups maintained at ingest time")
+
 # ============================================================================
 # ML ENDPOINT TESTS
 # ============================================================================
 
+def test_feature_store_paths(ml_stores, monkeypatch):
+    """Test that the feature store serves hits and recomputes from the first changed date."""
+    import uuid
+    import pandas as pd
+    from app.db.database import SessionLocal
+    from app.services.ml import preprocessing
+    
+    # Fresh metric each run: uploads persist in the test database
+    metric = f"features_{uuid.uuid4().hex[:8]}"
+    
+    def upload(start, values):
+        dates = pd.date_range(start, periods=len(values))
+        rows = "".join(f"{day.date()},{value}\n" for day, value in zip(dates, values))
+        response = client.post(
+            "/api/v1/upload_csv",
+            files={"file": ("features.csv", (f"date,{metric}\n" + rows).encode())}
+        )
+        assert response.status_code == 200
+    
+    loads = []
+    load = preprocessing.load_timeseries_data
+    
+    def counting_load(*args, **kwargs):
+        loads.append(kwargs.get("start_date"))
+        return load(*args, **kwargs)
+    
+    def features():
+        loads.clear()
+        with SessionLocal() as session:
+            stored = preprocessing.feature_store.get(session, 1, metric)
+            expected = preprocessing.build_features(preprocessing.clean_timeseries_data(load(session, 1, metric)))
+        pd.testing.assert_frame_equal(stored, expected, check_dtype=False)
+        return stored
+    
+    monkeypatch.setattr(preprocessing, "load_timeseries_data", counting_load)
+    upload("2022-01-01", [100 + day % 7 * 10 for day in range(60)])
+    assert len(features()) == 60 and loads == [None]
+    assert len(features()) == 60 and loads == []  # same data version: read from Parquet
+    
+    upload("2022-03-02", [200 + day for day in range(10)])
+    assert len(features()) == 70
+    assert loads == [pd.Timestamp("2022-03-02")]  # only the points after the stored ones
+    
+    upload("2022-01-15", [999])  # edits an already stored point
+    assert len(features()) == 70 and loads == [pd.Timestamp("2022-01-15")]
+    
+    # Swaps two values: same count and sum, still recomputed from the first one
+    upload("2022-02-01", [100 + 32 % 7 * 10, 100 + 31 % 7 * 10])
+    assert len(features()) == 70 and loads == [pd.Timestamp("2022-02-01")]
+    
+    upload("2022-01-01", [1])  # nothing older is stored: rebuilt from scratch
+    assert len(features()) == 70 and loads == [None]
+    print("✓ Feature store hit, append and incremental update paths")
+
+def test_ml_forecast_batch_endpoint():
+    """Test that batch forecasts stream one result line per request."""
+    import json
+    payload = {"requests": [
+        {"business_id": 1, "metric_name": "revenue", "horizon": 7, "model_type": "xgboost"},
+        {"business_id": 1, "metric_name": "no_such_metric", "horizon": 7},
+    ]}
+    response = client.post("/api/v1/ml/forecast/batch", json=payload)
+    assert response.status_code == 200
+    results = {result["index"]: result for result in map(json.loads, response.text.splitlines())}
+    assert sorted(results) == [0, 1]
+    # No model yet for the first series (training is queued), no data for the second
+    assert results[0]["status"] == 202 and results[0]["job_id"]
+    assert results[1]["status"] == 400 and results[1]["error"]
+    print(f"✓ Batch forecast streamed {len(results)} results")
+
+def test_ml_train_job():
+    """Test that training is queued as a job whose outcome can be polled."""
+    import time
+    response = client.post("/api/v1/ml/train/1/revenue?model_type=xgboost")
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    
+    deadline = time.time() + 120
+    while True:
+        job = client.get(f"/api/v1/ml/jobs/{job_id}").json()
+        if job["status"] not in ("pending", "running") or time.time() > deadline:
+            break
+        time.sleep(0.5)
+    # Two uploaded points are not enough to train on
+    assert job["status"] == "failed"
+    assert "insufficient" in job["error_message"].lower()
+    
+    # Incremental updates are queued the same way
+    response = client.post("/api/v1/ml/train/1/revenue?model_type=xgboost&incremental=true")
+    assert response.status_code == 202
+    assert client.get(f"/api/v1/ml/jobs/{response.json()['job_id']}").json()["incremental"] is True
+    
+    # The global model is one job for every series
+    response = client.post("/api/v1/ml/train/global")
+    assert response.status_code == 202
+    job = client.get(f"/api/v1/ml/jobs/{response.json()['job_id']}").json()
+    assert (job["business_id"], job["metric_name"], job["model_type"]) == (0, "*", "xgboost_global")
+    assert client.get("/api/v1/ml/jobs/999999").status_code == 404
+    print(f"✓ Training job {job_id} ran in the background ({job['status']})")
+
+def test_training_job_worker_killed():
+    """Test that a job whose worker dies is failed and the pool replaced."""
+    import os
+    import signal
+    import time
+    import pandas as pd
+    from app.services.ml import training_jobs
+    
+    # Long enough that the direct model trains for a while
+    days = pd.date_range("2021-01-01", periods=730)
+    rows = "".join(f"{day.date()},{1000 + day.dayofweek * 50 + i}\n" for i, day in enumerate(days))
+    response = client.post(
+        "/api/v1/upload_csv",
+        files={"file": ("long.csv", ("date,worker_kill_metric\n" + rows).encode())}
+    )
+    assert response.status_code == 200
+    response = client.post("/api/v1/ml/train/1/worker_kill_metric?model_type=xgboost_direct")
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    
+    deadline = time.time() + 120
+    while client.get(f"/api/v1/ml/jobs/{job_id}").json()["status"] == "pending" and time.time() < deadline:
+        time.sleep(0.05)
+    # Kill the worker mid-job, as the OOM killer would
+    pool = training_jobs.get_training_pool()
+    for process in list(pool._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+    
+    while client.get(f"/api/v1/ml/jobs/{job_id}").json()["status"] == "running" and time.time() < deadline:
+        time.sleep(0.2)
+    job = client.get(f"/api/v1/ml/jobs/{job_id}").json()
+    assert job["status"] == "failed"
+    assert "worker stopped" in job["error_message"].lower()
+    assert training_jobs.get_training_pool() is not pool
+    
+    # The model is no longer locked by the dead job
+    response = client.post("/api/v1/ml/train/1/worker_kill_metric?model_type=ets")
+    assert response.status_code == 202
+    print(f"✓ Training job {job_id} failed after its worker was killed")
+
+def test_stale_training_job_released():
+    """Test that a job left running past its lease does not block new training requests."""
+    from datetime import datetime, timedelta
+    from app.db.database import SessionLocal
+    from app.models.models import TrainingJob
+    
+    with SessionLocal() as session:
+        stale = TrainingJob(
+            business_id=1, metric_name="stale_job_metric", model_type="ets", horizon=30,
+            status="running", started_at=datetime.utcnow() - timedelta(days=1)
+        )
+        session.add(stale)
+        session.commit()
+        stale_id = stale.id
+    
+    response = client.post("/api/v1/ml/train/1/stale_job_metric?model_type=ets")
+    assert response.status_code == 202
+    assert response.json()["job_id"] != stale_id
+    job = client.get(f"/api/v1/ml/jobs/{stale_id}").json()
+    assert job["status"] == "failed"
+    assert "lease expired" in job["error_message"]
+    print(f"✓ Stale training job {stale_id} released its model")
+
+def test_pending_job_covers_full_request():
+    """Test that a full retrain request supersedes a pending incremental job for the same model."""
+    from app.db.database import SessionLocal
+    from app.models.models import TrainingJob
+    from app.services.ml.training_jobs import enqueue_training
+    
+    with SessionLocal() as session:
+        # Recorded but not submitted, so it stays pending
+        pending = TrainingJob(
+            business_id=1, metric_name="pending_job_metric", model_type="xgboost",
+            horizon=30, incremental=True, status="pending"
+        )
+        session.add(pending)
+        session.commit()
+        
+        job = enqueue_training(session, 1, "pending_job_metric", "xgboost", horizon=60)
+        assert job.id == pending.id
+        assert (job.incremental, job.horizon) == (False, 60)
+        # A later incremental request for a shorter horizon changes nothing
+        job = enqueue_training(session, 1, "pending_job_metric", "xgboost", horizon=7, incremental=True)
+        assert (job.incremental, job.horizon) == (False, 60)
+        job.status = "cancelled"
+        session.commit()
+    print("✓ Pending training jobs are widened to cover new requests")
+
+def test_running_job_gets_follow_up():
+    """Test that a request a running job does not cover is queued behind it."""
+    from datetime import datetime
+    from app.db.database import SessionLocal
+    from app.models.models import TrainingJob
+    from app.services.ml.training_jobs import enqueue_training
+    
+    with SessionLocal() as session:
+        running = TrainingJob(
+            business_id=1, metric_name="running_job_metric", model_type="xgboost",
+            horizon=30, incremental=True, status="running", started_at=datetime.utcnow()
+        )
+        session.add(running)
+        session.commit()
+        
+        # Covered by the running job
+        assert enqueue_training(session, 1, "running_job_metric", "xgboost", horizon=7, incremental=True).id == running.id
+        # Longer horizon: a follow-up job waits for the running one
+        follow_up = enqueue_training(session, 1, "running_job_metric", "xgboost", horizon=60, incremental=True)
+        assert follow_up.id != running.id
+        # A full retrain joins (and widens) the follow-up
+        job = enqueue_training(session, 1, "running_job_metric", "xgboost", horizon=30)
+        assert job.id == follow_up.id
+        session.refresh(job)
+        assert (job.status, job.horizon, job.incremental) == ("pending", 60, False)
+        running.status = job.status = "cancelled"
+        session.commit()
+    print("✓ Requests a running job does not cover are queued behind it")
+
+def test_incremental_xgboost_update(ml_stores, monkeypatch):
+    """Test the incremental, unchanged and full-retrain paths of update_xgboost_model."""
+    import numpy as np
+    import pandas as pd
+    from app.db.database import SessionLocal
+    from app.services.ml import models_xgboost
+    from app.services.ml.config import INCREMENTAL_ROUNDS
+    from app.services.ml.registry import registry
+    
+    days = np.arange(240)
+    history = pd.DataFrame({
+        "date": pd.date_range("2022-01-01", periods=len(days)),
+        "value": 100 + 0.5 * days + 10 * np.sin(days / 7 * 2 * np.pi),
+    })
+    series = (9016, "incremental")
+    with SessionLocal() as session:
+        # No model yet: trained from scratch
+        _, metrics = models_xgboost.update_xgboost_model(session, *series, history=history[:180])
+        assert metrics["mode"] == "full"
+        base = registry.current("xgboost", *series)
+        
+        _, metrics = models_xgboost.update_xgboost_model(session, *series, history=history[:180])
+        assert metrics["mode"] == "unchanged"
+        assert registry.current("xgboost", *series)["version"] == base["version"]
+        
+        _, metrics = models_xgboost.update_xgboost_model(session, *series, history=history[:210])
+        assert metrics["mode"] == "incremental"
+        assert metrics["new_samples"] == 30
+        entry = registry.current("xgboost", *series)
+        assert entry["incremental_updates"] == 1 and entry["base_version"] == base["version"]
+        assert entry["params"]["n_estimators"] == base["params"]["n_estimators"] + INCREMENTAL_ROUNDS
+        assert entry["training_window"]["end"].startswith(str(history["date"][209].date()))
+        forecast = models_xgboost.predict_xgboost(session, *series, horizon=7, history=history[:210])
+        assert len(forecast) == 7 and all(np.isfinite(point.value) for point in forecast)
+        
+        # Too many stacked updates: falls back to a full retrain
+        monkeypatch.setattr(models_xgboost, "MAX_INCREMENTAL_UPDATES", 1)
+        _, metrics = models_xgboost.update_xgboost_model(session, *series, history=history)
+        assert metrics["mode"] == "full"
+        assert registry.current("xgboost", *series).get("incremental_updates", 0) == 0
+    print("✓ Incremental XGBoost updates extend, skip or fully retrain the model")
+
+def test_global_model_unseen_series(ml_stores):
+    """Test that the global model forecasts a business and metric it was not trained on."""
+    import numpy as np
+    import pandas as pd
+    from app.services.ml.models_xgboost import train_xgboost_global_model, predict_xgboost_global
+    
+    days = np.arange(240)
+    rng = np.random.default_rng(0)
+    
+    def history(level):
+        return pd.DataFrame({
+            "date": pd.date_range("2023-01-01", periods=len(days)),
+            "value": level * (1 + 0.3 * np.sin(days / 7 * 2 * np.pi)) + rng.normal(0, level * 0.01, len(days)),
+        })
+    
+    series = {
+        (business_id, metric): history(level)
+        for business_id, level in [(1, 50), (2, 400), (3, 2000)]
+        for metric in ("orders", "visits")
+    }
+    train_xgboost_global_model(None, series=series)
+    
+    unseen = history(900)
+    forecast = predict_xgboost_global(None, 99, "signups", horizon=14, history=unseen[:226])
+    values = np.array([point.value for point in forecast])
+    error = np.abs(values - unseen["value"][226:].to_numpy()).mean() / 900
+    assert error < 0.1, error  # weekly swing is +/-30% of the level
+    print(f"✓ Global model forecasts an unseen series within {error:.1%} of its level")
+
+def test_ets_forecast(ml_stores):
+    """Test that ETS fits a seasonal series, fills in intervals and catches up on new points."""
+    import numpy as np
+    import pandas as pd
+    from app.services.ml.config import ETS_SHORT_SERIES
+    from app.services.ml.forecast_service import resolve_training_model_type
+    from app.services.ml.models_ets import train_ets_model, predict_ets
+    
+    days = np.arange(84)
+    rng = np.random.default_rng(0)
+    history = pd.DataFrame({
+        "date": pd.date_range("2023-01-01", periods=len(days)),
+        "value": 200 + 30 * np.sin(days / 7 * 2 * np.pi) + rng.normal(0, 1, len(days)),
+    })
+    series = (9017, "ets")
+    train_ets_model(None, *series, history=history[:70])
+    
+    forecast = predict_ets(None, *series, horizon=14, history=history[:70])
+    values = np.array([point.value for point in forecast])
+    assert np.abs(values - history["value"][70:].to_numpy()).mean() < 5  # weekly swing is +/-30
+    lower = np.array([point.lower_bound for point in forecast])
+    upper = np.array([point.upper_bound for point in forecast])
+    assert np.all(lower < values) and np.all(values < upper)
+    assert np.all(np.diff(upper - lower) >= -1e-9)  # uncertainty grows with the horizon
+    
+    # Points stored after training are absorbed without retraining
+    forecast = predict_ets(None, *series, horizon=7, history=history)
+    assert forecast[0].date == (history["date"].max() + pd.Timedelta(days=1)).date()
+    
+    assert resolve_training_model_type("auto", ETS_SHORT_SERIES - 1) == "ets"
+    assert resolve_training_model_type("auto", ETS_SHORT_SERIES) == resolve_training_model_type("auto", None)
+    print(f"✓ ETS forecast within {np.abs(values - history['value'][70:84].to_numpy()).mean():.2f} of a seasonal series")
+
+def test_prophet_future_cache(ml_stores, monkeypatch):
+    """Test that Prophet forecasts are cached per model version and intervals can be skipped."""
+    import numpy as np
+    import pandas as pd
+    from prophet import Prophet
+    from app.services.ml.config import PROPHET_FUTURE_DAYS
+    from app.services.ml.models_prophet import train_prophet_model, predict_prophet
+    
+    days = np.arange(120)
+    history = pd.DataFrame({
+        "date": pd.date_range("2023-01-01", periods=len(days)),
+        "value": 200 + days + 30 * np.sin(days / 7 * 2 * np.pi),
+    })
+    series = (9018, "prophet")
+    train_prophet_model(None, *series, history=history)
+    
+    calls = []
+    predict = Prophet.predict
+    
+    def counting_predict(model, *args, **kwargs):
+        calls.append(1)
+        return predict(model, *args, **kwargs)
+    
+    monkeypatch.setattr(Prophet, "predict", counting_predict)
+    full = predict_prophet(None, *series, horizon=30)
+    assert len(calls) == 1
+    assert all(point.lower_bound <= point.value <= point.upper_bound for point in full)
+    # Shorter horizons are sliced from the cached frame
+    short = predict_prophet(None, *series, horizon=7)
+    assert len(calls) == 1
+    assert [point.value for point in short] == [point.value for point in full[:7]]
+    
+    point_only = predict_prophet(None, *series, horizon=30, include_intervals=False)
+    assert len(calls) == 2
+    assert all(point.lower_bound is None and point.upper_bound is None for point in point_only)
+    assert np.allclose([point.value for point in point_only], [point.value for point in full])
+    predict_prophet(None, *series, horizon=30, include_intervals=False)
+    assert len(calls) == 2
+    
+    # Beyond the cached days the forecast is recomputed
+    assert len(predict_prophet(None, *series, horizon=PROPHET_FUTURE_DAYS + 10)) == PROPHET_FUTURE_DAYS + 10
+    assert len(calls) == 3
+    print("✓ Prophet future forecasts cached per model version")
+
+def test_ml_backtest_endpoint():
+    """Test that backtests, tournaments and tuning reject series too short to hold out a horizon."""
+    # Backtests run as jobs; fits failing on too little data fail the job
+    response = client.post("/api/v1/ml/backtest/1/revenue?model_type=ets&horizon=7&folds=2")
+    assert response.status_code == 202
+    job = _wait_for_job(response.json()["job_id"])
+    assert job["kind"] == "backtest" and job["status"] == "failed"
+    assert "insufficient" in job["error_message"].lower()
+    assert client.post("/api/v1/ml/backtest/1/revenue?model_type=xgboost_global").status_code == 400
+    # No candidate can be scored, so no selection is recorded
+    response = client.post("/api/v1/ml/tournament/1/revenue?horizon=7")
+    assert response.status_code == 202
+    job = _wait_for_job(response.json()["job_id"])
+    assert job["kind"] == "tournament" and job["status"] == "failed"
+    assert "no model could be backtested" in job["error_message"].lower()
+    # Tuning needs history before the held-out folds, and only tunes XGBoost
+    response = client.post("/api/v1/ml/tune/1/revenue?horizon=7&budget_seconds=30")
+    assert response.status_code == 202
+    job = _wait_for_job(response.json()["job_id"])
+    assert job["kind"] == "tune" and job["status"] == "failed"
+    assert "too little history" in job["error_message"].lower()
+    assert client.post("/api/v1/ml/tune/1/revenue?model_type=prophet").status_code == 400
+    print("✓ Backtest, tournament and tuning endpoints validate their input")
+
+def test_ml_backtest_job():
+    """Test that a backtest runs as a job and is served from the store until the data changes."""
+    import uuid
+    import pandas as pd
+    
+    # Fresh metric each run: uploads persist in the test database
+    metric = f"backtest_{uuid.uuid4().hex[:8]}"
+    days = pd.date_range("2023-01-01", periods=120)
+    rows = "".join(f"{day.date()},{100 + day.dayofweek * 10 + i % 3}\n" for i, day in enumerate(days))
+    response = client.post(
+        "/api/v1/upload_csv",
+        files={"file": ("backtest.csv", (f"date,{metric}\n" + rows).encode())}
+    )
+    assert response.status_code == 200
+    
+    url = f"/api/v1/ml/backtest/1/{metric}?model_type=ets&horizon=7&folds=2"
+    response = client.post(url)
+    assert response.status_code == 202
+    job = _wait_for_job(response.json()["job_id"])
+    assert job["status"] == "completed", job["error_message"]
+    assert job["params"] == {"folds": 2} and len(job["result"]["folds"]) == 2
+    
+    response = client.post(url)
+    assert response.status_code == 200
+    assert response.json()["mae"] == job["result"]["mae"]
+    print(f"✓ Backtest job {job['id']} stored an MAE of {job['result']['mae']:.2f}")
+
+def test_tournament_common_folds(ml_stores):
+    """Test that tournament candidates are scored on the same folds, XGBoost with its tuned parameters."""
+    import numpy as np
+    import pandas as pd
+    from app.services.ml.backtest import run_backtest
+    from app.services.ml.config import BACKTEST_FOLDS
+    from app.services.ml.registry import registry
+    from app.services.ml.tournament import run_tournament
+    
+    # Training windows of 68, 61 and 54 points: too short for XGBoost in the earliest fold
+    days = np.arange(75)
+    history = pd.DataFrame({
+        "date": pd.date_range("2023-01-01", periods=len(days)),
+        "value": 100 + days + 20 * np.sin(days / 7 * 2 * np.pi),
+    })
+    series = (9019, "tournament")
+    tuned = {"n_estimators": 20, "max_depth": 2}
+    registry.record_tuned_params([
+        {"model_type": "xgboost", "business_id": series[0], "metric_name": series[1], "params": tuned}
+    ])
+    selection = run_tournament(None, *series, horizon=7, history=history, record=False, parallel=False)
+    assert selection["folds_scored"] == BACKTEST_FOLDS - 1
+    
+    for model_type, params in (("ets", None), ("xgboost", tuned)):
+        result = run_backtest(
+            None, *series, model_type, 7, BACKTEST_FOLDS, history=history, parallel=False, params=params
+        )
+        common = result.folds[:-1]
+        expected = sum(fold.mae * fold.test_samples for fold in common) / sum(fold.test_samples for fold in common)
+        assert np.isclose(selection["scores"][model_type], expected)
+    assert result.folds[-1].error is not None  # XGBoost's earliest fold
+    print(f"✓ Tournament scored {selection['folds_scored']} common folds, won by {selection['model_type']}")
+
+def test_tuning_trial_deadline():
+    """Test that a tuning trial still fitting at the search deadline stops instead of running on."""
+    import time
+    import numpy as np
+    import pandas as pd
+    from app.services.ml.tuning import build_folds, _score_trial
+    
+    days = np.arange(300)
+    history = pd.DataFrame({
+        "date": pd.date_range("2023-01-01", periods=len(days)),
+        "value": 100 + days % 7 * 10.0,
+    })
+    (fold, *_) = build_folds([history], horizon=7)
+    start = time.time()
+    with pytest.raises(TimeoutError):
+        _score_trial("xgboost", {"n_estimators": 100_000, "max_depth": 8}, fold, 7, deadline=start + 0.5)
+    assert time.time() - start < 10
+    print(f"✓ Tuning trial stopped {time.time() - start:.1f}s after starting with a 0.5s deadline")
+
+def test_compiled_tree_parity():
+    """Test that compiled tree inference predicts exactly what the native booster does."""
+    import numpy as np
+    import xgboost as xgb
+    from app.services.ml.compiled_trees import compile_booster
+    from app.services.ml.config import XGBOOST_CONFIG
+    
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 12)).astype(np.float32)
+    X[rng.random(X.shape) < 0.05] = np.nan  # missing values take the default branch
+    y = np.nansum(X[:, :4], axis=1) + rng.normal(size=len(X))
+    booster = xgb.XGBRegressor(**XGBOOST_CONFIG).fit(X, y).get_booster()
+    
+    forest = compile_booster(booster)
+    if forest is None:
+        print("✓ Compiled tree inference unavailable (no C compiler); native prediction is used")
+        return
+    assert compile_booster(booster) is forest
+    assert np.array_equal(forest.predict(X), booster.inplace_predict(X))
+    predict_row = forest.row_predictor(X)
+    assert all(predict_row(row) == booster.inplace_predict(X[row:row + 1])[0] for row in range(50))
+    print(f"✓ Compiled inference matches the native booster ({forest.n_trees} trees)")
+
+def test_compiled_runtime_integrity(monkeypatch, tmp_path):
+    """Test that the tree runtime is only loaded from a private directory and when it matches its checksum."""
+    import shutil
+    from app.services.ml import compiled_trees
+    
+    # Version 2.0 boosters store a number, later ones a vector per target
+    learner = {"learner_model_param": {"base_score": "5E-1"}}
+    assert compiled_trees._base_score(learner) == 0.5
+    learner["learner_model_param"]["base_score"] = "[5E-1]"
+    assert compiled_trees._base_score(learner) == 0.5
+    learner["learner_model_param"]["base_score"] = "[5E-1,1E0]"
+    assert compiled_trees._base_score(learner) is None
+    
+    if shutil.which(compiled_trees.TREE_RUNTIME_CC) is None:
+        print("✓ Base scores parsed (no C compiler to build the runtime)")
+        return
+    def load(runtime_dir):
+        monkeypatch.setattr(compiled_trees, "TREE_RUNTIME_DIR", runtime_dir)
+        monkeypatch.setattr(compiled_trees, "_runtime", None)
+        monkeypatch.setattr(compiled_trees, "_runtime_error", None)
+        return compiled_trees.load_runtime()
+    
+    assert load(tmp_path / "built") is not None
+    (checksum,) = (tmp_path / "built").glob("forest_*.sha256")
+    # A library that does not match the recorded checksum is rebuilt, not
+    # loaded (in a directory of its own: loaded libraries stay mapped)
+    runtime_dir = tmp_path / "tampered"
+    runtime_dir.mkdir(mode=0o700)
+    shutil.copy(checksum, runtime_dir)
+    library = runtime_dir / checksum.with_suffix(".so").name
+    library.write_bytes(b"not the runtime")
+    assert load(runtime_dir) is not None
+    assert library.read_bytes() != b"not the runtime"
+    # Nor is anything loaded from a directory others can write to
+    runtime_dir.chmod(0o777)
+    assert load(runtime_dir) is None
+    runtime_dir.chmod(0o700)
+    print("✓ Tree runtime rebuilt when tampered with and refused from a shared directory")
+
 def test_ml_insights_endpoint():
     """Test that ML insights endpoint is functional."""
     payload = {
@@ -158,6 +858,15 @@ def test_predictions_endpoint():
 # MAIN TEST RUNNER
 # ============================================================================
 
+def _call_test(test_func):
+    """Call a test with the fixtures it asks for, as pytest would."""
+    params = inspect.signature(test_func).parameters
+    with pytest.MonkeyPatch.context() as monkeypatch, tempfile.TemporaryDirectory() as tmp:
+        fixtures = {"monkeypatch": monkeypatch, "tmp_path": Path(tmp), "ml_stores": Path(tmp)}
+        if "ml_stores" in params:
+            _isolate_ml_stores(monkeypatch, Path(tmp))
+        return test_func(**{name: fixtures[name] for name in params})
+
 def run_all_tests():
     """Run all smoke tests."""
     print("\n" + "="*70)
@@ -180,8 +889,31 @@ def run_all_tests():
             test_csv_upload_invalid_file,
             test_csv_upload_missing_columns,
             test_csv_upload_valid,
+            test_csv_upload_wide_format,
+            test_upload_bumps_changed_series_only,
+            test_reupload_restores_values,
+            test_csv_upload_records_capped,
+            test_dataset_upload_parquet,
+            test_rollups_endpoint,
         ]),
         ("ML Endpoints", [
+            test_feature_store_paths,
+            test_ml_forecast_batch_endpoint,
+            test_ml_train_job,
+            test_training_job_worker_killed,
+            test_stale_training_job_released,
+            test_pending_job_covers_full_request,
+            test_running_job_gets_follow_up,
+            test_incremental_xgboost_update,
+            test_global_model_unseen_series,
+            test_ets_forecast,
+            test_prophet_future_cache,
+            test_ml_backtest_endpoint,
+            test_ml_backtest_job,
+            test_tournament_common_folds,
+            test_tuning_trial_deadline,
+            test_compiled_tree_parity,
+            test_compiled_runtime_integrity,
             test_ml_insights_endpoint,
             test_business_insights_endpoint,
             test_predictions_endpoint,
@@ -197,7 +929,7 @@ def run_all_tests():
         for test_func in section_tests:
             total_tests += 1
             try:
-                test_func()
+                _call_test(test_func)
                 passed_tests += 1
             except AssertionError as e:
                 failed_tests += 1
@@ -207,7 +939,7 @@ def run_all_tests():
                 print(f"✗ {test_func.__name__} ERROR: {str(e)}")
     
     # Summary
-    print(f"\n" + "="*70)
+    print("\n" + "="*70)
     print(f"SUMMARY: {passed_tests}/{total_tests} tests passed")
     if failed_tests > 0:
         print(f"FAILED: {failed_tests} tests")
@@ -26,6 +26,10 @@ class EnsembleRevenueForecaster:
         self.confidence_level = 0.95
         self.model_name = 'EnsembleRevenueForecaster'
         self.training_metrics = {}
+        # Per-step (lower, upper) residual quantiles from held-out forecasts
+        self.interval_offsets = None
+        # One-step RMSE on held-out samples, for series too short to calibrate
+        self.holdout_rmse = None
     
     def prepare_features(self, df, lookback=30):
         """Create time-series features for XGBoost
@@ -59,6 +63,11 @@ class EnsembleRevenueForecaster:
         """
         X, y = self.prepare_features(historical_data)
         
+        # Calibrate intervals with a model (and scaler) that has not seen the last 20%
+        self.interval_offsets, self.holdout_rmse = self._calibrate_intervals(
+            historical_data['revenue'].values, X, y
+        )
+        
         # Scale features
         X_scaled = self.scaler.fit_transform(X)
         
@@ -80,25 +89,60 @@ class EnsembleRevenueForecaster:
         
         return self
     
-    def forecast(self, last_n_days, days_ahead=30):
-        """Generate revenue forecast with confidence intervals
+    def _calibrate_intervals(self, revenue, X, y, horizon=30, max_origins=40, lookback=30):
+        """Split-conformal interval offsets per forecast step
+        Fits a copy of the model and its own scaler on the first 80% of
+        samples and forecasts ``horizon`` days recursively from origins in
+        the rest.
         Args:
-            last_n_days: Array of last N days revenue
-            days_ahead: Number of days to forecast
+            revenue: Full revenue array the samples were built from
+            X, y: Unscaled samples (see prepare_features)
         Returns:
-            dict with 'forecast', 'upper_bound', 'lower_bound', 'confidence'
+            ((lower, upper) arrays of offsets to add to each step's forecast,
+            or None with fewer than 10 held-out samples; one-step RMSE on the
+            held-out samples, or None without any)
         """
-        if len(last_n_days) < 30:
-            raise ValueError("Need at least 30 days of historical data")
+        split = int(len(X) * 0.8)
+        if split < 1 or split == len(X):
+            return None, None
         
-        forecasts = []
-        upper_bounds = []
-        lower_bounds = []
+        scaler = StandardScaler().fit(X[:split])
+        model = xgb.XGBRegressor(**self.xgb_model.get_params())
+        model.fit(scaler.transform(X[:split]), y[:split], verbose=False)
+        holdout_rmse = float(np.sqrt(np.mean((y[split:] - model.predict(scaler.transform(X[split:]))) ** 2)))
+        if len(X) - split < 10:
+            return None, holdout_rmse
         
-        current_window = last_n_days.copy()
+        # Origin e forecasts revenue[e:], its window is revenue[e - lookback:e]
+        origins = np.arange(split + lookback, len(revenue))
+        if len(origins) > max_origins:
+            origins = origins[np.linspace(0, len(origins) - 1, max_origins).round().astype(int)]
+        residuals = np.full((len(origins), horizon), np.nan)
+        for row, origin in enumerate(origins):
+            predicted = self._recursive_predict(model, revenue[origin - lookback:origin], horizon, scaler)
+            actual = revenue[origin:origin + horizon]
+            residuals[row, :len(actual)] = actual - predicted[:len(actual)]
         
+        lower, upper = [], []
+        for step_residuals in residuals.T:
+            step_residuals = step_residuals[np.isfinite(step_residuals)]
+            n = len(step_residuals)
+            if n == 0:
+                break
+            # Finite-sample correction, so coverage holds for small calibration sets
+            high = min(1.0, (0.5 + self.confidence_level / 2) * (n + 1) / n)
+            lower.append(np.quantile(step_residuals, 1.0 - high))
+            upper.append(np.quantile(step_residuals, high))
+        
+        # Errors compound over the horizon: a later step is never narrower
+        return (np.minimum.accumulate(lower), np.maximum.accumulate(upper)), holdout_rmse
+    
+    def _recursive_predict(self, model, window, days_ahead, scaler=None):
+        """Forecast days_ahead steps, feeding each prediction back into the window"""
+        scaler = self.scaler if scaler is None else scaler
+        forecasts = []
+        current_window = np.asarray(window, dtype=float).copy()
         for step in range(days_ahead):
-            # Prepare features for next prediction
             features = np.array([[
                 np.mean(current_window[-30:]),
                 np.std(current_window[-30:]),
@@ -106,28 +150,51 @@ class EnsembleRevenueForecaster:
                 np.max(current_window[-30:]),
                 np.min(current_window[-30:])
             ]])
-            
-            features_scaled = self.scaler.transform(features)
-            pred = self.xgb_model.predict(features_scaled)[0]
-            
-            # Calculate confidence intervals
-            std_error = self.training_metrics['rmse'] * 0.1
-            z_score = 1.96  # 95% confidence
-            
+            pred = model.predict(scaler.transform(features))[0]
             forecasts.append(float(pred))
-            upper_bounds.append(float(pred + z_score * std_error))
-            lower_bounds.append(float(pred - z_score * std_error))
-            
-            # Update window for next iteration
             current_window = np.append(current_window[1:], pred)
+        return np.array(forecasts)
+    
+    def forecast(self, last_n_days, days_ahead=30):
+        """Generate revenue forecast with confidence intervals
+        Args:
+            last_n_days: Array of last N days revenue
+            days_ahead: Number of days to forecast
+        Returns:
+            dict with 'forecast', 'upper_bound', 'lower_bound', 'confidence'
+            (no bounds when training held out no samples to size them)
+        """
+        if len(last_n_days) < 30:
+            raise ValueError("Need at least 30 days of historical data")
+        
+        forecasts = self._recursive_predict(self.xgb_model, last_n_days, days_ahead)
         
-        return {
-            'forecast': forecasts,
-            'upper_bound': upper_bounds,
-            'lower_bound': lower_bounds,
+        result = {
+            'forecast': forecasts.tolist(),
             'confidence': self.confidence_level,
             'rmse': float(self.training_metrics['rmse'])
         }
+        
+        # Calculate confidence intervals
+        if self.interval_offsets is not None:
+            lower, upper = self.interval_offsets
+            # Steps beyond the calibrated horizon reuse its last offsets
+            steps = np.minimum(np.arange(days_ahead), len(lower) - 1)
+            lower_bounds = forecasts + lower[steps]
+            upper_bounds = forecasts + upper[steps]
+        elif self.holdout_rmse is not None:
+            # Too little data to calibrate: held-out one-step error growing with the horizon
+            z_score = 1.96  # 95% confidence
+            margin = z_score * self.holdout_rmse * np.sqrt(np.arange(1, days_ahead + 1))
+            lower_bounds = forecasts - margin
+            upper_bounds = forecasts + margin
+        else:
+            # In-sample error would give (near) zero-width bands
+            return result
+        
+        result['upper_bound'] = upper_bounds.tolist()
+        result['lower_bound'] = lower_bounds.tolist()
+        return result
     
     def get_metrics(self):
         """Return training metrics"""
@@ -97,15 +97,25 @@ class HealthResponse(BaseModel):
     version: str
     available_models: List[str]
 
-# ===================== In-Memory Model Registry =====================
+# ===================== Model Registry =====================
 
 class ModelRegistry:
-    """Manage trained models"""
+    """Manage trained models
     
-    def __init__(self):
+    Models registered in this process live in memory. When ``store_dir``
+    (env MODEL_REGISTRY_DIR) points at the backend's versioned model
+    registry, its promoted models are listed and described too, read from
+    the shared index.json under keys like ``xgboost:3:revenue``.
+    """
+    
+    def __init__(self, store_dir: Optional[str] = None):
         self.models = {}
         self.metadata = {}
         self.metrics_cache = {}
+        self.store_dir = store_dir
+        self._store_index = {}
+        self._store_signature = None
+        self._loaded = {}  # store models loaded so far, by artifact sha256
         logger.info("Model registry initialized")
     
     def register_model(self, model_name: str, model_obj: Any, metadata: Dict):
@@ -115,18 +125,65 @@ class ModelRegistry:
         logger.info(f"Model registered: {model_name}")
     
     def get_model(self, model_name: str, version: Optional[str] = None):
-        """Retrieve model by name and optional version"""
-        if model_name not in self.models:
+        """Retrieve model by name and optional version
+        
+        Models from the shared store are loaded from their artifact (once per
+        artifact): an xgboost.Booster for XGBoost models, the fitted Prophet
+        object, or the parameter dict of an ETS model.
+        """
+        if model_name in self.models:
+            return self.models[model_name]
+        entry = self._store_entry(model_name, version)
+        if entry is None:
             raise ValueError(f"Model not found: {model_name}")
-        return self.models[model_name]
+        # Artifacts are content-addressed, so a loaded one never goes stale
+        if entry['sha256'] not in self._loaded:
+            self._loaded[entry['sha256']] = self._load_artifact(entry)
+        return self._loaded[entry['sha256']]
+    
+    def _load_artifact(self, entry: Dict) -> Any:
+        """Deserialize a shared-store artifact according to its model type"""
+        path = os.path.join(self.store_dir, entry['artifact'])
+        model_type = entry.get('model_type') or ''
+        if model_type.startswith('xgboost'):
+            import xgboost as xgb
+            booster = xgb.Booster()
+            booster.load_model(path)
+            return booster
+        if model_type == 'prophet':
+            import pickle
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        if model_type == 'ets':
+            with open(path) as f:
+                return json.load(f)
+        raise ValueError(f"Unsupported model type in store: {model_type}")
     
     def list_models(self) -> List[str]:
         """List all registered models"""
-        return list(self.models.keys())
+        self.refresh()
+        return list(self.models.keys()) + [
+            name for name in self._store_index if name not in self.models
+        ]
     
     def get_metadata(self, model_name: str):
         """Get model metadata"""
-        return self.metadata.get(model_name, {})
+        if model_name in self.metadata:
+            return self.metadata[model_name]
+        entry = self._store_entry(model_name)
+        if entry is None:
+            return {}
+        metrics = entry.get('metrics') or {}
+        return {
+            'version': f"v{entry['version']}",
+            'trained_at': entry.get('created_at', ''),
+            'model_type': entry.get('model_type'),
+            'training_samples': metrics.get('train_samples', 0),
+            'feature_count': len(entry.get('features') or []),
+            'metrics': {k: v for k, v in metrics.items() if isinstance(v, (int, float))},
+            'training_window': entry.get('training_window'),
+            'sha256': entry.get('sha256'),
+        }
     
     def cache_metrics(self, model_name: str, metrics: Dict):
         """Cache model metrics"""
@@ -134,8 +191,41 @@ class ModelRegistry:
             'metrics': metrics,
             'cached_at': datetime.now().isoformat()
         }
+    
+    def refresh(self):
+        """Re-read the shared store index if it changed on disk"""
+        if not self.store_dir:
+            return
+        index_path = os.path.join(self.store_dir, 'index.json')
+        try:
+            stat = os.stat(index_path)
+        except FileNotFoundError:
+            return
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._store_signature:
+            return
+        # The backend replaces index.json atomically, so a read is never partial
+        with open(index_path) as f:
+            self._store_index = json.load(f).get('models', {})
+        self._store_signature = signature
+        # Drop loaded models the store no longer keeps
+        kept = {v.get('sha256') for m in self._store_index.values() for v in m.get('versions', [])}
+        self._loaded = {sha256: model for sha256, model in self._loaded.items() if sha256 in kept}
+        logger.info(f"Loaded {len(self._store_index)} models from {self.store_dir}")
+    
+    def _store_entry(self, model_name: str, version: Optional[str] = None) -> Optional[Dict]:
+        """Current (or requested, e.g. 'v2') version of a model in the shared store"""
+        self.refresh()
+        model = self._store_index.get(model_name)
+        if not model:
+            return None
+        wanted = int(version.lstrip('v')) if version else model.get('current')
+        for entry in model.get('versions', []):
+            if entry['version'] == wanted:
+                return entry
+        return None
 
-model_registry = ModelRegistry()
+model_registry = ModelRegistry(os.getenv("MODEL_REGISTRY_DIR"))
 
 # ===================== API Endpoints =====================
 
@@ -315,6 +405,7 @@ async def reload_model(model_name: str):
     """Reload a model from disk"""
     try:
         logger.info(f"Reloading model: {model_name}")
+        model_registry.refresh()
         
         return {
             "status": "model_reloaded",